@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# Per-query client overhead of build() on every call versus the persistent
+# service in search/src/client.py.  Both variants query a local keep-alive
+# HTTP server that returns a stored result, so no quota is spent and the
+# timings contain only client-side work and connection setup.
+import os, sys
+import json
+import time
+import threading
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+CX = '3548decfb27244f8b'
+SAMPLE = os.path.join(ROOT, 'search', 'results',
+                      'Alabama_13-08-2025_15:22:08', '00', '00.json')
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    body = b''
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+def start_server():
+    with open(SAMPLE, 'rb') as file:
+        Handler.body = file.read()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def timed(func, n):
+    func(0)
+    start = time.perf_counter()
+    for i in range(n):
+        func(i)
+    return (time.perf_counter() - start) / n
+
+def main(args):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=200,
+                        help='queries per variant (default 200).')
+    parsed = parser.parse_args(args)
+
+    server = start_server()
+    os.environ['CSE_ENDPOINT'] = f'http://127.0.0.1:{server.server_port}/'
+    sys.path.insert(0, os.path.join(ROOT, 'search', 'src'))
+
+    import httplib2
+    from googleapiclient.discovery import build
+    import client
+
+    def before(i):
+        service = build("customsearch", "v1", developerKey='bench',
+                        http=httplib2.Http(),
+                        client_options={'api_endpoint': client.CSE_ENDPOINT})
+        service.cse().list(q=f'query {i}', cx=CX).execute()
+
+    def after(i):
+        client.cse_list('bench', q=f'query {i}', cx=CX)
+
+    results = { 'before_ms': timed(before, parsed.n) * 1000,
+                'after_ms': timed(after, parsed.n) * 1000 }
+    results['speedup'] = results['before_ms'] / results['after_ms']
+    print(json.dumps(results, indent=1))
+    server.shutdown()
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
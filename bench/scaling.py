@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# How the search and verify tooling scales with the number of states,
+# queries, runs and results per query.  Each size gets a synthetic tree (see
+# synthetic.py) and its own process, since both tools read their
+# configuration from the environment when they are imported.  Timings are
+# written as JSON; --compare prints them against an earlier file, e.g. one
+# written at another commit.
+import os, sys
+import io
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import itertools
+import subprocess
+import contextlib
+
+import synthetic
+
+ROOT = synthetic.ROOT
+DATA = os.path.join(ROOT, 'verify', 'data')
+SIZES = ('states', 'queries', 'runs', 'items')
+
+# Configuration the benchmarks must not pick up from the caller.
+CLEARED = ('USE_TMP', 'RUN_INDEX', 'RUN_STORAGE', 'CACHE_PATH', 'SEARCH_DATASET',
+           'COLLAPSE_DUPLICATES', 'LIVENESS_CACHE', 'DATASET_PATH', 'LINK_INDEX')
+
+def environment(path):
+    env = dict(os.environ, **{ name: '' for name in CLEARED })
+    env.update({
+        'CSE_KEY': 'bench',
+        'QUERIES_PATH': os.path.join(path, 'queries.json'),
+        'STATES_PATH': os.path.join(path, 'states.json'),
+        'SEARCHLIST': os.path.join(path, 'searchlist.txt'),
+        'RESULTS_PATH': os.path.join(path, 'results'),
+        'LOGGING': os.path.join(path, 'log.txt'),
+        'SEARCH_RESULTS_PATH': os.path.join(path, 'results'),
+        'SEARCH_RESULTS_PARSED': os.path.join(path, 'csv_results_parsed.csv'),
+        'AIRTABLE_RESULTS': os.path.join(path, 'airtable_results.csv'),
+        'AIRTABLE_TO_JSON': os.path.join(DATA, 'airtable_to_json_map.json'),
+        'AIRTABLE_TO_QUESTIONS': os.path.join(DATA,
+                                              'airtable_to_questions_map.json'),
+        'QUERIES_TO_QUESTIONS': os.path.join(DATA,
+                                             'queries_to_questions_map.json'),
+        'SEARCH_RESULTS_JSON': os.path.join(path, 'search_results_parsed.json'),
+        'AIRTABLE_RESULTS_JSON': os.path.join(path, 'airtable_results.json'),
+        'RESULTS': os.path.join(path, 'mapped_results.json'),
+        'CSV_RESULTS': os.path.join(path, 'csv_results.csv'),
+    })
+    return env
+
+# The first call is reported apart, since it is the one that builds the run
+# index (or warms the page cache).
+def timed(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        times.append(time.perf_counter() - start)
+    return { 'first_ms': times[0] * 1000, 'best_ms': min(times) * 1000,
+             'mean_ms': sum(times) / len(times) * 1000 }
+
+# -------------------------------- WORKER -------------------------------------
+# Runs in a process of its own with environment(path) set.
+def run_benchmarks(path, repeat):
+    sys.path.insert(0, os.path.join(ROOT, 'search', 'src'))
+    sys.path.insert(0, os.path.join(ROOT, 'verify', 'src'))
+    import main
+    import combine
+    import export
+
+    state = next(iter(main.get_plan().states), None)
+    results = dict()
+    results['get_rdirs'] = timed(lambda: main.get_rdirs('all'), repeat)
+    results['get_rdirs_state'] = timed(lambda: main.get_rdirs(state), repeat)
+    results['get_most_recent_rdirs'] = timed(main.get_most_recent_rdirs,
+                                             repeat)
+    results['list'] = timed(lambda: main.main([ 'list', 'all' ]), repeat)
+    results['view'] = timed(lambda: main.main([ '--most-recent', 'view',
+                                                state ]), repeat)
+    results['view_all'] = timed(lambda: main.main([ '--most-recent', 'view',
+                                                    'all' ]), repeat)
+    results['get_queries_from_search'] = timed(combine.get_queries_from_search,
+                                               repeat)
+    queries = combine.get_queries_from_search()
+    results['get_parsed'] = timed(lambda: combine.get_parsed(queries), repeat)
+
+    combine.dump_search_results()
+    combine.dump_airtable_results()
+    results['map_to_questions'] = timed(combine.map_to_questions, repeat)
+    results['format_csv'] = timed(lambda: export.main([]), repeat)
+    return results
+# -----------------------------------------------------------------------------
+
+
+# --------------------------------- COMPARE -----------------------------------
+def key(run):
+    return tuple(run['size'][name] for name in SIZES)
+
+# Best times of `new` against those of `old` for the sizes both measured.
+def compare(old, new):
+    old_runs = { key(run): run for run in old['runs'] }
+    for run in new['runs']:
+        if key(run) not in old_runs: continue
+        print(', '.join(f'{n} {run["size"][n]}' for n in SIZES) + ':')
+        before = old_runs[key(run)]['timings']
+        for name, timing in run['timings'].items():
+            if name not in before: continue
+            ratio = timing['best_ms'] / before[name]['best_ms']
+            print(f'\t{name:24} {before[name]["best_ms"]:10.1f} ms '
+                  f'{timing["best_ms"]:10.1f} ms  x{ratio:.2f}')
+# -----------------------------------------------------------------------------
+
+
+def commit():
+    try:
+        return subprocess.run([ 'git', 'rev-parse', '--short', 'HEAD' ],
+                              cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description='Time the tooling on synthetic results trees.')
+    parser.add_argument('--states', type=int, nargs='+', default=[ 51 ])
+    parser.add_argument('--queries', type=int, nargs='+', default=[ 15 ])
+    parser.add_argument('--runs', type=int, nargs='+', default=[ 3 ])
+    parser.add_argument('--items', type=int, nargs='+', default=[ 10 ],
+                        help=('results per query; every combination of the '
+                              'sizes given is measured.'))
+    parser.add_argument('--storage', choices=('dirs', 'jsonl'), default='dirs',
+                        help='layout of the results trees (default dirs).')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='calls per benchmark (default 3).')
+    parser.add_argument('-o', '--output',
+                        help='file to write the timings to (default stdout).')
+    parser.add_argument('--compare', metavar='file',
+                        help='timings from an earlier run to compare with.')
+    parser.add_argument('--keep', metavar='dir',
+                        help='write the synthetic trees here and keep them.')
+    parser.add_argument('--worker', metavar='dir', help=argparse.SUPPRESS)
+    parsed = parser.parse_args(args)
+
+    if parsed.worker:
+        print(json.dumps(run_benchmarks(parsed.worker, parsed.repeat)))
+        return
+
+    base = parsed.keep or tempfile.mkdtemp(prefix='bench-')
+    output = { 'commit': commit(), 'python': sys.version.split()[0],
+               'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'storage': parsed.storage, 'repeat': parsed.repeat, 'runs': [] }
+    try:
+        for size in itertools.product(*(getattr(parsed, n) for n in SIZES)):
+            size = dict(zip(SIZES, size))
+            path = os.path.join(base, '_'.join(f'{n}{size[n]}' for n in SIZES))
+            start = time.perf_counter()
+            synthetic.generate(path, storage=parsed.storage, **size)
+            generated = time.perf_counter() - start
+            worker = subprocess.run([ sys.executable, os.path.abspath(__file__),
+                                      '--worker', path,
+                                      '--repeat', str(parsed.repeat) ],
+                                    env=environment(path), capture_output=True,
+                                    text=True)
+            if worker.returncode != 0:
+                raise Exception(f'Benchmarks failed for {size}:\n'
+                                f'{worker.stderr}')
+            output['runs'].append({ 'size': size,
+                                    'generate_s': generated,
+                                    'timings': json.loads(worker.stdout) })
+            print(f'Measured {size}.', file=sys.stderr)
+    finally:
+        if not parsed.keep:
+            shutil.rmtree(base, ignore_errors=True)
+
+    if parsed.output:
+        with open(parsed.output, 'w') as file:
+            json.dump(output, file, indent=1)
+    else:
+        print(json.dumps(output, indent=1))
+
+    if parsed.compare:
+        with open(parsed.compare, 'r') as file:
+            compare(json.load(file), output)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# End-to-end throughput of "main.py search all" against the replay stand-in
+# for the Custom Search API (search/src/replay.py), for a range of worker
+# counts.  Responses come from an existing results tree, so no quota is
+# spent and runs are repeatable; latency, 429s, 5xx errors and a per-minute
+# quota can be injected to see how retries and concurrency settings behave.
+import os, sys
+import io
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import subprocess
+import contextlib
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SEARCH = os.path.join(ROOT, 'search')
+
+def environment(path, parsed):
+    env = dict(os.environ, USE_TMP='', CACHE_PATH='', LOGGING='')
+    env.update({
+        'CSE_KEY': 'bench',
+        'CSE_DAILY_LIMIT': str(10 ** 9),
+        'QUERIES_PATH': parsed.queries,
+        'STATES_PATH': parsed.states,
+        'SEARCHLIST': os.path.join(path, 'searchlist.txt'),
+        'RESULTS_PATH': os.path.join(path, 'results'),
+        'JOURNALS_PATH': os.path.join(path, 'journals'),
+        'LEDGER_PATH': os.path.join(path, 'ledger.json'),
+        'CSE_REPLAY': parsed.source,
+        'CSE_REPLAY_LATENCY': parsed.latency,
+        'CSE_REPLAY_429_RATE': str(parsed.throttle_rate),
+        'CSE_REPLAY_ERROR_RATE': str(parsed.error_rate),
+        'CSE_REPLAY_QUOTA': str(parsed.quota),
+        'CSE_REPLAY_SEED': str(parsed.seed),
+    })
+    return env
+
+# Runs in a process of its own with environment() set; "search all" asks
+# for confirmation, which the parent answers on stdin.
+def run_sweep(workers, rate, depth):
+    sys.path.insert(0, os.path.join(SEARCH, 'src'))
+    import main
+    import replay
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        main.main([ '-w', str(workers), '--rate', str(rate), '--depth',
+                    str(depth), 'search', 'all' ])
+    elapsed = time.perf_counter() - start
+    counts = replay.shared().counts
+    pages = counts['hits'] + counts['misses']
+    return { 'elapsed_s': elapsed, 'pages': pages,
+             'pages_per_minute': pages / elapsed * 60,
+             'retry_rate': 1 - pages / counts['requests'] if counts['requests']
+                           else 0, 'counts': dict(counts) }
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description='Time "search all" against replayed responses.')
+    parser.add_argument('-w', '--workers', type=int, nargs='+',
+                        default=[ 1, 4, 8, 16 ],
+                        help='worker counts to measure (default 1 4 8 16).')
+    parser.add_argument('--rate', type=int, default=10 ** 6,
+                        help=('searches started per minute (default no '
+                              'practical limit).'))
+    parser.add_argument('--depth', type=int, default=1)
+    parser.add_argument('--source', default=os.path.join(SEARCH, 'results'),
+                        help='results tree to replay (default search/results).')
+    parser.add_argument('--queries', default=os.path.join(SEARCH, 'queries.json'))
+    parser.add_argument('--states', default=os.path.join(SEARCH, 'states.json'))
+    parser.add_argument('--latency', default='0.2-0.6',
+                        help=('seconds per response, or a "low-high" range '
+                              '(default 0.2-0.6).'))
+    parser.add_argument('--429-rate', dest='throttle_rate', type=float,
+                        default=0, help='share of requests answered with 429.')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='share of requests answered with 500 or 503.')
+    parser.add_argument('--quota', type=int, default=0,
+                        help='requests allowed per minute (default no limit).')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output',
+                        help='file to write the timings to (default stdout).')
+    parser.add_argument('--worker', nargs=3, type=int, help=argparse.SUPPRESS)
+    parsed = parser.parse_args(args)
+
+    if parsed.worker:
+        print(json.dumps(run_sweep(*parsed.worker)))
+        return
+
+    with open(parsed.states, 'r') as file:
+        states = list(json.load(file))
+    output = { 'source': parsed.source, 'latency': parsed.latency,
+               '429_rate': parsed.throttle_rate,
+               'error_rate': parsed.error_rate, 'quota': parsed.quota,
+               'depth': parsed.depth, 'runs': [] }
+    for workers in parsed.workers:
+        path = tempfile.mkdtemp(prefix='sweep-')
+        try:
+            with open(os.path.join(path, 'searchlist.txt'), 'w') as file:
+                file.write(''.join(f'{state}\n' for state in states))
+            worker = subprocess.run([ sys.executable, os.path.abspath(__file__),
+                                      '--worker', str(workers),
+                                      str(parsed.rate), str(parsed.depth) ],
+                                    env=environment(path, parsed), input='y\n',
+                                    capture_output=True, text=True)
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+        if worker.returncode != 0:
+            raise Exception(f'Sweep failed with {workers} workers:\n'
+                            f'{worker.stderr}')
+        output['runs'].append(dict(workers=workers,
+                                   **json.loads(worker.stdout)))
+        print(f'Measured {workers} workers.', file=sys.stderr)
+
+    if parsed.output:
+        with open(parsed.output, 'w') as file:
+            json.dump(output, file, indent=1)
+    else:
+        print(json.dumps(output, indent=1))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# Synthetic inputs at any scale: a results tree of N states x M queries x K
+# runs x D items in the shape the Custom Search API returns, the matching
+# queries, states and search list files, a reviewed csv_results_parsed.csv
+# and an Airtable export.  Everything is drawn from a seeded generator, so
+# the same sizes always give the same files.
+import os, sys
+import csv
+import json
+import time
+import random
+import argparse
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SAMPLE = os.path.join(ROOT, 'search', 'results',
+                      'Alabama_13-08-2025_15:22:08', '00', '00.json')
+QUERIES = os.path.join(ROOT, 'search', 'queries.json')
+STATES = os.path.join(ROOT, 'search', 'states.json')
+AIRTABLE = os.path.join(ROOT, 'verify', 'data', 'airtable_results.csv')
+TIME_FORMAT = '%d-%m-%Y_%H:%M:%S'
+FIRST_RUN = time.mktime(time.strptime('01-01-2025_09:00:00', TIME_FORMAT))
+
+# Share of a query's links a later run of it replaces, and of the links a
+# reviewer checks in the parsed sheet.
+CHURN = 0.2
+CHECKED = 0.15
+HOSTS = ('idscan.net', 'www.aamva.org', 'www.ncsl.org', 'www.reddit.com',
+         'apps.apple.com', 'play.google.com', 'www.govtech.com',
+         'law.justia.com', 'legiscan.com', 'www.getmobileid.com')
+WORDS = ('mobile', 'digital', 'id', 'license', 'driver', 'wallet', 'app',
+         'privacy', 'law', 'bill', 'program', 'pilot', 'update', 'faq',
+         'card', 'credential', 'verify', 'apple', 'google', 'samsung')
+
+def slug(state):
+    return state.lower().replace(' ', '-')
+
+# The real state names first, then "State 52", "State 53", ...
+def state_names(count):
+    with open(STATES, 'r') as file:
+        names = list(json.load(file))
+    return names[:count] + [ f'State {i}' for i in range(len(names) + 1,
+                                                          count + 1) ]
+
+def query_names(count):
+    return [ f'{i:02}' for i in range(count) ]
+
+# --------------------------------- CONFIG ------------------------------------
+# queries.json, states.json and the search list for the synthetic states; the
+# real query templates are reused in turn.
+def write_config(path, states, queries):
+    with open(QUERIES, 'r') as file:
+        templates = list(json.load(file).values())
+    with open(os.path.join(path, 'queries.json'), 'w') as file:
+        json.dump({ q: templates[i % len(templates)]
+                    for i, q in enumerate(queries) }, file, indent=1)
+    with open(os.path.join(path, 'states.json'), 'w') as file:
+        json.dump({ state: [ f'{state} Code', f'https://dmv.{slug(state)}.gov' ]
+                    for state in states }, file, indent=1)
+    with open(os.path.join(path, 'searchlist.txt'), 'w') as file:
+        file.write(''.join(f'{state}\n' for state in states))
+# -----------------------------------------------------------------------------
+
+
+# ---------------------------------- TREE -------------------------------------
+def make_link(rng, state):
+    host = rng.choice(HOSTS + (f'www.{slug(state).replace("-", "")}.gov',) * 3)
+    path = '-'.join(rng.sample(WORDS, 3))
+    return f'https://{host}/{slug(state)}/{path}-{rng.randrange(10 ** 6)}/'
+
+def make_item(rng, state, link):
+    title = f'{state} {" ".join(rng.sample(WORDS, 4)).title()}'
+    snippet = ' '.join(rng.choice(WORDS) for _ in range(24)).capitalize() + '.'
+    host = link.split('/')[2]
+    return { 'kind': 'customsearch#result', 'title': title,
+             'htmlTitle': title.replace(state, f'<b>{state}</b>'),
+             'link': link, 'displayLink': host, 'snippet': snippet,
+             'htmlSnippet': snippet, 'formattedUrl': link,
+             'htmlFormattedUrl': link,
+             'pagemap': { 'metatags': [ { 'og:title': title,
+                                          'og:site_name': host } ] } }
+
+def make_result(template, terms, items):
+    result = json.loads(json.dumps(template))
+    for name in ('request', 'nextPage'):
+        for page in result['queries'].get(name, []):
+            page['title'] = f'Google Custom Search - {terms}'
+            page['searchTerms'] = terms
+    result['items'] = items
+    return result
+
+# Writes K runs per state, a day apart, each with every query.  Each run of a
+# query keeps most of the links of the one before it in the same order, and
+# a state's queries draw on one pool of links so they overlap as real ones
+# do.  'jsonl' converts the tree to run files once it is written.
+def write_tree(results_path, states, queries, runs, items, storage='dirs',
+               seed=0):
+    with open(SAMPLE, 'r') as file:
+        template = json.load(file)
+    with open(QUERIES, 'r') as file:
+        templates = list(json.load(file).values())
+    os.makedirs(results_path, exist_ok=True)
+    rng = random.Random(seed)
+
+    count = 0
+    for state in states:
+        pool = [ make_link(rng, state) for _ in range(len(queries) * items // 2
+                                                        + items) ]
+        previous = { q: rng.sample(pool, items) for q in queries }
+        for run in range(runs):
+            tval = FIRST_RUN + run * 86400 + rng.randrange(3600)
+            rdir = f'{state}_{time.strftime(TIME_FORMAT, time.localtime(tval))}'
+            for i, query in enumerate(queries):
+                links = [ make_link(rng, state) if rng.random() < CHURN
+                          else link for link in previous[query] ]
+                previous[query] = links
+                terms = templates[i % len(templates)].replace('{STATE}', state)
+                result = make_result(template, terms,
+                                     [ make_item(rng, state, link)
+                                       for link in links ])
+                qdir = os.path.join(results_path, rdir, query)
+                os.makedirs(qdir, exist_ok=True)
+                with open(os.path.join(qdir, f'{query}.json'), 'w') as file:
+                    json.dump(result, file, indent=1)
+                count += 1
+
+    if storage == 'jsonl':
+        sys.path.insert(0, os.path.join(ROOT, 'search', 'src'))
+        import store
+        store.convert(results_path)
+    return count
+# -----------------------------------------------------------------------------
+
+
+# --------------------------------- SHEETS ------------------------------------
+# A csv_results_parsed.csv reviewing the most recent run of every state: a
+# "Qnn" block per query with a numbered row per result, an "O" row for the
+# reviewer's own link and an "N" row for notes, and a title and checkbox
+# column per state.
+def write_parsed(path, states, queries, items, seed=0):
+    rng = random.Random(seed)
+    header = [ '', '' ]
+    for state in states:
+        header += [ state, 'TRUE' ]
+    rows = [ header ]
+    for query in queries:
+        markers = [ str(i) for i in range(1, items + 1) ] + [ 'O', 'N' ]
+        for i, marker in enumerate(markers):
+            row = [ f'Q{query}' if i == 0 else '', marker ]
+            for state in states:
+                if marker == 'O':
+                    own = rng.random() < CHECKED
+                    row += [ make_link(rng, state) if own else '',
+                             'TRUE' if own else 'FALSE' ]
+                elif marker == 'N':
+                    row += [ ' '.join(rng.sample(WORDS, 8))
+                             if rng.random() < CHECKED else '', '' ]
+                else:
+                    row += [ f'{state} {" ".join(rng.sample(WORDS, 4))}',
+                             'TRUE' if rng.random() < CHECKED else 'FALSE' ]
+            rows.append(row)
+        rows.append([ '' ] * len(header))
+    with open(path, 'w') as file:
+        csv.writer(file).writerows(rows)
+
+# An Airtable export with the real columns, one row per state, each cell a
+# value some real state has in that column.
+def write_airtable(path, states, seed=0):
+    rng = random.Random(seed)
+    with open(AIRTABLE, 'r', newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        values = list(zip(*reader))
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        for state in states:
+            writer.writerow([ state ] + [ rng.choice(column)
+                                          for column in values[1:] ])
+# -----------------------------------------------------------------------------
+
+
+# Writes <path>/results (the tree), queries.json, states.json,
+# searchlist.txt, csv_results_parsed.csv and airtable_results.csv.
+def generate(path, states, queries, runs, items, storage='dirs', seed=0):
+    states = state_names(states)
+    queries = query_names(queries)
+    os.makedirs(path, exist_ok=True)
+    write_config(path, states, queries)
+    count = write_tree(os.path.join(path, 'results'), states, queries, runs,
+                       items, storage, seed)
+    write_parsed(os.path.join(path, 'csv_results_parsed.csv'), states,
+                 queries, items, seed)
+    write_airtable(os.path.join(path, 'airtable_results.csv'), states, seed)
+    return count
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description='Write a synthetic results tree and sheets.')
+    parser.add_argument('path', help='directory to write to.')
+    parser.add_argument('--states', type=int, default=51,
+                        help='number of states (default 51).')
+    parser.add_argument('--queries', type=int, default=15,
+                        help='queries per run (default 15).')
+    parser.add_argument('--runs', type=int, default=3,
+                        help='runs per state (default 3).')
+    parser.add_argument('--items', type=int, default=10,
+                        help='results per query (default 10).')
+    parser.add_argument('--storage', choices=('dirs', 'jsonl'), default='dirs',
+                        help='layout of the results tree (default dirs).')
+    parser.add_argument('--seed', type=int, default=0)
+    parsed = parser.parse_args(args)
+
+    count = generate(parsed.path, parsed.states, parsed.queries, parsed.runs,
+                     parsed.items, parsed.storage, parsed.seed)
+    print(f'Wrote {count} query results to {parsed.path}.')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+import os
+import json
+import time
+import hashlib
+import threading
+
+AGE_UNITS = { 's': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60 }
+
+def parse_age(text):
+    text = str(text).strip()
+    if text and text[-1] in AGE_UNITS:
+        return float(text[:-1]) * AGE_UNITS[text[-1]]
+    return float(text)
+
+def cache_key(params):
+    text = json.dumps(params, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+# Responses are stored as <path>/<key[:2]>/<key>.json.  The mtime of a file
+# is when the response was fetched (for the TTL), its atime when it was last
+# served (for LRU eviction once the cache grows past max_bytes).
+class ResponseCache:
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.size = None
+        self.hits = 0
+        self.misses = 0
+
+    def file(self, key):
+        return os.path.join(self.path, key[:2], f'{key}.json')
+
+    def entries(self):
+        for root, _, files in os.walk(self.path):
+            for f in files:
+                if not f.endswith('.json'): continue
+                path = os.path.join(root, f)
+                try:
+                    yield path, os.stat(path)
+                except FileNotFoundError:
+                    continue
+
+    def get(self, params, max_age):
+        path = self.file(cache_key(params))
+        try:
+            stat = os.stat(path)
+            if max_age is not None and time.time() - stat.st_mtime > max_age:
+                raise FileNotFoundError(path)
+            with open(path, 'r') as file:
+                result = json.load(file)
+            os.utime(path, (time.time(), stat.st_mtime))
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+        return result
+
+    def put(self, params, result):
+        path = self.file(cache_key(params))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(result, file, separators=(',', ':'))
+        size = os.path.getsize(tmp_path)
+
+        # A response put again replaces the file it had, and its size.
+        with self.lock:
+            try:
+                replaced = os.path.getsize(path)
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp_path, path)
+            if self.size is None:
+                self.size = sum(s.st_size for _, s in self.entries())
+            else:
+                self.size += size - replaced
+            if self.size > self.max_bytes:
+                self.evict()
+
+    # Drops least recently served responses until the cache is back under
+    # 90% of its limit.  Must be called with the lock held.
+    def evict(self):
+        entries = sorted(self.entries(), key=lambda e: e[1].st_atime)
+        self.size = sum(s.st_size for _, s in entries)
+        for path, stat in entries:
+            if self.size <= 0.9 * self.max_bytes: break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= stat.st_size
+
+    def summary(self):
+        return f'Cache: {self.hits} hits, {self.misses} misses.'
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+import os
+import threading
+
+import httplib2
+from googleapiclient.discovery import build_from_document
+
+CSE_ENDPOINT = os.getenv('CSE_ENDPOINT')
+# A results tree to answer searches from instead of the API (see replay.py).
+CSE_REPLAY = os.getenv('CSE_REPLAY')
+HTTP_TIMEOUT = int(os.getenv('HTTP_TIMEOUT') or 60)
+DISCOVERY_PATH = (os.getenv('DISCOVERY_PATH') or
+                  os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               '..', 'discovery', 'customsearch.v1.json'))
+
+_document = None
+_document_lock = threading.Lock()
+_local = threading.local()
+
+# The discovery document is read once per process from the local copy, so
+# building a service never goes to the network.
+def discovery_document():
+    global _document
+    with _document_lock:
+        if _document is None:
+            with open(DISCOVERY_PATH, 'r') as file:
+                _document = file.read()
+    return _document
+
+# Keeps the size of the last response body each thread received, as it
+# came back from the transport, for the request metrics.
+class CountingHttp:
+    def __init__(self, http):
+        self.http = http
+
+    def request(self, *args, **kwargs):
+        response, content = self.http.request(*args, **kwargs)
+        _local.received = len(content or b'')
+        return response, content
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+def make_http():
+    if CSE_REPLAY:
+        from replay import ReplayHttp
+        return CountingHttp(ReplayHttp())
+    return CountingHttp(httplib2.Http(timeout=HTTP_TIMEOUT))
+
+def make_service(key, http=None):
+    client_options = { 'api_endpoint': CSE_ENDPOINT } if CSE_ENDPOINT else None
+    return build_from_document(discovery_document(), developerKey=key,
+                               http=http or make_http(),
+                               client_options=client_options)
+
+# httplib2.Http is not thread-safe, so every worker thread keeps its own
+# service (and with it its own keep-alive connection) per key.
+def get_service(key):
+    services = getattr(_local, 'services', None)
+    if services is None:
+        services = _local.services = dict()
+    if key not in services:
+        services[key] = make_service(key)
+    return services[key]
+
+def cse_list(key, **params):
+    return get_service(key).cse().list(**params).execute()
+
+# Bytes of the body of the last response this thread received.
+def received():
+    return getattr(_local, 'received', 0)
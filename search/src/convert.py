@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 import os, sys
-import json, csv, re
+import json, csv
+import hashlib
+from collections import namedtuple
 
 if os.getenv("USE_TMP"):
     QUERIES_PATH = os.getenv('TMP_QUERIES_PATH') or os.getenv('QUERIES_PATH')
@@ -10,7 +12,16 @@ if os.getenv("USE_TMP"):
 else:
     QUERIES_PATH = os.getenv('QUERIES_PATH')
     STATES_PATH = os.getenv('STATES_PATH')
-    RESULTS_PATH = os.getenv('RESULTS_PATH')
+    QUERIES_CONVERT = os.getenv('QUERIES_CONVERT')
+    STATES_CONVERT = os.getenv('STATES_CONVERT')
+SEARCHLIST_PATH = os.getenv('SEARCHLIST')
+
+PLAN_VERSION = 1
+
+# Every (state, query) with its query text rendered once, and a hash of the
+# text.  `tasks` is keyed by (state, query) in state then query order.
+Task = namedtuple('Task', ('state', 'query', 'text', 'hash'))
+Plan = namedtuple('Plan', ('queries', 'states', 'searchlist', 'tasks'))
 
 def clean(text):
     text = text.replace("\u2019", "'")
@@ -22,7 +33,26 @@ def query_to_string(query):
     if query < 10: return f'0{query}'
     else: return str(query)
 
-def parse_queries():
+# The plan sits beside queries.json unless PLAN_PATH says otherwise.
+def plan_path(queries_path):
+    return (os.getenv('PLAN_PATH') or
+            os.path.join(os.path.dirname(os.path.abspath(queries_path)),
+                         'plan.json'))
+
+# Leaves a file alone (and its mtime with it) when it already holds `data`.
+def write_json(path, data):
+    if os.path.exists(path):
+        with open(path, 'r') as file:
+            try:
+                if json.load(file) == data: return False
+            except json.JSONDecodeError:
+                pass
+    with open(path, 'w') as file:
+        json.dump(data, file, indent=1)
+    return True
+
+# ---------------------------------- SOURCES ----------------------------------
+def read_queries():
     queries = []
     terms = dict()
     environment = None
@@ -52,11 +82,9 @@ def parse_queries():
     for i in range(len(queries)):
         index = query_to_string(i)
         queries_dict[index] = queries[i]
+    return queries_dict
 
-    with open(QUERIES_PATH, 'w') as file:
-        json.dump(queries_dict, file, indent=1)
-
-def parse_states():
+def read_states():
     states = dict()
     with open(STATES_CONVERT, 'r') as file:
         reader = csv.reader(file)
@@ -65,15 +93,163 @@ def parse_states():
         for line in reader:
             state, statute, dmv = line
             states[state] = [statute, dmv]
+    return states
+
+def read_searchlist(path):
+    if not path: return None
+    with open(path, 'r') as file:
+        return [s.strip() for s in file.readlines()]
+
+def parse_queries():
+    write_json(QUERIES_PATH, read_queries())
+
+def parse_states():
+    write_json(STATES_PATH, read_states())
+# -----------------------------------------------------------------------------
+
+
+# ------------------------------- FINGERPRINTS --------------------------------
+# { path, mtime, size, sha256 } of a file.  The file is only hashed again
+# when its path, mtime or size differ from the `known` fingerprint.
+def fingerprint(path, known=None):
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    if known and (known['path'], known['mtime'], known['size']) == \
+            (path, stat.st_mtime_ns, stat.st_size):
+        return known
+    with open(path, 'rb') as file:
+        digest = hashlib.sha256(file.read()).hexdigest()
+    return { 'path': path, 'mtime': stat.st_mtime_ns, 'size': stat.st_size,
+             'sha256': digest }
+
+# Whether the files (by role) still have the content `recorded` for them,
+# and their current fingerprints.  Files that only had their mtime changed
+# count as unchanged.
+def check(recorded, paths):
+    current = dict()
+    fresh = recorded.keys() == { r for r, p in paths.items() if p }
+    for role, path in paths.items():
+        if not path: continue
+        if not os.path.exists(path): return False, None
+        current[role] = fingerprint(path, recorded.get(role))
+        known = recorded.get(role)
+        fresh = fresh and known is not None and \
+            (known['path'], known['sha256']) == (current[role]['path'],
+                                                 current[role]['sha256'])
+    return fresh, current
+# -----------------------------------------------------------------------------
+
+
+# ----------------------------------- PLAN ------------------------------------
+def text_hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+def compile_plan(queries, states, searchlist=None):
+    tasks = dict()
+    for state, (statute, dmv_website) in states.items():
+        for query, template in queries.items():
+            text = template.format(STATE=state, STATE_STATUTE=statute,
+                                   DMV_WEBSITE=dmv_website)
+            tasks[(state, query)] = Task(state, query, text, text_hash(text))
+    return Plan(queries, states, searchlist, tasks)
+
+# The tasks of a "search all": the states of the search list (every state
+# without one), each with every query or the given ones.
+def sweep(plan, queries=None):
+    states = [ s for s in plan.states
+               if plan.searchlist is None or s in plan.searchlist ]
+    return [ plan.tasks[(state, query)] for state in states
+             for query in (queries or plan.queries) ]
+
+def read_plan(path):
+    if not os.path.exists(path): return None
+    with open(path, 'r') as file:
+        try:
+            stored = json.load(file)
+        except json.JSONDecodeError:
+            return None
+    return stored if stored.get('version') == PLAN_VERSION else None
+
+# `inputs` fingerprints the files the plan was compiled from (queries.json,
+# states.json and the search list) and `sources` the files convert.py made
+# those from, if it did.
+def save_plan(path, plan, inputs, sources=None):
+    stored = { 'version': PLAN_VERSION, 'inputs': inputs,
+               'sources': sources or {}, 'queries': plan.queries,
+               'states': plan.states, 'searchlist': plan.searchlist,
+               'tasks': [ list(task) for task in plan.tasks.values() ] }
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(stored, file, indent=1)
+    os.replace(tmp_path, path)
+
+def to_plan(stored):
+    tasks = { (t[0], t[1]): Task(*t) for t in stored['tasks'] }
+    return Plan(stored['queries'], stored['states'], stored['searchlist'],
+                tasks)
+
+# The plan for the given config files: the stored one while they are
+# unchanged, compiled again (and stored, where possible) otherwise.
+def load_plan(path, queries_path, states_path, searchlist_path=None):
+    inputs = { 'queries': queries_path, 'states': states_path,
+               'searchlist': searchlist_path }
+    stored = read_plan(path)
+    fresh, current = check(stored['inputs'] if stored else {}, inputs)
+    if fresh:
+        if current != stored['inputs']:
+            stored['inputs'] = current
+            try:
+                save_plan(path, to_plan(stored), current, stored['sources'])
+            except OSError:
+                pass
+        return to_plan(stored)
+
+    with open(queries_path, 'r') as file:
+        queries = json.load(file)
+    with open(states_path, 'r') as file:
+        states = json.load(file)
+    plan = compile_plan(queries, states, read_searchlist(searchlist_path))
+    try:
+        save_plan(path, plan, check({}, inputs)[1])
+    except OSError:
+        pass
+    return plan
+
+# Converts queries.txt and states.csv and compiles the plan, unless neither
+# they, the search list nor the files written from them changed since the
+# last build.  Returns whether it built.
+def build(force=False):
+    path = plan_path(QUERIES_PATH)
+    sources = { 'queries': QUERIES_CONVERT, 'states': STATES_CONVERT,
+                'searchlist': SEARCHLIST_PATH }
+    inputs = { 'queries': QUERIES_PATH, 'states': STATES_PATH,
+               'searchlist': SEARCHLIST_PATH }
+    stored = read_plan(path)
+    if stored and not force:
+        fresh, current = check(stored['sources'], sources)
+        inputs_fresh, inputs_current = check(stored['inputs'], inputs)
+        if fresh and inputs_fresh:
+            if (current, inputs_current) != (stored['sources'],
+                                             stored['inputs']):
+                save_plan(path, to_plan(stored), inputs_current, current)
+            return False
 
-    with open(STATES_PATH, 'w') as file:
-        json.dump(states, file, indent=1)
+    queries = read_queries()
+    states = read_states()
+    write_json(QUERIES_PATH, queries)
+    write_json(STATES_PATH, states)
+    plan = compile_plan(queries, states, read_searchlist(SEARCHLIST_PATH))
+    save_plan(path, plan, check({}, inputs)[1], check({}, sources)[1])
+    return True
+# -----------------------------------------------------------------------------
 
-def main():
-    parse_queries()
-    parse_states()
 
-    pass
+def main(force=False):
+    if build(force):
+        print(f'Wrote {QUERIES_PATH}, {STATES_PATH} and '
+              f'{plan_path(QUERIES_PATH)}.')
+    else:
+        print('Plan is up to date.')
 
 if __name__ == '__main__':
     match len(sys.argv):
@@ -84,7 +260,9 @@ if __name__ == '__main__':
                 parse_queries()
             elif sys.argv[1] == 'states':
                 parse_states()
+            elif sys.argv[1] == 'force':
+                main(force=True)
             else:
                 print(f'Invalid argument "{sys.argv[1]}".')
         case _:
-            print(f"Invalid number of arguments: Expected 1 or 2. Received {_}.")
+            print(f"Invalid number of arguments: Expected 1 or 2. Received {len(sys.argv) - 1}.")
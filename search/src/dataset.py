@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+import os
+import json
+import time
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+import runindex
+import store
+
+FIELDS = ('state', 'query', 'query_text', 'rank', 'link', 'display_link',
+          'title', 'snippet', 'run', 'time')
+
+def run_time(rdir):
+    tval = runindex.parse_rdir(rdir)[1]
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(tval))
+
+def normalize_run(results_path, rdir, queries=None):
+    state = rdir[:rdir.find('_')]
+    tstr = run_time(rdir)
+    records = []
+    for query in runindex.get_queries(results_path, rdir):
+        if queries and query not in queries: continue
+        result = store.read_query(results_path, rdir, query)
+        if result is None: continue
+        request = result.get('queries', {}).get('request', [{}])[0]
+        for rank, item in enumerate(result.get('items', []), 1):
+            records.append({ 'state': state,
+                             'query': query,
+                             'query_text': request.get('searchTerms'),
+                             'rank': rank,
+                             'link': item.get('link'),
+                             'display_link': item.get('displayLink'),
+                             'title': item.get('title'),
+                             'snippet': item.get('snippet'),
+                             'run': rdir,
+                             'time': tstr })
+    return records
+
+# Normalizes the given runs on a pool of processes and writes every item as
+# one JSON line of `path`.  The file is replaced only once it is complete.
+def build(results_path, rdirs, path, queries=None, workers=None):
+    tmp_path = f'{path}.tmp'
+    count = 0
+    func = partial(normalize_run, results_path, queries=queries)
+    with ProcessPoolExecutor(max_workers=workers) as executor, \
+         open(tmp_path, 'w') as file:
+        for records in executor.map(func, rdirs):
+            for record in records:
+                file.write(json.dumps(record) + '\n')
+            count += len(records)
+    os.replace(tmp_path, path)
+    return count
+
+def iter_dataset(path):
+    with open(path, 'r') as file:
+        for line in file:
+            yield json.loads(line)
+
+def read_dataset(path):
+    return list(iter_dataset(path))
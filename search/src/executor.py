@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+import threading
+import time
+
+# Spaces out calls so that no more than `per_minute` start in any minute,
+# regardless of how many worker threads share the limiter.
+class RateLimiter:
+    def __init__(self, per_minute=None):
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+        self.set_rate(per_minute)
+
+    def set_rate(self, per_minute):
+        self.interval = 60 / per_minute if per_minute else 0.0
+
+    def wait(self):
+        if not self.interval: return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+# Runs func(*task) for every task on a pool of worker threads and yields
+# (task, result, exception) as each one finishes.  Ctrl-C cancels whatever
+# has not been started yet.
+def run_tasks(func, tasks, workers=1):
+    from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        pending = { executor.submit(func, *task): task for task in tasks }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = pending.pop(future)
+                exception = future.exception()
+                result = None if exception else future.result()
+                yield task, result, exception
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+import sqlite3
+
+import runindex
+import store
+
+# bm25() weights of the title, snippet and link columns.
+WEIGHTS = (2.0, 1.0, 0.5)
+
+# Indexes the items of every stored query that is not indexed yet, so only
+# runs (or queries) that landed since the last lookup are read.
+def update(results_path):
+    db = runindex.connect(results_path)
+    pending = db.execute('SELECT q.rdir, q.query FROM queries q '
+                         'LEFT JOIN indexed i USING (rdir, query) '
+                         'WHERE i.rdir IS NULL').fetchall()
+    for rdir, query in pending:
+        result = store.read_query(results_path, rdir, query) or {}
+        rows = [ (item.get('title', ''), item.get('snippet', ''),
+                  item.get('link', ''), rdir, query, rank)
+                 for rank, item in enumerate(result.get('items', []), 1) ]
+        with db:
+            first = last = None
+            for row in rows:
+                rowid = db.execute('INSERT INTO items (title, snippet, '
+                                   'link, rdir, query, position) '
+                                   'VALUES (?, ?, ?, ?, ?, ?)',
+                                   row).lastrowid
+                first = first or rowid
+                last = rowid
+            db.execute('INSERT OR REPLACE INTO indexed VALUES (?, ?, ?, ?)',
+                       (rdir, query, first, last))
+    return len(pending)
+
+# Plain words are all required; FTS5 syntax ("a phrase", OR, NEAR, title:x)
+# is passed through when it parses.
+def quote(terms):
+    return ' '.join('"' + word.replace('"', '""') + '"'
+                    for word in terms.split())
+
+# [ (rdir, query, rank, title, link, snippet) ], best match first.  The
+# snippet has the matched terms in [brackets].
+def find(results_path, terms, rdirs=None, queries=None, limit=20):
+    sql = ('SELECT rdir, query, position, title, link, '
+           "snippet(items, 1, '[', ']', '...', 16) FROM items "
+           'WHERE items MATCH ?')
+    args = []
+    if rdirs is not None:
+        sql += f' AND rdir IN ({",".join("?" * len(rdirs))})'
+        args += rdirs
+    if queries:
+        sql += f' AND query IN ({",".join("?" * len(queries))})'
+        args += queries
+    sql += f' ORDER BY bm25(items, {", ".join(map(str, WEIGHTS))}) LIMIT ?'
+    args.append(limit)
+
+    db = runindex.connect(results_path)
+    try:
+        return db.execute(sql, [ terms, *args ]).fetchall()
+    except sqlite3.OperationalError:
+        return db.execute(sql, [ quote(terms), *args ]).fetchall()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+import os
+import json
+import time
+import threading
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+# A run's journal is an append-only JSONL file of (state, query) status
+# changes; the last line for a pair is its current status.  Appending means an
+# interrupted sweep loses at most the searches that were in flight.  The
+# first line holds the run's settings (e.g. depth and max_age), so a resumed
+# run finishes with the ones it started with.
+class Journal:
+    def __init__(self, path):
+        self.path = path
+        self.run_id = os.path.basename(path).removesuffix('.jsonl')
+        self.lock = threading.Lock()
+        self.tasks = dict()
+        self.settings = dict()
+
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                for line in file:
+                    if not line.strip(): continue
+                    entry = json.loads(line)
+                    if 'settings' in entry:
+                        self.settings = entry['settings']
+                        continue
+                    self.tasks[(entry['state'], entry['query'])] = entry
+
+    # Runs started in the same second get ids with a -2, -3, ... suffix.
+    @classmethod
+    def create(cls, journals_path, settings=None):
+        os.makedirs(journals_path, exist_ok=True)
+        time_str = time.strftime("%d-%m-%Y_%H:%M:%S")
+        run_id, n = time_str, 1
+        while True:
+            path = os.path.join(journals_path, f'{run_id}.jsonl')
+            try:
+                with open(path, 'x') as file:
+                    file.write(json.dumps({ 'settings': settings or {} })
+                               + '\n')
+                break
+            except FileExistsError:
+                n += 1
+                run_id = f'{time_str}-{n}'
+        return cls(path)
+
+    @classmethod
+    def load(cls, journals_path, run_id):
+        path = os.path.join(journals_path, f'{run_id}.jsonl')
+        if not os.path.exists(path):
+            raise Exception(f'Run {run_id} does not exist.')
+        return cls(path)
+
+    def write(self, entries):
+        with self.lock, open(self.path, 'a') as file:
+            for entry in entries:
+                self.tasks[(entry['state'], entry['query'])] = entry
+                file.write(json.dumps(entry) + '\n')
+
+    def add(self, tasks):
+        self.write({ 'state': state, 'query': query,
+                     'rdir': os.path.basename(rdir), 'status': PENDING }
+                   for state, query, rdir in tasks)
+
+    def mark(self, state, query, status, error=None):
+        entry = dict(self.tasks[(state, query)], status=status)
+        entry.pop('error', None)
+        if error: entry['error'] = error
+        self.write([entry])
+
+    def unfinished(self):
+        return [ (e['state'], e['query'], e['rdir'])
+                 for e in self.tasks.values() if e['status'] != DONE ]
+
+    def counts(self):
+        counts = { PENDING: 0, DONE: 0, FAILED: 0 }
+        for entry in self.tasks.values():
+            counts[entry['status']] += 1
+        return counts
+
+    def summary(self):
+        counts = self.counts()
+        text = (f'Run {self.run_id}: {counts[DONE]} done, '
+                f'{counts[FAILED]} failed, {counts[PENDING]} pending.')
+        if counts[FAILED] or counts[PENDING]:
+            text += f'\nResume with: main.py search --resume {self.run_id}'
+        return text
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+# Custom Search quotas reset at midnight Pacific time.
+QUOTA_TZ = ZoneInfo('America/Los_Angeles')
+
+DAILY = 'daily'
+MINUTE = 'minute'
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+
+# Reasons compared without case or underscores: the errors list spells them
+# rateLimitExceeded, ErrorInfo details RATE_LIMIT_EXCEEDED.
+QUOTA_REASONS = { 'ratelimitexceeded', 'userratelimitexceeded',
+                  'dailylimitexceeded', 'quotaexceeded' }
+# Queries spent between writes of the ledger; see KeyPool.flush().
+LEDGER_EVERY = int(os.getenv('LEDGER_EVERY') or 20)
+
+class QuotaExhausted(Exception):
+    pass
+
+def quota_day():
+    return datetime.now(QUOTA_TZ).date().isoformat()
+
+def fingerprint(key):
+    return hashlib.sha256(key.encode()).hexdigest()[:12]
+
+def reason_key(reason):
+    return str(reason).replace('_', '').lower()
+
+# The entries of the body's "errors" and "details" lists.  Both are read:
+# googleapiclient's error_details only keeps "details" when there is one,
+# and quota 403s carry their reason in both.
+def error_entries(error):
+    try:
+        body = json.loads(error.content or b'{}').get('error') or {}
+    except (ValueError, AttributeError):
+        return [], ''
+    if not isinstance(body, dict): return [], ''
+    entries = [ e for key in ('errors', 'details')
+                for e in (body.get(key) or []) if isinstance(e, dict) ]
+    return entries, str(body.get('message', ''))
+
+# The message, reasons and metadata (e.g. ErrorInfo's quota_limit) of an
+# error's body.  str(error) is not used: it holds the request URI, and with
+# it the query text.
+def details_text(error):
+    entries, message = error_entries(error)
+    parts = [ message ]
+    for e in entries:
+        parts += [ str(e.get('message', '')), str(e.get('reason', '')) ]
+        parts += [ str(v) for v in (e.get('metadata') or {}).values() ]
+    return ' '.join(parts).lower()
+
+def classify(error):
+    status = int(error.resp.status)
+    text = details_text(error)
+    reasons = { reason_key(e.get('reason'))
+                for e in error_entries(error)[0] if e.get('reason') }
+    if status == 429 or (status == 403 and reasons & QUOTA_REASONS):
+        if 'per day' in text or 'perday' in text or 'daily' in text:
+            return DAILY
+        return MINUTE
+    if status >= 500:
+        return TRANSIENT
+    return PERMANENT
+
+# Hands out the key with the most budget left today and keeps a ledger of
+# queries spent per key per day, so budgets survive across runs.  Keys are
+# stored by fingerprint only.  acquire() reserves a query of the key's
+# budget, which spend() then counts as spent and release() gives back, so
+# concurrent workers never overshoot a key's limit.
+class KeyPool:
+    def __init__(self, keys, daily_limit, ledger_path):
+        if not keys:
+            raise Exception("No API key set (CSE_KEY).")
+        self.keys = keys
+        self.daily_limit = daily_limit
+        self.ledger_path = ledger_path
+        self.lock = threading.Lock()
+        self.day = None
+        self.spent = dict()
+        self.reserved = dict()
+        self.unsaved = 0
+        self.load()
+
+    def load(self):
+        self.day = quota_day()
+        self.spent = dict()
+        if not self.ledger_path or not os.path.exists(self.ledger_path):
+            return
+        with open(self.ledger_path, 'r') as file:
+            ledger = json.load(file)
+        self.spent = ledger.get(self.day, dict())
+
+    def save(self):
+        if not self.ledger_path:
+            self.unsaved = 0
+            return
+        ledger = dict()
+        if os.path.exists(self.ledger_path):
+            with open(self.ledger_path, 'r') as file:
+                ledger = json.load(file)
+        ledger[self.day] = self.spent
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.ledger_path)),
+                    exist_ok=True)
+        tmp_path = f'{self.ledger_path}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(ledger, file, indent=1)
+        os.replace(tmp_path, self.ledger_path)
+        self.unsaved = 0
+
+    def remaining(self, key):
+        f = fingerprint(key)
+        return (self.daily_limit - self.spent.get(f, 0) -
+                self.reserved.get(f, 0))
+
+    def acquire(self):
+        with self.lock:
+            if self.day != quota_day():
+                self.save()
+                self.load()
+            key = max(self.keys, key=self.remaining)
+            if self.remaining(key) <= 0:
+                raise QuotaExhausted("Every key is out of quota for today.")
+            f = fingerprint(key)
+            self.reserved[f] = self.reserved.get(f, 0) + 1
+            return key
+
+    def unreserve(self, f):
+        self.reserved[f] = max(0, self.reserved.get(f, 0) - 1)
+
+    def spend(self, key):
+        with self.lock:
+            f = fingerprint(key)
+            self.unreserve(f)
+            self.spent[f] = self.spent.get(f, 0) + 1
+            self.unsaved += 1
+            if self.unsaved >= LEDGER_EVERY:
+                self.save()
+
+    # For a request that failed without using quota.
+    def release(self, key):
+        with self.lock:
+            self.unreserve(fingerprint(key))
+
+    def exhaust(self, key):
+        with self.lock:
+            f = fingerprint(key)
+            self.unreserve(f)
+            self.spent[f] = max(self.daily_limit, self.spent.get(f, 0))
+            self.save()
+
+    def flush(self):
+        with self.lock:
+            if self.unsaved:
+                self.save()
+
+    def exhausted(self):
+        with self.lock:
+            return all(self.remaining(k) <= 0 for k in self.keys)
+
+    def report(self):
+        lines = [ f'Quota ({self.day}):' ]
+        for key in self.keys:
+            spent = self.daily_limit - self.remaining(key)
+            lines.append(f'\tkey ...{key[-4:]}: {spent}/{self.daily_limit}')
+        return '\n'.join(lines)
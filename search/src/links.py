@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+import os
+import re
+import json
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query parameters that only track where a click came from.
+TRACKING_PARAMS = { 'gclid', 'fbclid', 'msclkid', 'dclid', 'mc_cid', 'mc_eid',
+                    '_ga', '_gl', 'ref', 'ref_src', 'igshid', 'srsltid' }
+TRACKING_PREFIXES = ('utm_',)
+DEFAULT_PORTS = { 'http': 80, 'https': 443 }
+SCHEME = re.compile(r'^[a-z][a-z0-9+.-]*:(?!\d)', re.I)
+
+# One spelling per page: https, lower-case host without "www." or a default
+# port, no fragment, no trailing slash, no tracking parameters and the
+# remaining parameters sorted.  Anything that is not an http(s) URL is only
+# stripped.  Bare domains are taken as https.
+def canonical_url(url):
+    url = url.strip()
+    if url.startswith('//'):
+        url = 'https:' + url
+    elif not SCHEME.match(url):
+        url = 'https://' + url
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    if parts.scheme.lower() not in DEFAULT_PORTS:
+        return url
+
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if port and port != DEFAULT_PORTS[parts.scheme.lower()]:
+        host = f'{host}:{port}'
+
+    path = parts.path.rstrip('/')
+    params = [ (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+               if k.lower() not in TRACKING_PARAMS
+               and not k.lower().startswith(TRACKING_PREFIXES) ]
+    return urlunsplit(('https', host, path, urlencode(sorted(params)), ''))
+
+# canonical URL -> [ [state, query, rank, run], ... ]
+def build_index(records):
+    index = dict()
+    for record in records:
+        index.setdefault(canonical_url(record['link']), []).append(
+            [ record['state'], record['query'], record['rank'], record['run'] ])
+    return index
+
+def save_index(path, index):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(index, file, separators=(',', ':'), sort_keys=True)
+    os.replace(tmp_path, path)
+
+def load_index(path):
+    with open(path, 'r') as file:
+        return json.load(file)
+
+# { (run, query, rank): canonical URL } for the occurrences of the given
+# runs (all of them without `runs`), so readers of the index need not
+# canonicalize links again.
+def canonical_links(index, runs=None):
+    runs = set(runs) if runs is not None else None
+    return { (run, query, rank): url for url, occurrences in index.items()
+             for _, query, rank, run in occurrences
+             if runs is None or run in runs }
+
+# Reviewers look at every occurrence of a link today; with duplicates
+# collapsed they look at each page once per state.
+def stats(index, top=10):
+    occurrences = sum(len(o) for o in index.values())
+    per_state = sum(len({ o[0] for o in occ }) for occ in index.values())
+    repeated = sorted(index.items(), key=lambda e: len(e[1]), reverse=True)
+    return { 'occurrences': occurrences,
+             'canonical_urls': len(index),
+             'state_url_pairs': per_state,
+             'saved': occurrences - per_state,
+             'saved_fraction': 1 - per_state / occurrences if occurrences else 0,
+             'most_repeated': [ (url, len(occ)) for url, occ in repeated[:top] ] }
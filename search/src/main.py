@@ -3,12 +3,48 @@ import os, sys
 import json
 import time
 import argparse
+import threading
+from functools import partial
 
-API_KEY = os.getenv('CSE_KEY')
+from executor import RateLimiter, run_tasks
+from cache import ResponseCache, parse_age
+import runindex
+import store
+
+# CSE_KEY may hold several comma-separated keys to rotate through.
+API_KEYS = [ k.strip() for k in (os.getenv('CSE_KEY') or '').split(',')
+             if k.strip() ]
 LOGGING = os.getenv('LOGGING')
 MOBILE_ID_TERMS = os.getenv('MOBILE_ID_TERMS')
 SEARCHLIST_PATH = os.getenv('SEARCHLIST')
 
+CSE_CX = os.getenv('CSE_CX') or "3548decfb27244f8b"
+CACHE_PATH = os.getenv('CACHE_PATH')
+CACHE_TTL = parse_age(os.getenv('CACHE_TTL') or '1d')
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES') or 256 * 2 ** 20)
+
+# Custom Search allows 100 queries per minute per user by default.
+CSE_RATE = int(os.getenv('CSE_RATE') or 100)
+CSE_WORKERS = int(os.getenv('CSE_WORKERS') or 1)
+CSE_DAILY_LIMIT = int(os.getenv('CSE_DAILY_LIMIT') or 100)
+CSE_MAX_RETRIES = int(os.getenv('CSE_MAX_RETRIES') or 5)
+CSE_DEPTH = int(os.getenv('CSE_DEPTH') or 1)
+
+# The API serves 10 results per page and no results past the 100th.
+PAGE_SIZE = 10
+MAX_DEPTH = 10
+
+RATE_LIMITER = RateLimiter(CSE_RATE)
+# Pages 2..depth of every query are fetched on one pool kept for the whole
+# process, so its threads keep their services (and connections; see
+# client.py), and no more requests than there are workers are in flight at
+# once, first pages included.  The pool is made by set_workers(), which
+# "search" calls first.
+PAGE_POOL = None
+IN_FLIGHT = threading.BoundedSemaphore(CSE_WORKERS)
+CACHE = ResponseCache(CACHE_PATH, CACHE_MAX_BYTES) if CACHE_PATH else None
+LOG_LOCK = threading.Lock()
+
 if os.getenv("USE_TMP"):
     QUERIES_PATH = os.getenv('TMP_QUERIES_PATH') or os.getenv('QUERIES_PATH')
     STATES_PATH = os.getenv('TMP_STATES_PATH') or os.getenv('STATES_PATH')
@@ -18,15 +54,65 @@ else:
     STATES_PATH = os.getenv('STATES_PATH')
     RESULTS_PATH = os.getenv('RESULTS_PATH')
 
-
-with open(QUERIES_PATH, 'r') as file:
-    QUERIES = json.load(file)
-
-with open(STATES_PATH, 'r') as file:
-    STATES = json.load(file)
-
-with open(SEARCHLIST_PATH, 'r') as file:
-    SEARCHLIST = [s.strip() for s in file.readlines()]
+JOURNALS_PATH = (os.getenv('JOURNALS_PATH') or
+                 os.path.join(os.path.dirname(os.path.normpath(RESULTS_PATH)),
+                              'journals'))
+LEDGER_PATH = (os.getenv('LEDGER_PATH') or
+               os.path.join(os.path.dirname(os.path.normpath(RESULTS_PATH)),
+                            'ledger.json'))
+DATASET_PATH = (os.getenv('DATASET_PATH') or
+                os.path.join(os.path.dirname(os.path.normpath(RESULTS_PATH)),
+                             'dataset.jsonl'))
+LINK_INDEX_PATH = (os.getenv('LINK_INDEX') or
+                   os.path.join(os.path.dirname(os.path.normpath(RESULTS_PATH)),
+                                'links.json'))
+SNAPSHOTS_PATH = (os.getenv('SNAPSHOTS_PATH') or
+                  os.path.join(os.path.dirname(os.path.normpath(RESULTS_PATH)),
+                               'snapshots'))
+SNAPSHOT_TOP = int(os.getenv('SNAPSHOT_TOP') or 3)
+METRICS_PATH = (os.getenv('METRICS_PATH') or
+                os.path.join(os.path.dirname(os.path.normpath(RESULTS_PATH)),
+                             'metrics.jsonl'))
+KEYS = None
+METRICS = None
+PLAN = None
+PLAN_LOCK = threading.Lock()
+NAMES = None
+
+# The queries, states and search list, with every (state, query) search
+# rendered (see convert.py).  Read on first use, so actions that need none
+# of them never parse the config files.
+def get_plan():
+    import convert
+
+    global PLAN
+    with PLAN_LOCK:
+        if PLAN is None:
+            PLAN = convert.load_plan(convert.plan_path(QUERIES_PATH),
+                                     QUERIES_PATH, STATES_PATH, SEARCHLIST_PATH)
+    return PLAN
+
+# (states, queries) as in states.json and queries.json, for actions that
+# only check or list names and never render a search.
+def get_names():
+    global NAMES
+    if PLAN is not None:
+        return PLAN.states, PLAN.queries
+    if NAMES is None:
+        with open(STATES_PATH, 'r') as file:
+            states = json.load(file)
+        with open(QUERIES_PATH, 'r') as file:
+            NAMES = (states, json.load(file))
+    return NAMES
+
+def set_workers(workers):
+    from concurrent.futures import ThreadPoolExecutor
+
+    global PAGE_POOL, IN_FLIGHT
+    workers = max(1, workers)
+    if PAGE_POOL: PAGE_POOL.shutdown(wait=False)
+    PAGE_POOL = ThreadPoolExecutor(max_workers=workers)
+    IN_FLIGHT = threading.BoundedSemaphore(workers)
 
 # ---------------------------- RESULTS DIRECTORY ------------------------------
 def make_rdir(state):
@@ -34,7 +120,7 @@ def make_rdir(state):
         return os.path.join(RESULTS_PATH, f'{state}_{time_str}')
 
 def get_rdir_noinput(state, selection):
-    directories = [ d for d in sorted(os.listdir(RESULTS_PATH)) if state in d ]
+    directories = runindex.get_runs(RESULTS_PATH, state)
     if len(directories) == 0:
         raise Exception("State does not exist.")
     if not 0 <= int(selection) < len(directories):
@@ -43,7 +129,7 @@ def get_rdir_noinput(state, selection):
     return directories[int(selection)]
 
 def get_rdir_input(state):
-    directories = [ d for d in sorted(os.listdir(RESULTS_PATH)) if state in d ]
+    directories = runindex.get_runs(RESULTS_PATH, state)
     if len(directories) == 0:
         raise Exception("State does not exist.")
     if len(directories) == 1:
@@ -51,7 +137,7 @@ def get_rdir_input(state):
 
     print("Choose a directory:")
     for i in range(len(directories)):
-        subdirs = os.listdir(os.path.join(RESULTS_PATH, directories[i]))
+        subdirs = runindex.get_queries(RESULTS_PATH, directories[i])
         print(f"\t{i} - {directories[i]} ({', '.join(subdirs)})")
     index = int(input(">> "))
     if not 0 <= index < len(directories):
@@ -59,21 +145,7 @@ def get_rdir_input(state):
     return directories[index]
 
 def get_most_recent_rdirs():
-    convert = lambda t: time.mktime(time.strptime(t, "%d-%m-%Y_%H:%M:%S"))
-    
-    states = dict()
-    for rdir in os.listdir(RESULTS_PATH):
-        state = rdir[:rdir.find('_')]
-        tval = convert(rdir[rdir.find('_') + 1:])
-        if tval > states.get(state, (0, None))[0]:
-            states[state] = (tval, rdir)
-
-    results = []
-    for state in states:
-        results.append(states[state][1])
-
-    results.sort()
-    return results
+    return runindex.get_most_recent(RESULTS_PATH)
 
 def get_rdirs(state, single=False, select=None, most_recent=None, time=None):
     if state == 'all':
@@ -82,23 +154,21 @@ def get_rdirs(state, single=False, select=None, most_recent=None, time=None):
         elif most_recent:
             rdirs = get_most_recent_rdirs()
         else:
-            rdirs = os.listdir(RESULTS_PATH)
+            rdirs = runindex.get_runs(RESULTS_PATH)
         if time:
             rdirs = [ r for r in rdirs if time in r ]
 
         return rdirs
 
     if most_recent:
-        rdirs = [ r for r in get_most_recent_rdirs() if state in r ]
+        rdirs = runindex.get_most_recent(RESULTS_PATH, state)
     elif select:
         rdirs = [ get_rdir_noinput(state, select) ]
     else:
         if single:
             rdirs = [ get_rdir_input(state) ]
         else:
-            rdirs = [os.path.join(RESULTS_PATH, r)
-                     for r in os.listdir(RESULTS_PATH) 
-                     if state in r]
+            rdirs = runindex.get_runs(RESULTS_PATH, state)
 
     if time:
         rdirs = [ r for r in rdirs if time in r ]
@@ -110,17 +180,9 @@ def get_rdirs(state, single=False, select=None, most_recent=None, time=None):
 # -----------------------------------------------------------------------------
 
 
-def process(state, query, selection):
-    path = os.path.join(RESULTS_PATH, selection, query, f'{query}.json')
-    if not os.path.exists(path): return
-    with open(path, 'r') as file:
-        query_results = json.load(file)
- 
 def view(state, query, selection):
-    path = os.path.join(RESULTS_PATH, selection, query, f'{query}.json')
-    if not os.path.exists(path): return
-    with open(path, 'r') as file:
-        query_results = json.load(file)
+    query_results = store.read_query(RESULTS_PATH, selection, query)
+    if query_results is None: return
     
     print(f'{selection}:')
     print(f"\t{query_results['queries']['request'][0]['searchTerms']} ({query})\n")
@@ -137,55 +199,221 @@ def view(state, query, selection):
 
 
 # ----------------------------------JSON API ----------------------------------
-def search(query, key):
+def log_retry(params, key, attempt, kind, sleep_time):
+    if not LOGGING: return
+    with LOG_LOCK, open(LOGGING, 'a') as file:
+        time_str = time.strftime("%d-%m-%Y_%H:%M:%S")
+        text = (f'\n{time_str}query={params["q"]}\tattempt={attempt}'
+                f'\tkey=...{key[-4:]}\terror={kind}\tsleep_time={sleep_time}')
+        file.write(text)
+
+# One metrics event per request (see metrics.py); `tags` names the state,
+# query and result directory it was for.
+def log_request(tags, params, start, **event):
+    if not METRICS: return
+    METRICS.emit(**(tags or {}), start=int(params.get('start', 1)),
+                 latency=time.perf_counter() - start, **event)
+
+# Per-day quota errors retire the key for the day and move on to the next
+# one; per-minute and server errors are retried a bounded number of times;
+# anything else (e.g. a malformed query) fails straight away.
+def search(params, tags=None):
+    from googleapiclient.errors import HttpError
+    from client import cse_list, received
+    from keys import classify, fingerprint, DAILY, MINUTE, PERMANENT
+
     attempt = 0
     while True:
+        key = KEYS.acquire()
+        RATE_LIMITER.wait()
+        start = time.perf_counter()
         try:
-            service = build("customsearch", "v1", developerKey=key)
-
-            s = service.cse().list(q=query,
-                                   cx="3548decfb27244f8b"
-                                  ).execute()
-            return s
+            with IN_FLIGHT:
+                result = cse_list(key, **params)
+            KEYS.spend(key)
+            log_request(tags, params, start, attempt=attempt, status=200,
+                   items=len(result.get('items', [])),
+                   bytes=received(), key=fingerprint(key))
+            return result
 
         except HttpError as e:
-            sleep_time = 45 * 2 ** attempt
-            print(f'Sleeping {sleep_time} seconds. (attempt {attempt})')
+            kind = classify(e)
+            event = dict(attempt=attempt, status=int(e.resp.status), kind=kind,
+                         bytes=len(e.content or b''), key=fingerprint(key))
+            if kind == DAILY:
+                KEYS.exhaust(key)
+                log_request(tags, params, start, **event)
+                log_retry(params, key, attempt, kind, 0)
+                continue
+            KEYS.release(key)
+            if kind == PERMANENT or attempt >= CSE_MAX_RETRIES:
+                log_request(tags, params, start, **event)
+                raise
+
+            if kind == MINUTE:
+                sleep_time = 61 - time.time() % 60
+            else:
+                sleep_time = min(5 * 2 ** attempt, 300)
+            log_request(tags, params, start, backoff=sleep_time, **event)
+            print(f'Sleeping {sleep_time:.0f} seconds. ({kind}, attempt {attempt})')
+            log_retry(params, key, attempt, kind, sleep_time)
             time.sleep(sleep_time)
-
-            if LOGGING:
-                with open(LOGGING, 'a') as file:
-                    time_str = time.strftime("%d-%m-%Y_%H:%M:%S")
-                    text = f'\n{time_str}query={query}\tattempt={attempt}\tsleep_time={sleep_time}'
-                    file.write(text)
             attempt += 1
 
-def search_wrapper(state, query, state_dir = None):
-    statute, dmv_website = STATES[state]
-    query_text = QUERIES[query].format(STATE=state,
-                                       STATE_STATUTE=statute, 
-                                       DMV_WEBSITE=dmv_website)
+        except Exception as e:
+            KEYS.release(key)
+            log_request(tags, params, start, attempt=attempt, status=None,
+                   kind=type(e).__name__, key=fingerprint(key))
+            raise
+
+def search_page(params, max_age, tags=None):
+    start = time.perf_counter()
+    result = CACHE.get(params, max_age) if CACHE else None
+    if result is None:
+        result = search(params, tags)
+        if CACHE: CACHE.put(params, result)
+    else:
+        log_request(tags, params, start, cached=True,
+               items=len(result.get('items', [])))
+    return result
+
+def last_page(first, depth):
+    if 'nextPage' not in first.get('queries', {}):
+        return 1
+    total = int(first.get('searchInformation', {}).get('totalResults', 0))
+    return max(1, min(depth, -(-total // PAGE_SIZE)))
+
+# Pages 2..depth are fetched concurrently on PAGE_POOL once the first page
+# shows how many results there are.  A page without items or without a
+# nextPage ends the result set, and later pages are discarded (or never
+# started).
+def search_pages(params, depth, max_age, tags=None):
+    from concurrent.futures import as_completed
+
+    first = search_page(params, max_age, tags)
+    pages = [ first ]
+    last = last_page(first, depth)
+    if last == 1:
+        return first
+
+    results = dict()
+    end = last
+    futures = { PAGE_POOL.submit(search_page,
+                                 dict(params, start=n * PAGE_SIZE + 1),
+                                 max_age, tags): n
+                for n in range(1, last) }
+    for future in as_completed(futures):
+        n = futures[future]
+        if n >= end: continue
+        page = future.result()
+        results[n] = page
+        if 'items' not in page or 'nextPage' not in page.get('queries', {}):
+            end = n + 1 if 'items' in page else n
+            for f, m in futures.items():
+                if m >= end: f.cancel()
+
+    pages += [ results[n] for n in range(1, end) ]
+    merged = dict(first, queries=dict(first['queries']))
+    merged['items'] = [ item for page in pages for item in page.get('items', []) ]
+    if 'nextPage' in pages[-1].get('queries', {}):
+        merged['queries']['nextPage'] = pages[-1]['queries']['nextPage']
+    else:
+        merged['queries'].pop('nextPage', None)
+    return merged
+
+def search_wrapper(state, query, state_dir = None, max_age = CACHE_TTL,
+                   depth = 1):
+    query_text = get_plan().tasks[(state, query)].text
     if not state_dir:
         state_dir = make_rdir(state)
-
-    qdir_path = os.path.join(state_dir, query)
-    qjson_path = os.path.join(qdir_path, f'{query}.json')
-
-    os.makedirs(qdir_path)
-
-    result = search(query_text, API_KEY)
-    with open(qjson_path, 'w') as f:
-        json.dump(result, f, indent=1)
+    rdir = os.path.basename(state_dir)
+
+    params = { 'q': query_text, 'cx': CSE_CX }
+    tags = { 'rdir': rdir, 'state': state, 'query': query }
+    result = search_pages(params, depth, max_age, tags)
+    offset, length = store.write_query(RESULTS_PATH, rdir, query, result)
+    runindex.record_query(RESULTS_PATH, rdir, query,
+                          len(result.get('items', [])), offset, length)
+
+def search_all(tasks, workers, journal = None, **options):
+    from journal import DONE, FAILED
+    from keys import QuotaExhausted
+
+    failed = []
+    func = partial(search_wrapper, **options)
+    for task, _, exception in run_tasks(func, tasks, workers):
+        state, query = task[:2]
+        if isinstance(exception, QuotaExhausted):
+            continue
+        if exception:
+            print(f'{state} ({query}) failed: {exception!r}')
+            failed.append(task)
+        else:
+            print(f'{state} ({query})')
+        if journal:
+            journal.mark(state, query, FAILED if exception else DONE,
+                         repr(exception) if exception else None)
+    return failed
+
+# Makes the result of each derived task out of its parent's, searched earlier
+# in the same run (see optimize.py).  Returns the tasks that could not be
+# derived, to search, and the pages of results derived.
+def derive_all(derived, journal = None, depth = 1):
+    from journal import DONE
+    import optimize
+
+    fallback = []
+    pages = 0
+    for task, (parent, excluded) in derived.items():
+        state, query, state_dir = task
+        rdir = os.path.basename(state_dir)
+        result = store.read_query(RESULTS_PATH, rdir, parent)
+        if result is not None:
+            result = optimize.derive(result, excluded, depth,
+                                     get_plan().tasks[(state, query)].text,
+                                     parent)
+        if result is None:
+            fallback.append(task)
+            continue
+        offset, length = store.write_query(RESULTS_PATH, rdir, query, result)
+        runindex.record_query(RESULTS_PATH, rdir, query,
+                              len(result.get('items', [])), offset, length)
+        pages += optimize.pages(result)
+        print(f'{state} ({query}) from ({parent})')
+        if journal:
+            journal.mark(state, query, DONE)
+    return fallback, pages
+
+# Cuts the results of the given parent tasks (see optimize.deepened()),
+# searched a page deeper for their children, back to `depth` pages once the
+# children are derived, so they are stored like any other search.  Returns
+# the pages they took past `depth`.
+def trim_parents(parents, depth):
+    import optimize
+
+    pages = 0
+    for state, query, state_dir in parents:
+        rdir = os.path.basename(state_dir)
+        result = store.read_query(RESULTS_PATH, rdir, query)
+        if result is None: continue
+        pages += max(0, optimize.pages(result) - depth)
+        trimmed = optimize.trim(result, depth)
+        if trimmed is result: continue
+        offset, length = store.write_query(RESULTS_PATH, rdir, query, trimmed)
+        runindex.record_query(RESULTS_PATH, rdir, query,
+                              len(trimmed['items']), offset, length)
+    return pages
 # -----------------------------------------------------------------------------
 
 
 # ----------------------------------- CLI -------------------------------------
 def verify_state_and_query(state, queries):
-    if state != 'all' and state not in STATES:
+    states, known = get_names()
+    if state != 'all' and state not in states:
         raise Exception("Argument is not a state.")
     if not queries: return
     for query in queries:
-        if query not in QUERIES:
+        if query not in known:
             raise Exception("Query is invalid.")
 
 def main(args):
@@ -193,8 +421,9 @@ def main(args):
     parser.add_argument('-q', '--queries', nargs = '*',
                         help='choose specific queries (default all).')
     select = parser.add_mutually_exclusive_group()
-    select.add_argument('-s', '--select',
-                        help='choose the result directory to process.')
+    select.add_argument('-s', '--select', nargs='+',
+                        help=('choose the result directory to process (two '
+                              'for "diff").'))
     select.add_argument('--most-recent', action='store_true',
                         help='only choose the most recent result directories.')
     parser.add_argument('-t', '--time',
@@ -204,31 +433,101 @@ def main(args):
     parser.add_argument('--confirm', metavar="i", type=int,
                         help=('prompt a confirmation every i searches '
                               'when searching "all".'))
-    parser.add_argument('action', choices=('process', 'view',
-                                           'search', 'list'),
-                        metavar="<process, view, search, list>",
+    parser.add_argument('-w', '--workers', type=int,
+                        help=('number of searches to run concurrently '
+                              f'(default {CSE_WORKERS}), or of processes '
+                              'for "process" (default one per core).'))
+    parser.add_argument('-o', '--output',
+                        help=('file "process" writes the dataset to '
+                              '(default DATASET_PATH), or "links" the link '
+                              'index verify/src/export.py reads to (default '
+                              'LINK_INDEX).'))
+    parser.add_argument('--rate', type=int, default=CSE_RATE,
+                        help=('maximum searches started per minute, shared '
+                              f'by all workers (default {CSE_RATE}).'))
+    parser.add_argument('--max-age', type=parse_age, default=CACHE_TTL,
+                        help=('reuse cached responses younger than this '
+                              '(seconds, or with a s/m/h/d suffix; 0 always '
+                              'queries the API).'))
+    parser.add_argument('--depth', metavar='N', type=int, default=CSE_DEPTH,
+                        help=('fetch up to N pages of 10 results per query '
+                              f'(1-{MAX_DEPTH}, default {CSE_DEPTH}).'))
+    parser.add_argument('--resume', metavar='run',
+                        help=('re-issue the unfinished searches of a run, '
+                              'with the depth and max age it started with.'))
+    parser.add_argument('--optimize', action='store_true',
+                        help=('derive searches from broader ones of the same '
+                              'run where "optimize" found that sound.'))
+    parser.add_argument('action', choices=('process', 'view', 'search',
+                                           'list', 'index', 'links', 'diff',
+                                           'find', 'snapshot', 'grep', 'stats',
+                                           'optimize'),
+                        metavar=("<process, view, search, list, index, links, "
+                                 "diff, find, snapshot, grep, stats, "
+                                 "optimize>"),
                         help='choose an action.')
-    parser.add_argument('state',
+    parser.add_argument('--top', metavar='N', type=int, default=SNAPSHOT_TOP,
+                        help=('archive the pages of the first N results of '
+                              f'each query with "snapshot" (default '
+                              f'{SNAPSHOT_TOP}).'))
+    parser.add_argument('--limit', type=int, default=20,
+                        help=('number of matches "find" shows, of slowest '
+                              'queries "stats" shows, or of runs "optimize" '
+                              'compares per pair of queries (default 20).'))
+    parser.add_argument('state', nargs='?',
                         metavar='<state>',
-                        help='choose a state (or "all").')
+                        help=('choose a state (or "all"); the terms to look '
+                              'for with "find", the pattern with "grep", or '
+                              'the search run (or "all") for "stats".'))
     parsed = parser.parse_args(args)
+    if parsed.state is None and not (parsed.action in ('index', 'stats') or
+                                     parsed.action == 'search'
+                                     and parsed.resume):
+        parser.error('the following arguments are required: <state>')
+    if not 1 <= parsed.depth <= MAX_DEPTH:
+        parser.error(f'--depth must be between 1 and {MAX_DEPTH}.')
+    selects = parsed.select or []
+    if len(selects) > (2 if parsed.action == 'diff' else 1):
+        parser.error(f'too many result directories for "{parsed.action}".')
+    parsed.select = selects[0] if selects else None
 
     match parsed.action:
-        case 'process' | 'view':
-            func = process if parsed.action == 'process' else view
+        case 'process':
+            import dataset
+
+            verify_state_and_query(parsed.state, parsed.queries)
+            if parsed.state == 'all':
+                rdirs = get_rdirs('all', False, parsed.select,
+                                  parsed.most_recent, parsed.time)
+                states = get_names()[0]
+                rdirs = [ r for r in rdirs if r[:r.find('_')] in states ]
+            else:
+                rdir = get_rdirs(parsed.state, True, parsed.select,
+                                 parsed.most_recent, parsed.time)
+                rdirs = [ rdir ] if rdir else []
+
+            output = parsed.output or DATASET_PATH
+            count = dataset.build(RESULTS_PATH, rdirs, output, parsed.queries,
+                                  parsed.workers)
+            print(f'Wrote {count} records from {len(rdirs)} result '
+                  f'directories to {output}.')
+
+        case 'view':
+            func = view
 
             verify_state_and_query(parsed.state, parsed.queries)
             if parsed.state == 'all':
                 result_directories = get_rdirs('all', False, parsed.select, 
                                                parsed.most_recent, parsed.time)
 
+                states, known = get_names()
                 for rdir in result_directories:
                     state = rdir[:rdir.find('_')]
-                    if state not in STATES: continue
+                    if state not in states: continue
                     if parsed.queries:
                         queries = parsed.queries
                     else:
-                        queries = QUERIES
+                        queries = known
 
                     for query in queries:
                         func(state, query, rdir)
@@ -239,47 +538,147 @@ def main(args):
             if parsed.queries:
                 queries = parsed.queries
             else:
-                queries = QUERIES
+                queries = get_names()[1]
 
             for query in queries:
                 func(parsed.state, query, rdir)
 
         case 'search':
-            from googleapiclient.discovery import build
-            from googleapiclient.errors import HttpError
-            verify_state_and_query(parsed.state, parsed.queries)
-
-            if parsed.queries:
-                queries = parsed.queries
+            from journal import Journal
+            from keys import KeyPool
+            from metrics import MetricsSink, PROMETHEUS_TEXTFILE
+            import metrics
+            import convert
+            import optimize
+
+            global KEYS, METRICS
+            KEYS = KeyPool(API_KEYS, CSE_DAILY_LIMIT, LEDGER_PATH)
+            RATE_LIMITER.set_rate(parsed.rate)
+            set_workers(parsed.workers or CSE_WORKERS)
+            confirm = int(parsed.confirm) if parsed.confirm else None
+
+            def proceed():
+                prompt = input('Proceed? ')
+                if prompt != 'y' and prompt != 'Y':
+                    exit()
+
+            if parsed.resume:
+                journal = Journal.load(JOURNALS_PATH, parsed.resume)
+                tasks = [ (state, query, os.path.join(RESULTS_PATH, rdir))
+                          for state, query, rdir in journal.unfinished() ]
+                parsed.depth = journal.settings.get('depth', parsed.depth)
+                parsed.max_age = journal.settings.get('max_age',
+                                                      parsed.max_age)
             else:
-                queries = QUERIES
-
-            if parsed.state == 'all':
-                def proceed():
-                    prompt = input('Proceed? ')
-                    if prompt != 'y' and prompt != 'Y':
-                        exit()
-                proceed()
-
-                confirm = int(parsed.confirm) if parsed.confirm else None
-
-                i = 0
-                for state in STATES:
-                    if state not in SEARCHLIST: continue
-                    print(state)
-                    if confirm and i % confirm == 0:
+                verify_state_and_query(parsed.state, parsed.queries)
+                plan = get_plan()
+                if parsed.state == 'all':
+                    proceed()
+                    planned = convert.sweep(plan, parsed.queries)
+                else:
+                    planned = [ plan.tasks[(parsed.state, query)] for query
+                                in parsed.queries or plan.queries ]
+                    confirm = None
+
+                rdirs = dict()
+                tasks = []
+                for task in planned:
+                    if task.state not in rdirs:
+                        rdirs[task.state] = make_rdir(task.state)
+                    tasks.append((task.state, task.query, rdirs[task.state]))
+                journal = Journal.create(JOURNALS_PATH,
+                                         { 'depth': parsed.depth,
+                                           'max_age': parsed.max_age })
+                journal.add(tasks)
+            print(f'Run {journal.run_id}')
+            METRICS = MetricsSink(METRICS_PATH, journal.run_id)
+
+            if parsed.optimize:
+                relations = optimize.relate(get_plan().tasks[task[:2]]
+                                            for task in tasks)
+                scores = optimize.validate(RESULTS_PATH, { optimize.pair(r)
+                                           for r in relations
+                                           if r.kind == 'exclusion' })
+
+            states = list(dict.fromkeys(task[0] for task in tasks))
+            batch = confirm or len(states) or 1
+            failed = []
+            derived_count = derived_pages = parent_pages = 0
+            checks = []
+            try:
+                for i in range(0, len(states), batch):
+                    if KEYS.exhausted():
+                        break
+                    if confirm:
                         print(f'{i} states searched.')
                         proceed()
-                    rdir = make_rdir(state)
-
-                    for query in queries:
-                        search_wrapper(state, query, rdir)
-                    i += 1
 
-            else:
-                rdir = make_rdir(parsed.state)
-                for query in queries:
-                    search_wrapper(parsed.state, query, rdir)
+                    batch_states = set(states[i:i + batch])
+                    batch_tasks = [ t for t in tasks if t[0] in batch_states ]
+                    deeper = set()
+                    if parsed.optimize:
+                        batch_tasks, derived, checked = optimize.schedule(
+                            batch_tasks, relations, scores,
+                            depth=parsed.depth)
+                        checks += checked
+                        deeper = optimize.deepened(derived) & set(batch_tasks)
+                    failed += search_all([ t for t in batch_tasks
+                                           if t not in deeper ],
+                                         parsed.workers or CSE_WORKERS, journal,
+                                         max_age=parsed.max_age,
+                                         depth=parsed.depth)
+                    failed += search_all([ t for t in batch_tasks
+                                           if t in deeper ],
+                                         parsed.workers or CSE_WORKERS, journal,
+                                         max_age=parsed.max_age,
+                                         depth=parsed.depth + 1)
+                    if parsed.optimize:
+                        fallback, pages = derive_all(derived, journal,
+                                                     parsed.depth)
+                        parent_pages += trim_parents(deeper, parsed.depth)
+                        derived_count += len(derived) - len(fallback)
+                        derived_pages += pages
+                        failed += search_all(fallback,
+                                             parsed.workers or CSE_WORKERS,
+                                             journal, max_age=parsed.max_age,
+                                             depth=parsed.depth)
+            finally:
+                KEYS.flush()
+                METRICS.flush()
+                if PROMETHEUS_TEXTFILE:
+                    metrics.write_textfile(PROMETHEUS_TEXTFILE,
+                                           metrics.summarize(METRICS.events),
+                                           journal.run_id)
+
+            if failed:
+                print(f'{len(failed)} searches failed.')
+            if parsed.optimize:
+                print(f'Derived {derived_count} searches from broader ones, '
+                      f'saving about {derived_pages - parent_pages} queries '
+                      f'({derived_pages} pages derived, less {parent_pages} '
+                      f'more pages of their parents).')
+                values = []
+                for (state, query, state_dir), parent, excluded in checks:
+                    rdir = os.path.basename(state_dir)
+                    parent = store.read_query(RESULTS_PATH, rdir, parent)
+                    real = store.read_query(RESULTS_PATH, rdir, query)
+                    if parent is not None and real is not None:
+                        values.append(optimize.compare(parent, real, excluded))
+                if values:
+                    print(f'Checked {len(values)} derivable searches against '
+                          f'real ones: derived results agreed '
+                          f'{sum(values) / len(values):.0%} on average, '
+                          f'{min(values):.0%} at worst.')
+            if CACHE:
+                print(CACHE.summary())
+            from client import CSE_REPLAY
+            if CSE_REPLAY:
+                from replay import shared
+                print(shared().summary())
+            if KEYS.exhausted():
+                print('Every key is out of quota for today; stopped.')
+            print(KEYS.report())
+            print(journal.summary())
 
         case 'list':
             verify_state_and_query(parsed.state, parsed.queries)
@@ -287,7 +686,7 @@ def main(args):
                 state_count = dict()
                 rdirs_sequence = dict() 
 
-                for rdir in sorted(os.listdir(RESULTS_PATH)):
+                for rdir in runindex.get_runs(RESULTS_PATH):
                     state = rdir[:rdir.find("_")]
                     state_count[state] = state_count.get(state, -1) + 1
                     rdirs_sequence[rdir] = state_count[state]
@@ -299,14 +698,14 @@ def main(args):
                 print('Results:')
                 for rdir in result_directories:
                     sequence = rdirs_sequence[rdir]
-                    queries = os.listdir(os.path.join(RESULTS_PATH, rdir))
+                    queries = runindex.get_queries(RESULTS_PATH, rdir)
                     print(f'\t{sequence} - {rdir} ({", ".join(queries)})')
             else:
                 result_directories = get_rdirs(parsed.state, False, parsed.select, 
                                                parsed.most_recent, parsed.time)
 
                 for rdir in result_directories:
-                    queries = os.listdir(rdir)
+                    queries = runindex.get_queries(RESULTS_PATH, rdir)
 
                     if not parsed.queries:
                         print(f'Queries: ({rdir})')
@@ -317,11 +716,233 @@ def main(args):
                             if query not in queries:
                                 raise Exception("Query is invalid.")
                         
-                            files = os.listdir(rdir, query)
+                            if store.layout(RESULTS_PATH, rdir) == 'jsonl':
+                                offset, length = runindex.get_offsets(
+                                    RESULTS_PATH, rdir)[query]
+                                print(f'Record: ({rdir}{store.SUFFIX}/{query})')
+                                print(f'\tbytes {offset}-{offset + length}')
+                                continue
+
+                            files = os.listdir(os.path.join(RESULTS_PATH,
+                                                            rdir, query))
                             print(f'Files: ({rdir}/{query})')
                             for f in files:
                                 print('\t' + f)
 
+        case 'diff':
+            import rundiff
+
+            verify_state_and_query(parsed.state, parsed.queries)
+            if selects:
+                if parsed.state == 'all' or len(selects) != 2:
+                    raise Exception('Select two result directories of one state.')
+                pairs = { (get_rdir_noinput(parsed.state, selects[0]),
+                           get_rdir_noinput(parsed.state, selects[1])):
+                          parsed.queries }
+            else:
+                states = (get_names()[0] if parsed.state == 'all'
+                          else [ parsed.state ])
+                pairs = dict()
+                for state in states:
+                    pairs |= rundiff.latest_pairs(RESULTS_PATH, state,
+                                                  parsed.queries)
+                if not pairs:
+                    print('No query has been searched twice.')
+
+            for (old, new), queries in pairs.items():
+                changes, unmatched = rundiff.diff_runs(RESULTS_PATH, old, new,
+                                                       queries)
+                print(f'{old} -> {new}:')
+                if unmatched:
+                    print(f'\tNot in both: {", ".join(unmatched)}')
+                if not changes:
+                    print('\tNo changes.')
+                for query, (added, removed, moved) in changes.items():
+                    print(f'\t{query}: {len(added)} added, {len(removed)} '
+                          f'removed, {len(moved)} re-ranked')
+                    for rank, link in added:
+                        print(f'\t\t+ {rank:>2} {link}')
+                    for rank, link in removed:
+                        print(f'\t\t- {rank:>2} {link}')
+                    for old_rank, rank, link in moved:
+                        print(f'\t\t~ {old_rank:>2} -> {rank:>2} {link}')
+
+        case 'find':
+            import fulltext
+
+            verify_state_and_query('all', parsed.queries)
+            rdirs = None
+            if parsed.most_recent or parsed.time:
+                rdirs = get_rdirs('all', False, None, parsed.most_recent,
+                                  parsed.time)
+            fulltext.update(RESULTS_PATH)
+            matches = fulltext.find(RESULTS_PATH, parsed.state, rdirs,
+                                    parsed.queries, parsed.limit)
+            for rdir, query, rank, title, link, snippet in matches:
+                print(f'{rdir} ({query}) #{rank} - {title}')
+                print('\t' + link)
+                print('\t' + snippet.replace('\n', ' '))
+            if not matches:
+                print('No matches.')
+
+        case 'snapshot':
+            import snapshots
+
+            verify_state_and_query(parsed.state, parsed.queries)
+            rdirs = get_rdirs(parsed.state, False, parsed.select,
+                              parsed.most_recent, parsed.time)
+            counts = snapshots.fetch_runs(SNAPSHOTS_PATH, RESULTS_PATH, rdirs,
+                                          parsed.top, parsed.queries,
+                                          parsed.workers or 8)
+            print(f'{counts["pages"]} pages from {len(rdirs)} result '
+                  f'directories: {counts["fetched"]} archived, '
+                  f'{counts["failed"]} failed ({SNAPSHOTS_PATH}).')
+
+        case 'grep':
+            import snapshots
+
+            verify_state_and_query('all', parsed.queries)
+            rdirs = get_rdirs('all', False, None, parsed.most_recent,
+                              parsed.time)
+            count, skipped = 0, set()
+            for rdir, query, rank, link, text in snapshots.grep(
+                    SNAPSHOTS_PATH, rdirs, parsed.state, parsed.queries,
+                    skipped):
+                print(f'{rdir} ({query}) #{rank} {link}')
+                print('\t' + text)
+                count += 1
+            if not count:
+                print('No matches.')
+            if skipped:
+                print(f'{len(skipped)} archived pages are not text (PDFs, '
+                      'images, ...) and were not searched.')
+
+        case 'stats':
+            import metrics
+
+            runs = dict()
+            for event in metrics.read_events(METRICS_PATH):
+                runs.setdefault(event.get('run'), []).append(event)
+            if parsed.state == 'all':
+                selected = list(runs)
+            elif parsed.state:
+                if parsed.state not in runs:
+                    raise Exception("Run does not exist.")
+                selected = [ parsed.state ]
+            else:
+                selected = list(runs)[-1:]
+            if not selected:
+                print(f'No metrics recorded ({METRICS_PATH}).')
+
+            for run in selected:
+                summary = metrics.summarize(runs[run], parsed.limit)
+                latency = summary['latency']
+                print(f'Run {run}: {summary["requests"]} requests for '
+                      f'{summary["pages"]} pages ({summary["cached"]} from the '
+                      f'cache) over {summary["elapsed"]:.1f} seconds.')
+                if latency['count']:
+                    print(f'\tLatency: p50 {latency["p50"]:.3f} s, p95 '
+                          f'{latency["p95"]:.3f} s, max {latency["max"]:.3f} s.')
+                statuses = ', '.join(f'{status} {count}' for status, count
+                                     in sorted(summary['statuses'].items()))
+                print(f'\tRetries: {summary["retries"]} '
+                      f'({summary["retry_rate"]:.1%}), {summary["backoff"]:.0f} '
+                      f'seconds of backoff; statuses: {statuses or "none"}.')
+                keys = ', '.join(f'key {key}: {count}' for key, count
+                                 in sorted(summary['quota'].items()))
+                print(f'\tQuota: {sum(summary["quota"].values())} queries'
+                      + (f' ({keys}).' if keys else '.'))
+                print('\tSlowest queries:')
+                for entry in summary['slowest']:
+                    print(f'\t\t{entry["seconds"]:8.3f} s  {entry["state"]} '
+                          f'({entry["query"]}), {entry["requests"]} requests')
+
+        case 'optimize':
+            import convert
+            import optimize
+
+            verify_state_and_query(parsed.state, parsed.queries)
+            plan = get_plan()
+            if parsed.state == 'all':
+                planned = convert.sweep(plan, parsed.queries)
+            else:
+                planned = [ plan.tasks[(parsed.state, query)] for query
+                            in parsed.queries or plan.queries ]
+            relations = optimize.relate(planned)
+            scores = optimize.validate(RESULTS_PATH, { optimize.pair(r)
+                                       for r in relations
+                                       if r.kind == 'exclusion' },
+                                       parsed.limit)
+
+            groups = dict()
+            for r in relations:
+                groups.setdefault((r.parent.query, r.child.query, r.kind,
+                                   r.excluded), []).append(r)
+            if not groups:
+                print('No query overlaps another.')
+            for (parent, child, kind, excluded), group in sorted(
+                    groups.items(), key=lambda g: g[0][:3]):
+                states = f'{len(group)} state{"s" if len(group) > 1 else ""}'
+                if kind == 'near':
+                    share = sum(r.similarity for r in group) / len(group)
+                    print(f'{parent} ~ {child}: near-duplicates ({share:.0%} '
+                          f'shared) in {states}.')
+                    continue
+                accepted = optimize.accepted(group[0], scores)
+                text = f'{parent} > {child}: {kind}'
+                if excluded:
+                    text += ' of ' + ' '.join(f'-{t}' for t in sorted(excluded))
+                text += f' in {states}'
+                score = scores.get((parent, child, excluded))
+                if score:
+                    text += (f'; derived results agree {score[0]:.0%} with '
+                             f'real ones over {score[1]} runs')
+                elif kind == 'exclusion':
+                    text += '; no run searched both to compare'
+                print(text + ('; derived.' if accepted else '; searched.'))
+
+            _, derived, _ = optimize.schedule([ (t.state, t.query, t.state)
+                                                for t in planned ],
+                                              relations, scores, check=0,
+                                              depth=parsed.depth)
+            deeper = optimize.deepened(derived)
+            print(f'{len(derived)} of {len(planned)} searches can be derived, '
+                  f'saving up to {len(derived) * parsed.depth - len(deeper)} '
+                  f'of {len(planned) * parsed.depth} queries at depth '
+                  f'{parsed.depth} ({len(deeper)} searches they are derived '
+                  f'from go a page deeper).')
+
+        case 'index':
+            count = runindex.rebuild(RESULTS_PATH)
+            print(f'Indexed {count} result directories '
+                  f'({runindex.index_path(RESULTS_PATH)}).')
+
+        case 'links':
+            import dataset
+            import links
+
+            verify_state_and_query(parsed.state, parsed.queries)
+            rdirs = get_rdirs(parsed.state, False, parsed.select,
+                              parsed.most_recent, parsed.time)
+            rdirs = [ r for r in rdirs if r[:r.find('_')] in get_names()[0] ]
+
+            records = [ record for rdir in rdirs for record in
+                        dataset.normalize_run(RESULTS_PATH, rdir, parsed.queries) ]
+            index = links.build_index(records)
+            output = parsed.output or LINK_INDEX_PATH
+            links.save_index(output, index)
+
+            stats = links.stats(index)
+            print(f'{len(rdirs)} result directories, {stats["occurrences"]} '
+                  f'links, {stats["canonical_urls"]} distinct pages ({output}).')
+            print(f'Reviewing each page once per state takes '
+                  f'{stats["state_url_pairs"]} reviews instead of '
+                  f'{stats["occurrences"]} ({stats["saved"]} fewer, '
+                  f'{stats["saved_fraction"]:.0%}).')
+            print('Most repeated:')
+            for url, count in stats['most_repeated']:
+                print(f'\t{count:5} {url}')
+
     if LOGGING:
         with open(LOGGING, 'a') as file:
             time_str = time.strftime("%d-%m-%Y_%H:%M:%S")
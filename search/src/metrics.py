@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+import os
+import json
+import math
+import time
+import threading
+from collections import Counter
+
+# Events held in memory before they are appended to the metrics file.
+METRICS_BUFFER = int(os.getenv('METRICS_BUFFER') or 100)
+PROMETHEUS_TEXTFILE = os.getenv('PROMETHEUS_TEXTFILE')
+
+# One JSON line per Custom Search request, and per page served from the
+# response cache: { time, run, rdir, state, query, start, attempt, status,
+# kind, latency, items, bytes, backoff, key, cached }.  `status` is the HTTP
+# status (None when the request raised before one came back), `kind` how
+# keys.classify took a failure, `backoff` the seconds slept after it and
+# `key` the key's fingerprint.  Lines are written a buffer at a time, with
+# one open of the file per buffer.
+class MetricsSink:
+    def __init__(self, path, run=None, buffer_size=METRICS_BUFFER):
+        self.path = path
+        self.run = run
+        self.buffer_size = buffer_size
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.events = []
+
+    def emit(self, **event):
+        event = dict(time=time.time(), run=self.run, **event)
+        with self.lock:
+            self.buffer.append(event)
+            self.events.append(event)
+            if len(self.buffer) >= self.buffer_size:
+                self.write()
+
+    def write(self):
+        if not self.buffer: return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'a') as file:
+            file.write(''.join(json.dumps(e) + '\n' for e in self.buffer))
+        self.buffer = []
+
+    def flush(self):
+        with self.lock:
+            self.write()
+
+def read_events(path, run=None):
+    if not os.path.exists(path): return
+    with open(path, 'r') as file:
+        for line in file:
+            if not line.endswith('\n'): continue
+            event = json.loads(line)
+            if run is None or event.get('run') == run:
+                yield event
+
+# ---------------------------------- SUMMARY ----------------------------------
+# Nearest-rank percentile of sorted values.
+def percentile(values, fraction):
+    if not values: return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+def summarize(events, slowest=10):
+    requests = [ e for e in events if not e.get('cached') ]
+    latencies = sorted(e['latency'] for e in requests)
+    succeeded = [ e for e in requests if e.get('status') == 200 ]
+    retries = sum(1 for e in requests if e.get('attempt'))
+
+    queries = dict()
+    for e in events:
+        entry = queries.setdefault((e.get('rdir'), e.get('state'),
+                                    e.get('query')),
+                                   { 'seconds': 0.0, 'requests': 0 })
+        entry['seconds'] += e['latency'] + (e.get('backoff') or 0)
+        entry['requests'] += not e.get('cached')
+    slow = sorted(queries.items(), key=lambda q: q[1]['seconds'],
+                  reverse=True)[:slowest]
+
+    times = [ e['time'] for e in events ]
+    return {
+        'requests': len(requests),
+        'cached': len(events) - len(requests),
+        'pages': len(succeeded) + len(events) - len(requests),
+        'retries': retries,
+        'retry_rate': retries / len(requests) if requests else 0.0,
+        'statuses': Counter(str(e.get('status')) for e in requests),
+        'latency': { 'p50': percentile(latencies, 0.5),
+                     'p95': percentile(latencies, 0.95),
+                     'max': latencies[-1] if latencies else None,
+                     'sum': sum(latencies), 'count': len(latencies) },
+        'backoff': sum(e.get('backoff') or 0 for e in requests),
+        'quota': Counter(e.get('key') for e in succeeded),
+        'items': sum(e.get('items') or 0 for e in events),
+        'bytes': sum(e.get('bytes') or 0 for e in events),
+        'elapsed': max(times) - min(times) if times else 0.0,
+        'last': max(times) if times else None,
+        'slowest': [ dict(rdir=rdir, state=state, query=query, **entry)
+                     for (rdir, state, query), entry in slow ],
+    }
+# -----------------------------------------------------------------------------
+
+
+# -------------------------------- PROMETHEUS ---------------------------------
+# Writes a summary in the text format node_exporter's textfile collector
+# reads; the file is replaced whole so the collector never sees half of it.
+def write_textfile(path, summary, run=None):
+    lines = []
+    def metric(name, kind, text, samples):
+        lines.append(f'# HELP {name} {text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            label_text = ','.join(f'{k}="{v}"' for k, v in labels.items())
+            lines.append(f'{name}{{{label_text}}} {value}' if label_text
+                         else f'{name} {value}')
+
+    metric('cse_sweep_info', 'gauge', 'The sweep these metrics describe.',
+           [ ({ 'run': run or '' }, 1) ])
+    metric('cse_requests_total', 'counter',
+           'Custom Search requests by HTTP status.',
+           [ ({ 'status': s }, n) for s, n in sorted(summary['statuses'].items()) ])
+    metric('cse_cache_hits_total', 'counter', 'Pages served from the cache.',
+           [ ({}, summary['cached']) ])
+    metric('cse_retries_total', 'counter', 'Requests that were retries.',
+           [ ({}, summary['retries']) ])
+    metric('cse_backoff_seconds_total', 'counter',
+           'Seconds slept before retrying.', [ ({}, summary['backoff']) ])
+    metric('cse_quota_used_total', 'counter',
+           'Successful requests (quota spent) by key fingerprint.',
+           [ ({ 'key': k }, n) for k, n in sorted(summary['quota'].items()) ])
+    metric('cse_results_total', 'counter', 'Results returned.',
+           [ ({}, summary['items']) ])
+    metric('cse_response_bytes_total', 'counter', 'Bytes of results returned.',
+           [ ({}, summary['bytes']) ])
+    latency = summary['latency']
+    metric('cse_request_latency_seconds', 'summary',
+           'Custom Search request latency.',
+           [ ({ 'quantile': '0.5' }, latency['p50'] or 0),
+             ({ 'quantile': '0.95' }, latency['p95'] or 0) ])
+    lines.append(f'cse_request_latency_seconds_sum {latency["sum"]}')
+    lines.append(f'cse_request_latency_seconds_count {latency["count"]}')
+    metric('cse_last_request_timestamp_seconds', 'gauge',
+           'When the last request finished.', [ ({}, summary['last'] or 0) ])
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+# -----------------------------------------------------------------------------
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+import os
+import re
+import random
+from collections import namedtuple
+
+import runindex
+import store
+from links import canonical_url
+
+# A pair of queries is only derived one from the other once derived results
+# have agreed this well on average (see validate()) with real searches of
+# the narrower query.
+OPTIMIZE_MIN_AGREEMENT = float(os.getenv('OPTIMIZE_MIN_AGREEMENT') or 0.9)
+# Runs compared per pair of queries.
+OPTIMIZE_SAMPLE = int(os.getenv('OPTIMIZE_SAMPLE') or 20)
+# Share of derivable searches "search --optimize" still sends to the API, to
+# check the derived results against.
+OPTIMIZE_CHECK = float(os.getenv('OPTIMIZE_CHECK') or 0.1)
+
+# The API serves 10 results per page and no results past the 100th.
+PAGE_SIZE = 10
+MAX_DEPTH = 10
+# Exclusions derived from one parent to be worth searching it a page deeper.
+CHILDREN_PER_PAGE = 2
+# Queries sharing this much of their clauses and excluded terms are reported
+# as near-duplicates.
+NEAR_DUPLICATE = 0.75
+
+TOKEN = re.compile(r'-?"[^"]*"|\S+')
+
+# A query as Custom Search reads it: clauses that must all match, each a set
+# of alternatives (OR binds tighter than the implied AND), and the terms
+# excluded with "-".  Terms are lower-cased with their quotes kept.
+Query = namedtuple('Query', ('clauses', 'excluded'))
+# `kind` is "same" (texts equal but for case and spacing), "exclusion" (the
+# child is the parent with more terms excluded, so its results are a subset
+# of the parent's), "narrower" (the child adds clauses) or "near" (neither
+# contains the other).  `excluded` holds the terms only the child excludes.
+Relation = namedtuple('Relation', ('kind', 'parent', 'child', 'excluded',
+                                   'similarity'))
+
+# ---------------------------------- QUERIES ----------------------------------
+def normal(text):
+    return ' '.join(text.lower().split())
+
+# None for queries with AROUND, whose terms do not stand on their own.
+def parse(text):
+    tokens = TOKEN.findall(text)
+    if any(t.lower() == 'around' or t.lower().startswith('around(')
+           for t in tokens):
+        return None
+    clauses, excluded = [], set()
+    joining = False
+    for token in tokens:
+        if token == 'OR' and clauses and not joining:
+            joining = True
+        elif token.startswith('-') and len(token) > 1:
+            excluded.add(token[1:].lower())
+            joining = False
+        else:
+            if joining: clauses[-1].add(token.lower())
+            else: clauses.append({ token.lower() })
+            joining = False
+    return Query(frozenset(frozenset(c) for c in clauses), frozenset(excluded))
+
+def similarity(a, b):
+    a = a.clauses | { ('-', t) for t in a.excluded }
+    b = b.clauses | { ('-', t) for t in b.excluded }
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+# The kind of relation under which `narrow` only finds what `broad` finds.
+def contains(broad, narrow):
+    if narrow.clauses == broad.clauses and narrow.excluded > broad.excluded:
+        return 'exclusion'
+    if narrow.clauses > broad.clauses and narrow.excluded >= broad.excluded:
+        return 'narrower'
+    return None
+
+# Relations between the tasks (convert.Task) of each state.
+def relate(tasks):
+    by_state = dict()
+    for task in tasks:
+        by_state.setdefault(task.state, []).append((task, parse(task.text)))
+
+    relations = []
+    for parsed in by_state.values():
+        for i, (a, query_a) in enumerate(parsed):
+            for b, query_b in parsed[i + 1:]:
+                if normal(a.text) == normal(b.text):
+                    relations.append(Relation('same', a, b, frozenset(), 1.0))
+                    continue
+                if query_a is None or query_b is None: continue
+                score = similarity(query_a, query_b)
+                if contains(query_a, query_b):
+                    relations.append(Relation(contains(query_a, query_b), a, b,
+                                              query_b.excluded - query_a.excluded,
+                                              score))
+                elif contains(query_b, query_a):
+                    relations.append(Relation(contains(query_b, query_a), b, a,
+                                              query_a.excluded - query_b.excluded,
+                                              score))
+                elif score >= NEAR_DUPLICATE:
+                    relations.append(Relation('near', a, b, frozenset(), score))
+    return relations
+
+# Relations that make one search out of another: "same" and "exclusion".
+def derivable(relations):
+    return [ r for r in relations if r.kind in ('same', 'exclusion') ]
+
+def pair(relation):
+    return (relation.parent.query, relation.child.query, relation.excluded)
+# -----------------------------------------------------------------------------
+
+
+# ---------------------------------- DERIVE -----------------------------------
+# Whether a term shows in an item's title, snippet or link.  The page itself
+# may hold a term that none of them show, so filtering on this can keep
+# results the API would have excluded.  On the stored runs it keeps so many
+# that the one exclusion pair agrees about 10% with real searches and fails
+# validate(), so "search --optimize" derives nothing from them.
+def visible(item, term):
+    text = ' '.join(item.get(k, '') for k in ('title', 'snippet', 'link'))
+    return term.strip('"') in text.lower()
+
+def kept(result, excluded):
+    return [ item for item in result.get('items', [])
+             if not any(visible(item, term) for term in excluded) ]
+
+# The narrower query's result made from the parent's: its items without
+# those that visibly hold an excluded term, cut to `depth` pages, without
+# the parent's result counts.  None when fewer are left than fill the pages
+# while the parent had more results.
+def derive(result, excluded, depth, text=None, parent=None):
+    items = kept(result, excluded)
+    wanted = depth * PAGE_SIZE
+    more = 'nextPage' in result.get('queries', {})
+    if len(items) < wanted and more:
+        return None
+
+    derived = { k: v for k, v in result.items()
+                if k not in ('items', 'searchInformation') }
+    request = { k: v for k, v in
+                result.get('queries', {}).get('request', [{}])[0].items()
+                if k not in ('title', 'totalResults') }
+    request['count'] = min(len(items), wanted) or PAGE_SIZE
+    if text:
+        request['searchTerms'] = text
+    derived['queries'] = { 'request': [ request ] }
+    if len(items) > wanted or more:
+        derived['queries']['nextPage'] = [ dict(request, startIndex=wanted + 1,
+                                                count=PAGE_SIZE) ]
+    if items[:wanted]:
+        derived['items'] = items[:wanted]
+    derived['derived'] = { 'query': parent, 'excluded': sorted(excluded) }
+    return derived
+
+def pages(result):
+    return max(1, -(-len(result.get('items', [])) // PAGE_SIZE))
+
+# Jaccard similarity of the canonical links of two results.
+def agreement(derived, real):
+    a = { canonical_url(i['link']) for i in derived.get('items', [])
+          if 'link' in i }
+    b = { canonical_url(i['link']) for i in real.get('items', []) if 'link' in i }
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+# How the parent's result, derived to as many pages as the real one has,
+# compares with it.
+def compare(parent, real, excluded):
+    depth = pages(real)
+    wanted = depth * PAGE_SIZE
+    derived = dict(parent, items=kept(parent, excluded)[:wanted])
+    return agreement(derived, real)
+# -----------------------------------------------------------------------------
+
+
+# --------------------------------- VALIDATE ----------------------------------
+# { (parent query, child query, excluded): (mean agreement, runs) } over up
+# to `sample` runs that really searched both queries of a pair.
+def validate(results_path, pairs, sample=OPTIMIZE_SAMPLE, seed=0):
+    pairs = set(pairs)
+    if not pairs or not os.path.isdir(results_path): return dict()
+    runs = { p: [] for p in pairs }
+    for rdir in runindex.get_runs(results_path):
+        stored = set(runindex.get_queries(results_path, rdir))
+        for p in pairs:
+            if p[0] in stored and p[1] in stored:
+                runs[p].append(rdir)
+
+    rand = random.Random(seed)
+    scores = dict()
+    for p, rdirs in runs.items():
+        parent_query, child_query, excluded = p
+        if len(rdirs) > sample:
+            rdirs = rand.sample(rdirs, sample)
+        values = []
+        for rdir in rdirs:
+            parent = store.read_query(results_path, rdir, parent_query)
+            real = store.read_query(results_path, rdir, child_query)
+            if parent is None or real is None: continue
+            if 'derived' in parent or 'derived' in real: continue
+            values.append(compare(parent, real, excluded))
+        if values:
+            scores[p] = (sum(values) / len(values), len(values))
+    return scores
+
+def accepted(relation, scores, threshold=OPTIMIZE_MIN_AGREEMENT):
+    if relation.kind == 'same':
+        return True
+    score = scores.get(pair(relation))
+    return score is not None and score[0] >= threshold
+# -----------------------------------------------------------------------------
+
+
+# --------------------------------- SCHEDULE ----------------------------------
+# Splits (state, query, rdir) tasks into those to search and { task: (parent
+# query, excluded) } for those to derive from a parent searched in the same
+# run.  Queries with the fewest excluded terms go first, so no parent is
+# itself derived.  A `check` share of the derivable tasks is searched anyway.
+# Exclusions need their parent searched a page deeper than `depth` (see
+# deepened()), so none are derived at MAX_DEPTH, nor from a parent fewer
+# than CHILDREN_PER_PAGE of them share: the page would cost what it saves.
+def schedule(tasks, relations, scores, check=OPTIMIZE_CHECK, seed=None,
+             depth=1):
+    parents, excluded = dict(), dict()
+    for r in derivable(relations):
+        if r.excluded and depth >= MAX_DEPTH: continue
+        if accepted(r, scores):
+            parents.setdefault((r.child.state, r.child.query), []).append(r)
+            excluded[(r.child.state, r.child.query)] = \
+                len((parse(r.child.text) or Query((), ())).excluded)
+
+    planned = { (t[0], t[1]): t for t in tasks }
+    rand = random.Random(seed)
+    derived, checked = dict(), []
+    order = sorted(tasks, key=lambda t: excluded.get(t[:2], 0))
+    for task in order:
+        for r in parents.get(task[:2], []):
+            parent = planned.get((task[0], r.parent.query))
+            if parent is None or parent[2] != task[2] or parent in derived:
+                continue
+            if rand.random() < check:
+                checked.append((task, r.parent.query, r.excluded))
+            else:
+                derived[task] = (r.parent.query, r.excluded)
+            break
+
+    children = dict()
+    for task, (parent, excluded) in derived.items():
+        if excluded:
+            children.setdefault((task[0], parent, task[2]), []).append(task)
+    for tasks_of in children.values():
+        if len(tasks_of) < CHILDREN_PER_PAGE:
+            for task in tasks_of: del derived[task]
+    return [ t for t in tasks if t not in derived ], derived, checked
+
+# The parent tasks of `derived` (from schedule()) whose children drop the
+# items holding an excluded term.  Searched one page deeper than the
+# children, they leave enough items to fill the children's pages; trim()
+# then cuts them back.
+def deepened(derived):
+    return { (task[0], parent, task[2])
+             for task, (parent, excluded) in derived.items() if excluded }
+
+# The result cut back to `depth` pages, as a search to that depth would have
+# stored it.
+def trim(result, depth):
+    wanted = depth * PAGE_SIZE
+    items = result.get('items', [])
+    if len(items) <= wanted: return result
+    trimmed = dict(result, items=items[:wanted],
+                   queries=dict(result.get('queries', {})))
+    request = trimmed['queries'].get('request', [{}])[0]
+    trimmed['queries']['nextPage'] = [ dict(request, startIndex=wanted + 1,
+                                            count=PAGE_SIZE) ]
+    return trimmed
+# -----------------------------------------------------------------------------
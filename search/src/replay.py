@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+import os
+import json
+import time
+import random
+import threading
+from collections import Counter
+from urllib.parse import urlsplit, parse_qs
+
+import httplib2
+
+import runindex
+import store
+
+# With CSE_REPLAY set to a results tree, client.py answers every search from
+# that tree instead of the API; see ReplayHttp.
+CSE_REPLAY = os.getenv('CSE_REPLAY')
+# Seconds each response takes: a number, or "low-high" to draw uniformly.
+CSE_REPLAY_LATENCY = os.getenv('CSE_REPLAY_LATENCY') or '0'
+# Shares of requests answered with a per-minute 429 and with a 500/503.
+CSE_REPLAY_429_RATE = float(os.getenv('CSE_REPLAY_429_RATE') or 0)
+CSE_REPLAY_ERROR_RATE = float(os.getenv('CSE_REPLAY_ERROR_RATE') or 0)
+# Requests one key may make in a calendar minute before it gets 429s, as
+# the API counts them (0 for no limit).
+CSE_REPLAY_QUOTA = int(os.getenv('CSE_REPLAY_QUOTA') or 0)
+CSE_REPLAY_SEED = os.getenv('CSE_REPLAY_SEED')
+
+PAGE_SIZE = 10
+MINUTE_MESSAGE = ("Quota exceeded for quota metric 'Queries' and limit "
+                  "'Queries per minute' of service "
+                  "'customsearch.googleapis.com'.")
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def parse_latency(text):
+    low, _, high = str(text).partition('-')
+    return float(low), float(high or low)
+
+def error_body(code, message, reason, status):
+    return { 'error': { 'code': code, 'message': message,
+                        'errors': [ { 'message': message, 'domain': 'global',
+                                      'reason': reason } ],
+                        'status': status } }
+
+# The page of a stored result that a request for `num` results from `start`
+# gets.  A stored result may hold several pages' items; a page keeps a
+# nextPage while the stored items (or the API, as far as the stored result
+# knew) have more.
+def make_page(result, start, num):
+    items = result.get('items', [])
+    end = start - 1 + num
+    chunk = items[start - 1:end]
+    page = dict(result, queries=dict(result.get('queries', {})))
+    request = dict(page['queries'].get('request', [{}])[0],
+                   startIndex=start, count=len(chunk) or num)
+    page['queries']['request'] = [ request ]
+    page.pop('items', None)
+    if chunk:
+        page['items'] = chunk
+    if end < len(items) or end == len(items) and 'nextPage' in result['queries']:
+        page['queries']['nextPage'] = [ dict(request, startIndex=end + 1,
+                                             count=num) ]
+    else:
+        page['queries'].pop('nextPage', None)
+    return page
+
+def empty_page(terms, start, num):
+    request = { 'searchTerms': terms, 'startIndex': start, 'count': num,
+                'totalResults': '0' }
+    return { 'kind': 'customsearch#search', 'queries': { 'request': [ request ] },
+             'searchInformation': { 'totalResults': '0',
+                                    'formattedTotalResults': '0' } }
+
+# What every ReplayHttp of a process shares: the tree's index, the quota
+# counts and the statistics.  Queries are matched on their rendered text
+# (the searchTerms the API echoed back), the most recent run of it winning;
+# results derived from other queries (see optimize.py) are never served.
+class Replay:
+    def __init__(self, results_path, latency=CSE_REPLAY_LATENCY,
+                 throttle_rate=CSE_REPLAY_429_RATE,
+                 error_rate=CSE_REPLAY_ERROR_RATE, quota=CSE_REPLAY_QUOTA,
+                 seed=CSE_REPLAY_SEED):
+        self.results_path = results_path
+        self.latency = parse_latency(latency)
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.quota = quota
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.index = None
+        self.minutes = Counter()
+        self.counts = Counter()
+
+    def load(self):
+        index = dict()
+        runs = runindex.get_runs(self.results_path)
+        runs.sort(key=lambda rdir: runindex.parse_rdir(rdir)[1])
+        for rdir in runs:
+            for query in runindex.get_queries(self.results_path, rdir):
+                result = store.read_query(self.results_path, rdir, query)
+                request = (result or {}).get('queries', {}).get('request')
+                if 'derived' in (result or {}): continue
+                if request and 'searchTerms' in request[0]:
+                    index[request[0]['searchTerms']] = (rdir, query)
+        return index
+
+    # The status and body of one request, after the latency it is given.
+    def respond(self, params):
+        terms = params.get('q', '')
+        start = int(params.get('start') or 1)
+        num = int(params.get('num') or PAGE_SIZE)
+        with self.lock:
+            if self.index is None:
+                self.index = self.load()
+            self.counts['requests'] += 1
+            minute = (params.get('key'), int(time.time() // 60))
+            self.minutes[minute] += 1
+            over_quota = self.quota and self.minutes[minute] > self.quota
+            draw = self.random.random()
+            delay = self.random.uniform(*self.latency)
+            found = self.index.get(terms)
+        time.sleep(delay)
+
+        if over_quota or draw < self.throttle_rate:
+            status = 429
+            body = error_body(429, MINUTE_MESSAGE, 'rateLimitExceeded',
+                              'RESOURCE_EXHAUSTED')
+            kind = 'quota' if over_quota else 'throttled'
+        elif draw < self.throttle_rate + self.error_rate:
+            status = self.random.choice((500, 503))
+            body = error_body(status, 'Backend Error', 'backendError',
+                              'INTERNAL' if status == 500 else 'UNAVAILABLE')
+            kind = 'errors'
+        elif found:
+            status = 200
+            body = make_page(store.read_query(self.results_path, *found),
+                             start, num)
+            kind = 'hits'
+        else:
+            status = 200
+            body = empty_page(terms, start, num)
+            kind = 'misses'
+        with self.lock:
+            self.counts[kind] += 1
+        return status, body
+
+    def summary(self):
+        counts = self.counts
+        return (f'Replay: {counts["requests"]} requests, {counts["hits"]} hits, '
+                f'{counts["misses"]} misses, {counts["quota"]} over quota, '
+                f'{counts["throttled"]} throttled, {counts["errors"]} errors.')
+
+def shared():
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = Replay(CSE_REPLAY)
+    return _shared
+
+# Stands in for httplib2.Http under googleapiclient: requests never leave
+# the process and are answered by a Replay.
+class ReplayHttp:
+    def __init__(self, replay=None):
+        self.replay = replay or shared()
+
+    def request(self, uri, method='GET', body=None, headers=None,
+                redirections=None, connection_type=None):
+        params = { k: v[-1] for k, v in parse_qs(urlsplit(uri).query).items() }
+        status, content = self.replay.respond(params)
+        response = httplib2.Response({ 'status': str(status),
+                                       'content-type': 'application/json; '
+                                                       'charset=UTF-8' })
+        return response, json.dumps(content).encode()
+
+    def close(self):
+        pass
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+import hashlib
+
+import runindex
+import store
+from links import canonical_url
+
+def digest(links):
+    return hashlib.sha1('\n'.join(links).encode()).hexdigest()[:16]
+
+# { query: (digest, [canonical link, ...]) } in rank order.  Lists are read
+# from the run once and then kept in the run index, so later diffs of the
+# same run never decode its results again.
+def run_links(results_path, rdir):
+    cached = runindex.get_links(results_path, rdir)
+    missing = dict()
+    for query in runindex.get_queries(results_path, rdir):
+        if query in cached: continue
+        result = store.read_query(results_path, rdir, query) or {}
+        links = [ canonical_url(item['link'])
+                  for item in result.get('items', []) if 'link' in item ]
+        missing[query] = (digest(links), links)
+    if missing:
+        runindex.put_links(results_path, rdir, missing)
+    return cached | missing
+
+# A link listed twice keeps its best rank.
+def ranks(links):
+    ranked = dict()
+    for rank, link in enumerate(links, 1):
+        ranked.setdefault(link, rank)
+    return ranked
+
+# Ranks are 1-based.  Returns added [(rank, link)], removed [(rank, link)]
+# and moved [(old rank, new rank, link)].
+def diff_links(old, new):
+    old_ranks, new_ranks = ranks(old), ranks(new)
+    added = [ (r, l) for l, r in new_ranks.items() if l not in old_ranks ]
+    removed = [ (r, l) for l, r in old_ranks.items() if l not in new_ranks ]
+    moved = [ (old_ranks[l], r, l) for l, r in new_ranks.items()
+              if l in old_ranks and old_ranks[l] != r ]
+    return sorted(added), sorted(removed), sorted(moved)
+
+# { query: (added, removed, moved) } for every query both runs searched and
+# whose links changed, and the queries only one of them searched.  Queries
+# with equal digests are not compared.
+def diff_runs(results_path, old_rdir, new_rdir, queries=None):
+    old = run_links(results_path, old_rdir)
+    new = run_links(results_path, new_rdir)
+    changes = dict()
+    for query in sorted(old.keys() & new.keys()):
+        if queries and query not in queries: continue
+        if old[query][0] == new[query][0]: continue
+        changes[query] = diff_links(old[query][1], new[query][1])
+    unmatched = sorted(q for q in old.keys() ^ new.keys()
+                       if not queries or q in queries)
+    return changes, unmatched
+
+# { query: [rdir, ...] } oldest first: the runs of a state that searched
+# each query.  Runs often re-search only some queries.
+def query_runs(results_path, state):
+    runs = dict()
+    for rdir in runindex.get_runs(results_path, state):
+        for query in runindex.get_queries(results_path, rdir):
+            runs.setdefault(query, []).append(rdir)
+    return runs
+
+# { (old rdir, new rdir): [query, ...] }: each query's latest search paired
+# with the one before it.
+def latest_pairs(results_path, state, queries=None):
+    pairs = dict()
+    for query, rdirs in sorted(query_runs(results_path, state).items()):
+        if queries and query not in queries: continue
+        if len(rdirs) > 1:
+            pairs.setdefault(tuple(rdirs[-2:]), []).append(query)
+    return pairs
+
+# { state: { query: set of canonical links } }: what reviewers have already
+# seen for the queries of each state's most recent run, i.e. the links of
+# the search of each query before that run.
+def previous_links(results_path):
+    seen = dict()
+    for latest in runindex.get_most_recent(results_path):
+        state = latest[:latest.find('_')]
+        seen[state] = dict()
+        for query, rdirs in query_runs(results_path, state).items():
+            if latest not in rdirs: continue
+            earlier = rdirs[:rdirs.index(latest)]
+            if earlier:
+                links = run_links(results_path, earlier[-1])[query][1]
+                seen[state][query] = set(links)
+    return seen
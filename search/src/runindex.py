@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+import os
+import json
+import time
+import sqlite3
+import threading
+
+import store
+
+TIME_FORMAT = "%d-%m-%Y_%H:%M:%S"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    rdir TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    time REAL NOT NULL,
+    mtime INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_state_time ON runs (state, time);
+CREATE TABLE IF NOT EXISTS queries (
+    rdir TEXT NOT NULL,
+    query TEXT NOT NULL,
+    items INTEGER NOT NULL,
+    offset INTEGER,
+    length INTEGER,
+    PRIMARY KEY (rdir, query)
+);
+CREATE TABLE IF NOT EXISTS links (
+    rdir TEXT NOT NULL,
+    query TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    links TEXT NOT NULL,
+    PRIMARY KEY (rdir, query)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS items USING fts5 (
+    title, snippet, link,
+    rdir UNINDEXED, query UNINDEXED, position UNINDEXED,
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS indexed (
+    rdir TEXT NOT NULL,
+    query TEXT NOT NULL,
+    first INTEGER,
+    last INTEGER,
+    PRIMARY KEY (rdir, query)
+);
+"""
+SCHEMA_VERSION = 5
+
+_local = threading.local()
+_ready = set()
+_ready_lock = threading.Lock()
+
+# The index sits beside (not inside) the results directory it describes,
+# e.g. search/results.sqlite, unless RUN_INDEX says otherwise.
+def index_path(results_path):
+    return os.getenv('RUN_INDEX') or f'{os.path.normpath(results_path)}.sqlite'
+
+def parse_rdir(rdir):
+    delim = rdir.find('_')
+    if rdir.startswith('.') or delim == -1:
+        return None
+    try:
+        tval = time.mktime(time.strptime(rdir[delim + 1:], TIME_FORMAT))
+    except ValueError:
+        return None
+    return rdir[:delim], tval
+
+# Drops what other modules derived from a run's results (link lists, the
+# full-text index), so it is derived again from what is on disk now.  Items
+# are found through the rowid range their query was indexed under.
+def forget(db, rdir, query=None):
+    where = 'rdir = ?' if query is None else 'rdir = ? AND query = ?'
+    args = (rdir,) if query is None else (rdir, query)
+    db.execute(f'DELETE FROM links WHERE {where}', args)
+    ranges = db.execute(f'SELECT first, last FROM indexed WHERE {where}',
+                        args).fetchall()
+    db.executemany('DELETE FROM items WHERE rowid BETWEEN ? AND ?', ranges)
+    db.execute(f'DELETE FROM indexed WHERE {where}', args)
+
+# The mtime of a run's directory or run file, which adding a query to the
+# run changes; None when the run is not on disk.
+def run_mtime(results_path, rdir):
+    for path in (store.run_file(results_path, rdir),
+                 os.path.join(results_path, rdir)):
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            pass
+    return None
+
+def add_run(db, results_path, rdir, mtime=None):
+    parsed = parse_rdir(rdir)
+    if parsed is None: return False
+    db.execute('INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?)',
+               (rdir, *parsed, mtime))
+    db.execute('DELETE FROM queries WHERE rdir = ?', (rdir,))
+    forget(db, rdir)
+    db.executemany('INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?, ?)',
+                   [ (rdir, *entry) for entry in store.scan(results_path, rdir) ])
+    return True
+
+# Adding a query to a run changes the mtime of its directory or run file,
+# whichever process added it, so one stat per run tells which runs changed
+# since the last sync.  Only runs that appeared, changed or disappeared are
+# (re)scanned.
+def sync(db, results_path):
+    on_disk = dict()
+    with os.scandir(results_path) as entries:
+        for entry in entries:
+            if entry.name.endswith(store.SUFFIX) or entry.is_dir():
+                on_disk[store.run_name(entry.name)] = entry.stat().st_mtime_ns
+
+    indexed = dict(db.execute('SELECT rdir, mtime FROM runs'))
+    for rdir in indexed.keys() - on_disk.keys():
+        db.execute('DELETE FROM runs WHERE rdir = ?', (rdir,))
+        db.execute('DELETE FROM queries WHERE rdir = ?', (rdir,))
+        forget(db, rdir)
+    for rdir in sorted(on_disk):
+        if indexed.get(rdir) != on_disk[rdir]:
+            add_run(db, results_path, rdir, on_disk[rdir])
+
+def prepare(db):
+    db.execute('PRAGMA journal_mode=WAL')
+    # The index is derived data, so an old layout is simply rebuilt.
+    if db.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+        db.executescript('DROP TABLE IF EXISTS runs; '
+                         'DROP TABLE IF EXISTS queries; '
+                         'DROP TABLE IF EXISTS links; '
+                         'DROP TABLE IF EXISTS items; '
+                         'DROP TABLE IF EXISTS indexed; '
+                         'DROP TABLE IF EXISTS meta;')
+        db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    db.executescript(SCHEMA)
+
+# The index connection of this thread, opened once and kept.  The first
+# connection of a process to an index also checks the schema and syncs the
+# results directory; after that the process keeps the index current itself
+# (record_query) and lookups go straight to SQLite.  Connections are never
+# shared between threads or with forked processes.
+def connect(results_path):
+    path = index_path(results_path)
+    pid = os.getpid()
+    if getattr(_local, 'pid', None) != pid:
+        _local.pid = pid
+        _local.connections = dict()
+    db = _local.connections.get(path)
+    if db is None:
+        db = _local.connections[path] = sqlite3.connect(path, timeout=30)
+    with _ready_lock:
+        if (pid, path) not in _ready:
+            prepare(db)
+            with db:
+                sync(db, results_path)
+            _ready.add((pid, path))
+    return db
+
+def rebuild(results_path):
+    db = connect(results_path)
+    with db:
+        db.execute('DELETE FROM runs')
+        db.execute('DELETE FROM queries')
+        db.execute('DELETE FROM links')
+        db.execute('DELETE FROM items')
+        db.execute('DELETE FROM indexed')
+        sync(db, results_path)
+        return db.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+
+def record_query(results_path, rdir, query, items, offset=None, length=None):
+    parsed = parse_rdir(rdir)
+    db = connect(results_path)
+    mtime = run_mtime(results_path, rdir)
+    with db:
+        db.execute('INSERT OR IGNORE INTO runs VALUES (?, ?, ?, ?)',
+                   (rdir, *parsed, mtime))
+        db.execute('UPDATE runs SET mtime = ? WHERE rdir = ?', (mtime, rdir))
+        db.execute('INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?, ?)',
+                   (rdir, query, items, offset, length))
+        forget(db, rdir, query)
+
+# Runs ordered by state, then oldest first; `time_str` keeps only run names
+# that contain the given (partial) time string.
+def get_runs(results_path, state=None, time_str=None):
+    sql = 'SELECT rdir FROM runs WHERE 1'
+    args = []
+    if state:
+        sql += ' AND state = ?'
+        args.append(state)
+    if time_str:
+        sql += ' AND instr(rdir, ?) > 0'
+        args.append(time_str)
+    db = connect(results_path)
+    return [ r for (r,) in db.execute(sql + ' ORDER BY state, time', args) ]
+
+def get_most_recent(results_path, state=None):
+    sql = 'SELECT rdir, MAX(time) FROM runs'
+    args = []
+    if state:
+        sql += ' WHERE state = ?'
+        args.append(state)
+    rows = connect(results_path).execute(sql + ' GROUP BY state ORDER BY rdir',
+                                         args)
+    return [ r for r, _ in rows ]
+
+def get_queries(results_path, rdir):
+    rows = connect(results_path).execute('SELECT query FROM queries '
+                                         'WHERE rdir = ? ORDER BY query', (rdir,))
+    return [ q for (q,) in rows ]
+
+def get_offsets(results_path, rdir):
+    rows = connect(results_path).execute('SELECT query, offset, length '
+                                         'FROM queries WHERE rdir = ? AND '
+                                         'offset IS NOT NULL', (rdir,))
+    return { q: (o, l) for q, o, l in rows }
+
+# Link lists cached per query by rundiff: { query: (digest, [link, ...]) }.
+def get_links(results_path, rdir):
+    rows = connect(results_path).execute('SELECT query, digest, links '
+                                         'FROM links WHERE rdir = ?', (rdir,))
+    return { q: (d, json.loads(l)) for q, d, l in rows }
+
+def put_links(results_path, rdir, entries):
+    db = connect(results_path)
+    with db:
+        db.executemany('INSERT OR REPLACE INTO links VALUES (?, ?, ?, ?)',
+                       [ (rdir, q, d, json.dumps(l))
+                         for q, (d, l) in entries.items() ])
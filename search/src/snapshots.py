@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+import os
+import re
+import json
+import time
+import zlib
+import hashlib
+import threading
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+
+from executor import RateLimiter, run_tasks
+from links import canonical_url
+import runindex
+import store
+
+SNAPSHOT_TIMEOUT = float(os.getenv('SNAPSHOT_TIMEOUT') or 30)
+SNAPSHOT_MAX_BYTES = int(os.getenv('SNAPSHOT_MAX_BYTES') or 20 * 2 ** 20)
+# Requests started per minute against any one host.
+SNAPSHOT_HOST_RATE = int(os.getenv('SNAPSHOT_HOST_RATE') or 30)
+USER_AGENT = 'Mozilla/5.0 (compatible; id-database-verification snapshot)'
+CHUNK = 2 ** 16
+CONTEXT = 80
+TAG_RE = re.compile(r'<[^>]*>')
+# Content types grep reads as text besides text/*.  Anything else (PDFs,
+# images, office documents) is skipped rather than searched as bytes.
+TEXT_TYPES = ('application/xhtml+xml', 'application/xml', 'application/json',
+              'application/javascript')
+
+# Bodies are stored once per content as <path>/blobs/<sha[:2]>/<sha>.z
+# (zlib, keyed by the sha256 of the uncompressed body); each run has a
+# manifest <path>/manifests/<run>.jsonl with one line per fetched link.
+def blob_file(path, digest):
+    return os.path.join(path, 'blobs', digest[:2], f'{digest}.z')
+
+def manifest_file(path, rdir):
+    return os.path.join(path, 'manifests', f'{rdir}.jsonl')
+
+# ---------------------------------- BLOBS ------------------------------------
+def put_blob(path, body):
+    digest = hashlib.sha256(body).hexdigest()
+    blob_path = blob_file(path, digest)
+    if not os.path.exists(blob_path):
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        tmp_path = f'{blob_path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(zlib.compress(body, 6))
+        os.replace(tmp_path, blob_path)
+    return digest
+
+# Decompressed chunks of a blob, read a piece of the file at a time.
+def iter_blob(path, digest):
+    decompressor = zlib.decompressobj()
+    with open(blob_file(path, digest), 'rb') as file:
+        while chunk := file.read(CHUNK):
+            yield decompressor.decompress(chunk)
+    yield decompressor.flush()
+
+def read_blob(path, digest):
+    return b''.join(iter_blob(path, digest))
+
+def iter_lines(path, digest, encoding='utf-8'):
+    rest = b''
+    for chunk in iter_blob(path, digest):
+        lines = (rest + chunk).split(b'\n')
+        rest = lines.pop()
+        for line in lines:
+            yield line.decode(encoding, 'replace')
+    if rest:
+        yield rest.decode(encoding, 'replace')
+# -----------------------------------------------------------------------------
+
+
+# -------------------------------- MANIFESTS ----------------------------------
+# { (query, link): entry }; the last entry for a pair wins.
+def read_manifest(path, rdir):
+    entries = dict()
+    manifest = manifest_file(path, rdir)
+    if not os.path.exists(manifest): return entries
+    with open(manifest, 'r') as file:
+        for line in file:
+            if not line.endswith('\n'): continue
+            entry = json.loads(line)
+            entries[(entry['query'], entry['link'])] = entry
+    return entries
+
+def append_manifest(path, rdir, entries):
+    manifest = manifest_file(path, rdir)
+    os.makedirs(os.path.dirname(manifest), exist_ok=True)
+    with open(manifest, 'a') as file:
+        for entry in entries:
+            file.write(json.dumps(entry) + '\n')
+# -----------------------------------------------------------------------------
+
+
+# ---------------------------------- FETCH ------------------------------------
+def download(url):
+    request = Request(url, headers={ 'User-Agent': USER_AGENT })
+    try:
+        response = urlopen(request, timeout=SNAPSHOT_TIMEOUT)
+    except HTTPError as e:
+        response = e
+    with response:
+        body = response.read(SNAPSHOT_MAX_BYTES + 1)
+        return { 'status': response.status, 'final': response.geturl(),
+                 'type': response.headers.get('Content-Type'),
+                 'truncated': len(body) > SNAPSHOT_MAX_BYTES }, \
+               body[:SNAPSHOT_MAX_BYTES]
+
+# (query, rank, link) of the first `top` items of each query of a run.
+def top_links(results_path, rdir, top, queries=None):
+    for query in runindex.get_queries(results_path, rdir):
+        if queries and query not in queries: continue
+        result = store.read_query(results_path, rdir, query) or {}
+        for rank, item in enumerate(result.get('items', [])[:top], 1):
+            if 'link' in item:
+                yield query, rank, item['link']
+
+# Fetches the top links of the given runs on a pool of threads and records
+# every one in its run's manifest.  A page is downloaded once however many
+# queries and runs returned it, and links a manifest already has a page for
+# are skipped.  Responses other than 2xx are recorded as failures without a
+# page, so the next fetch tries them again.
+def fetch_runs(path, results_path, rdirs, top=3, queries=None, workers=8):
+    limiters = dict()
+    limiters_lock = threading.Lock()
+
+    def fetch(url):
+        host = urlsplit(url).hostname
+        with limiters_lock:
+            limiter = limiters.setdefault(host, RateLimiter(SNAPSHOT_HOST_RATE))
+        limiter.wait()
+        entry, body = download(url)
+        entry['fetched'] = time.time()
+        if not 200 <= entry['status'] < 300:
+            return entry
+        entry['blob'] = put_blob(path, body)
+        entry['size'] = len(body)
+        return entry
+
+    pages = dict()
+    for rdir in rdirs:
+        done = read_manifest(path, rdir)
+        for query, rank, link in top_links(results_path, rdir, top, queries):
+            if done.get((query, link), {}).get('blob'): continue
+            pages.setdefault(canonical_url(link), (link, []))[1].append(
+                (rdir, query, rank, link))
+
+    counts = { 'pages': len(pages), 'fetched': 0, 'failed': 0 }
+    tasks = [ (link,) for link, _ in pages.values() ]
+    seen = { link: occurrences for link, occurrences in pages.values() }
+    for (link,), entry, exception in run_tasks(fetch, tasks, workers):
+        if exception:
+            entry = { 'status': None, 'error': repr(exception),
+                      'fetched': time.time() }
+            counts['failed'] += 1
+        elif 'blob' not in entry:
+            counts['failed'] += 1
+        else:
+            counts['fetched'] += 1
+        by_run = dict()
+        for rdir, query, rank, occurrence in seen[link]:
+            by_run.setdefault(rdir, []).append(
+                dict(entry, query=query, rank=rank, link=occurrence))
+        for rdir, entries in by_run.items():
+            append_manifest(path, rdir, entries)
+    return counts
+# -----------------------------------------------------------------------------
+
+
+# ---------------------------------- GREP -------------------------------------
+# Pages archived without a content type are taken for text.
+def textual(content_type):
+    kind = (content_type or 'text/plain').split(';')[0].strip().lower()
+    return kind.startswith('text/') or kind in TEXT_TYPES
+
+# Yields (rdir, query, rank, link, text) for every archived line whose text
+# (tags stripped) matches `pattern`, a case-insensitive regular expression;
+# `text` is the match with up to CONTEXT characters around it.  Each blob is
+# searched once however many links share it.  Pages that are not text are
+# not searched; their links are added to `skipped` when it is given.
+def grep(path, rdirs, pattern, queries=None, skipped=None):
+    regex = re.compile(pattern, re.I)
+    matches = dict()
+    for rdir in rdirs:
+        for entry in read_manifest(path, rdir).values():
+            if queries and entry['query'] not in queries: continue
+            digest = entry.get('blob')
+            if not digest: continue
+            if not textual(entry.get('type')):
+                if skipped is not None: skipped.add(entry['link'])
+                continue
+            if digest not in matches:
+                matches[digest] = []
+                for line in iter_lines(path, digest):
+                    text = ' '.join(TAG_RE.sub(' ', line).split())
+                    for match in regex.finditer(text):
+                        start = max(0, match.start() - CONTEXT)
+                        matches[digest].append(text[start:match.end() + CONTEXT])
+            for text in matches[digest]:
+                yield rdir, entry['query'], entry['rank'], entry['link'], text
+# -----------------------------------------------------------------------------
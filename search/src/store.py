@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+import os, sys
+import json
+import shutil
+import argparse
+import threading
+
+import runindex
+
+# 'dirs' stores a run as <run>/<query>/<query>.json; 'jsonl' stores it as a
+# single append-only <run>.jsonl.  Existing runs keep the layout they have.
+RUN_STORAGE = os.getenv('RUN_STORAGE') or 'dirs'
+SUFFIX = '.jsonl'
+
+# Parts of a response that are the same for every query of a run.  They are
+# written once, in the first line of a run file, and dropped from each query
+# record whenever they match it.
+BOILERPLATE = ('kind', 'url', 'context')
+REQUEST_BOILERPLATE = ('inputEncoding', 'outputEncoding', 'safe', 'cx')
+TITLE_PREFIX = 'Google Custom Search - '
+ITEM_KIND = 'customsearch#result'
+
+_locks = dict()
+_locks_lock = threading.Lock()
+_headers = dict()
+
+def run_file(results_path, rdir):
+    return os.path.join(results_path, rdir + SUFFIX)
+
+def run_name(entry):
+    return entry.removesuffix(SUFFIX)
+
+def layout(results_path, rdir):
+    if os.path.exists(run_file(results_path, rdir)):
+        return 'jsonl'
+    if os.path.isdir(os.path.join(results_path, rdir)):
+        return 'dirs'
+    return RUN_STORAGE
+
+def file_lock(path):
+    with _locks_lock:
+        return _locks.setdefault(path, threading.Lock())
+
+# ------------------------------- RECORDS -------------------------------------
+def make_header(result):
+    header = { k: result[k] for k in BOILERPLATE if k in result }
+    request = result.get('queries', {}).get('request', [{}])[0]
+    header['request'] = { k: request[k] for k in REQUEST_BOILERPLATE
+                          if k in request }
+    return header
+
+def compact(header, query, result):
+    record = { 'query': query }
+    for k, v in result.items():
+        if k in BOILERPLATE and header.get(k) == v: continue
+        record[k] = v
+
+    if 'queries' in record:
+        defaults = header['request']
+        record['queries'] = dict()
+        for name, pages in result['queries'].items():
+            slim = []
+            for page in pages:
+                page = { k: v for k, v in page.items()
+                         if not (k in defaults and defaults[k] == v) }
+                if page.get('title') == TITLE_PREFIX + page.get('searchTerms', ''):
+                    del page['title']
+                slim.append(page)
+            record['queries'][name] = slim
+
+    if 'items' in record:
+        record['items'] = [ { k: v for k, v in item.items()
+                              if not (k == 'kind' and v == ITEM_KIND) }
+                            for item in record['items'] ]
+    return record
+
+def expand(header, record):
+    result = { k: header[k] for k in BOILERPLATE if k in header }
+    result.update((k, v) for k, v in record.items() if k != 'query')
+
+    if 'queries' in result:
+        queries = dict()
+        for name, pages in result['queries'].items():
+            queries[name] = [ { 'title': TITLE_PREFIX + page.get('searchTerms', ''),
+                                **page, **{ k: v for k, v in header['request'].items()
+                                            if k not in page } }
+                              for page in pages ]
+        result['queries'] = queries
+
+    if 'items' in result:
+        result['items'] = [ { 'kind': ITEM_KIND, **item } for item in result['items'] ]
+    return result
+
+def read_header(path):
+    if path not in _headers:
+        with open(path, 'rb') as file:
+            _headers[path] = json.loads(file.readline())['header']
+    return _headers[path]
+# -----------------------------------------------------------------------------
+
+
+# -------------------------------- RUNS ---------------------------------------
+# Yields (query, items, offset, length) for every stored query of a run.  For
+# run files, a query written more than once is yielded once per record; the
+# last one wins.
+def scan(results_path, rdir):
+    if layout(results_path, rdir) == 'dirs':
+        rdir_path = os.path.join(results_path, rdir)
+        for query in os.listdir(rdir_path):
+            path = os.path.join(rdir_path, query, f'{query}.json')
+            if not os.path.exists(path): continue
+            try:
+                with open(path, 'r') as file:
+                    items = len(json.load(file).get('items', []))
+            except json.JSONDecodeError:
+                continue  # still being written; recorded by its writer
+            yield query, items, None, None
+        return
+
+    with open(run_file(results_path, rdir), 'rb') as file:
+        offset = 0
+        for line in file:
+            length = len(line)
+            if line.endswith(b'\n'):
+                record = json.loads(line)
+                if 'query' in record:
+                    yield (record['query'], len(record.get('items', [])),
+                           offset, length)
+            offset += length
+
+def write_query(results_path, rdir, query, result):
+    if layout(results_path, rdir) == 'dirs':
+        qdir_path = os.path.join(results_path, rdir, query)
+        os.makedirs(qdir_path, exist_ok=True)
+        with open(os.path.join(qdir_path, f'{query}.json'), 'w') as f:
+            json.dump(result, f, indent=1)
+        return None, None
+
+    path = run_file(results_path, rdir)
+    with file_lock(path), open(path, 'ab') as file:
+        if file.tell() == 0:
+            _headers[path] = make_header(result)
+            line = json.dumps({ 'header': _headers[path] },
+                              separators=(',', ':')).encode()
+            file.write(line + b'\n')
+        record = compact(read_header(path), query, result)
+        line = json.dumps(record, separators=(',', ':')).encode() + b'\n'
+        offset = file.tell()
+        file.write(line)
+    return offset, len(line)
+
+# The stored bytes of one query (a whole file, or one run file record),
+# for readers that only decode part of it.
+def read_raw(results_path, rdir, query):
+    if layout(results_path, rdir) == 'dirs':
+        path = os.path.join(results_path, rdir, query, f'{query}.json')
+        if not os.path.exists(path): return None
+        with open(path, 'rb') as file:
+            return file.read()
+
+    path = run_file(results_path, rdir)
+    if not os.path.exists(path): return None
+    offset, length = runindex.get_offsets(results_path, rdir).get(query,
+                                                                  (None, None))
+    if offset is None:
+        found = [ (o, l) for q, _, o, l in scan(results_path, rdir) if q == query ]
+        if not found: return None
+        offset, length = found[-1]
+
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        return file.read(length)
+
+def read_query(results_path, rdir, query):
+    raw = read_raw(results_path, rdir, query)
+    if raw is None: return None
+    if layout(results_path, rdir) == 'dirs':
+        return json.loads(raw)
+    return expand(read_header(run_file(results_path, rdir)), json.loads(raw))
+# -----------------------------------------------------------------------------
+
+
+# ------------------------------- CONVERT -------------------------------------
+# Rewrites every directory run under results_path as a run file.  Each query
+# is read back from the new file and compared before the directory goes.
+def convert(results_path, keep=False):
+    converted = 0
+    for rdir in runindex.get_runs(results_path):
+        if layout(results_path, rdir) != 'dirs': continue
+        rdir_path = os.path.join(results_path, rdir)
+        queries = sorted(q for q, _, _, _ in scan(results_path, rdir))
+        tmp_path = run_file(results_path, rdir) + '.tmp'
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+
+        results = { q: read_query(results_path, rdir, q) for q in queries }
+        with open(tmp_path, 'wb') as file:
+            header = make_header(next(iter(results.values()), {}))
+            file.write(json.dumps({ 'header': header },
+                                  separators=(',', ':')).encode() + b'\n')
+            for query in queries:
+                record = compact(header, query, results[query])
+                file.write(json.dumps(record, separators=(',', ':')).encode()
+                           + b'\n')
+
+        _headers.pop(tmp_path, None)
+        with open(tmp_path, 'rb') as file:
+            header = json.loads(file.readline())['header']
+            for line, query in zip(file, queries):
+                if expand(header, json.loads(line)) != results[query]:
+                    raise Exception(f'{rdir} ({query}) did not round-trip.')
+
+        os.replace(tmp_path, run_file(results_path, rdir))
+        if keep:
+            os.rename(rdir_path, rdir_path + '.bak')
+        else:
+            shutil.rmtree(rdir_path)
+        converted += 1
+
+    runindex.rebuild(results_path)
+    return converted
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description='Convert directory runs to single-file runs.')
+    parser.add_argument('results_path', nargs='+',
+                        help='results directories to convert.')
+    parser.add_argument('--keep', action='store_true',
+                        help='keep the old directories as <run>.bak.')
+    parsed = parser.parse_args(args)
+
+    for results_path in parsed.results_path:
+        count = convert(results_path, parsed.keep)
+        print(f'{results_path}: converted {count} runs.')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
+# -----------------------------------------------------------------------------
@@ -0,0 +1,29 @@
+from cache import ResponseCache
+
+def stored_size(cache):
+    return sum(s.st_size for _, s in cache.entries())
+
+def test_put_tracks_size(tmp_path):
+    cache = ResponseCache(str(tmp_path), 10 ** 6)
+    cache.put({ 'q': 'a' }, { 'items': [ 1 ] })
+    cache.put({ 'q': 'b' }, { 'items': [ 1, 2 ] })
+    assert cache.size == stored_size(cache)
+
+def test_overwrite_replaces_size(tmp_path):
+    cache = ResponseCache(str(tmp_path), 10 ** 6)
+    cache.put({ 'q': 'a' }, { 'items': list(range(100)) })
+    for _ in range(5):
+        cache.put({ 'q': 'a' }, { 'items': [ 1 ] })
+    assert cache.size == stored_size(cache)
+    assert cache.get({ 'q': 'a' }, None) == { 'items': [ 1 ] }
+
+def test_overwrite_does_not_evict(tmp_path):
+    result = { 'items': list(range(50)) }
+    cache = ResponseCache(str(tmp_path), 10 ** 6)
+    cache.put({ 'q': 'a' }, result)
+    cache.max_bytes = 3 * cache.size
+    cache.put({ 'q': 'b' }, result)
+    for _ in range(10):
+        cache.put({ 'q': 'a' }, result)
+    assert cache.get({ 'q': 'b' }, None) == result
+    assert len(list(cache.entries())) == 2
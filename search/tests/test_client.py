@@ -0,0 +1,43 @@
+import threading
+
+import client
+
+def test_service_per_thread_and_key(monkeypatch):
+    built = []
+    def make_service(key, http=None):
+        built.append(key)
+        return object()
+    monkeypatch.setattr(client, 'make_service', make_service)
+    monkeypatch.setattr(client, '_local', threading.local())
+
+    first = client.get_service('a')
+    assert client.get_service('a') is first
+    assert client.get_service('b') is not first
+
+    others = []
+    thread = threading.Thread(target=lambda: others.append(
+        client.get_service('a')))
+    thread.start()
+    thread.join()
+    assert others[0] is not first
+    assert built == [ 'a', 'b', 'a' ]
+
+def test_discovery_document_is_local(monkeypatch):
+    monkeypatch.setattr(client, '_document', None)
+    document = client.discovery_document()
+    assert '"customsearch"' in document
+    assert client.discovery_document() is document
+
+class Http:
+    def request(self, *args, **kwargs):
+        return { 'status': '200' }, b'{"items": []}'
+
+    def close(self):
+        return 'closed'
+
+def test_counting_http():
+    http = client.CountingHttp(Http())
+    assert http.request('https://example.gov') == \
+           ({ 'status': '200' }, b'{"items": []}')
+    assert client.received() == len(b'{"items": []}')
+    assert http.close() == 'closed'
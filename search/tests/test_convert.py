@@ -0,0 +1,123 @@
+import os
+import json
+
+import pytest
+
+import convert
+
+QUERIES = { '00': '"{STATE}" "mobile ID"', '01': '"{STATE}" {STATE_STATUTE}' }
+STATES = { 'Alabama': [ 'Code of Alabama', 'https://www.alea.gov' ],
+           'Alaska': [ 'Alaska Statutes', 'https://dmv.alaska.gov' ] }
+
+def write(path, data):
+    with open(path, 'w') as file:
+        json.dump(data, file)
+
+@pytest.fixture
+def config(tmp_path):
+    paths = { 'path': str(tmp_path / 'plan.json'),
+              'queries_path': str(tmp_path / 'queries.json'),
+              'states_path': str(tmp_path / 'states.json') }
+    write(paths['queries_path'], QUERIES)
+    write(paths['states_path'], STATES)
+    return paths
+
+# Fails the test if the plan is compiled again.
+def no_compile(monkeypatch):
+    def compile_plan(*args):
+        raise Exception('Compiled a fresh plan again.')
+    monkeypatch.setattr(convert, 'compile_plan', compile_plan)
+
+def test_compile_plan():
+    plan = convert.compile_plan(QUERIES, STATES)
+    assert list(plan.tasks) == [ ('Alabama', '00'), ('Alabama', '01'),
+                                 ('Alaska', '00'), ('Alaska', '01') ]
+    task = plan.tasks[('Alaska', '01')]
+    assert task.text == '"Alaska" Alaska Statutes'
+    assert task.hash == convert.text_hash(task.text)
+    assert convert.sweep(plan._replace(searchlist=[ 'Alaska' ]), [ '00' ]) == \
+           [ plan.tasks[('Alaska', '00')] ]
+
+def test_fingerprint_rehashes_only_changed_files(tmp_path):
+    path = str(tmp_path / 'queries.json')
+    write(path, QUERIES)
+    known = convert.fingerprint(path)
+    assert convert.fingerprint(path, dict(known, sha256='stale')) == \
+           dict(known, sha256='stale')
+
+    os.utime(path, ns=(known['mtime'] + 10**9, known['mtime'] + 10**9))
+    assert convert.fingerprint(path, dict(known, sha256='stale')) == \
+           dict(known, mtime=known['mtime'] + 10**9)
+
+def test_load_plan_reuses_an_unchanged_plan(config, monkeypatch):
+    plan = convert.load_plan(**config)
+    assert os.path.exists(config['path'])
+    no_compile(monkeypatch)
+    assert convert.load_plan(**config) == plan
+
+    # Touched but not changed: still fresh, with the new mtime recorded.
+    stat = os.stat(config['states_path'])
+    os.utime(config['states_path'], ns=(stat.st_atime_ns,
+                                        stat.st_mtime_ns + 10**9))
+    assert convert.load_plan(**config) == plan
+    stored = convert.read_plan(config['path'])
+    assert stored['inputs']['states']['mtime'] == stat.st_mtime_ns + 10**9
+
+def test_load_plan_recompiles_changed_inputs(config, tmp_path):
+    convert.load_plan(**config)
+    write(config['queries_path'], dict(QUERIES, **{ '02': '"{STATE}" ID' }))
+    plan = convert.load_plan(**config)
+    assert ('Alaska', '02') in plan.tasks
+
+    # A search list that was not there before changes the plan too.
+    searchlist = tmp_path / 'searchlist.txt'
+    searchlist.write_text('Alaska\n')
+    plan = convert.load_plan(**config, searchlist_path=str(searchlist))
+    assert plan.searchlist == [ 'Alaska' ]
+    plan = convert.load_plan(**config)
+    assert plan.searchlist is None
+
+def test_load_plan_ignores_other_versions(config, monkeypatch):
+    convert.load_plan(**config)
+    with open(config['path'], 'r') as file:
+        stored = json.load(file)
+    write(config['path'], dict(stored, version=convert.PLAN_VERSION + 1))
+    assert convert.read_plan(config['path']) is None
+
+    # Rewritten at the current version.
+    convert.load_plan(**config)
+    no_compile(monkeypatch)
+    convert.load_plan(**config)
+
+# queries.txt and states.csv are converted again only when they, or the
+# files made from them, change.
+def test_build_follows_its_sources(tmp_path, monkeypatch):
+    queries_txt = tmp_path / 'queries.txt'
+    queries_txt.write_text('# terms\nID: "mobile ID"\n\n'
+                           '# queries\n"{{STATE}}" {ID}\n')
+    states_csv = tmp_path / 'states.csv'
+    states_csv.write_text('state,statute,dmv\n'
+                          'Alabama,Code of Alabama,https://www.alea.gov\n')
+    for name, path in (('QUERIES_CONVERT', queries_txt),
+                       ('STATES_CONVERT', states_csv),
+                       ('QUERIES_PATH', tmp_path / 'queries.json'),
+                       ('STATES_PATH', tmp_path / 'states.json'),
+                       ('SEARCHLIST_PATH', None)):
+        monkeypatch.setattr(convert, name, path and str(path))
+    monkeypatch.setenv('PLAN_PATH', str(tmp_path / 'plan.json'))
+
+    assert convert.build()
+    assert not convert.build()
+    stored = convert.read_plan(str(tmp_path / 'plan.json'))
+    assert stored['queries'] == { '00': '"{STATE}" "mobile ID"' }
+
+    queries_txt.write_text('# queries\n"{{STATE}}" wallet\n')
+    assert convert.build()
+    assert not convert.build()
+
+    # An edited queries.json is replaced from queries.txt.
+    write(str(tmp_path / 'queries.json'), QUERIES)
+    assert convert.build()
+    with open(tmp_path / 'queries.json', 'r') as file:
+        assert json.load(file) == { '00': '"{STATE}" wallet' }
+    assert convert.build(force=True)
@@ -0,0 +1,52 @@
+import time
+
+import store
+import dataset
+
+RDIRS = [ 'Alabama_01-01-2025_09:00:00', 'Alaska_01-02-2025_10:30:00' ]
+
+def result(terms, links):
+    return { 'queries': { 'request': [ { 'searchTerms': terms } ] },
+             'items': [ { 'link': link, 'displayLink': link[8:],
+                          'title': f'Title {link}', 'snippet': 'Mobile ID.' }
+                        for link in links ] }
+
+def make_tree(tmp_path):
+    results_path = str(tmp_path / 'results')
+    store.write_query(results_path, RDIRS[0], '00',
+                      result('"Alabama" "mobile ID"',
+                             [ 'https://a.gov', 'https://b.gov' ]))
+    store.write_query(results_path, RDIRS[0], '01', result('"Alabama" ID', []))
+    store.write_query(results_path, RDIRS[1], '01',
+                      result('"Alaska" ID', [ 'https://c.gov' ]))
+    return results_path
+
+def test_normalize_run(tmp_path):
+    results_path = make_tree(tmp_path)
+    records = dataset.normalize_run(results_path, RDIRS[0])
+    assert [ (r['query'], r['rank'], r['link']) for r in records ] == \
+           [ ('00', 1, 'https://a.gov'), ('00', 2, 'https://b.gov') ]
+    assert records[0] == {
+        'state': 'Alabama', 'query': '00',
+        'query_text': '"Alabama" "mobile ID"', 'rank': 1,
+        'link': 'https://a.gov', 'display_link': 'a.gov',
+        'title': 'Title https://a.gov', 'snippet': 'Mobile ID.',
+        'run': RDIRS[0],
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S',
+                              time.strptime('01-01-2025_09:00:00',
+                                            '%m-%d-%Y_%H:%M:%S')) }
+    assert set(records[0]) == set(dataset.FIELDS)
+    assert dataset.normalize_run(results_path, RDIRS[0], [ '01' ]) == []
+
+def test_build(tmp_path):
+    results_path = make_tree(tmp_path)
+    path = str(tmp_path / 'dataset.jsonl')
+    assert dataset.build(results_path, RDIRS, path, workers=2) == 3
+    records = dataset.read_dataset(path)
+    assert [ (r['state'], r['link']) for r in records ] == \
+           [ ('Alabama', 'https://a.gov'), ('Alabama', 'https://b.gov'),
+             ('Alaska', 'https://c.gov') ]
+
+    assert dataset.build(results_path, RDIRS, path, queries=[ '01' ]) == 1
+    assert [ r['link'] for r in dataset.iter_dataset(path) ] == \
+           [ 'https://c.gov' ]
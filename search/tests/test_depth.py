@@ -0,0 +1,61 @@
+import os, sys
+import json
+import subprocess
+
+import pytest
+
+import store
+import runindex
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+SAMPLE = os.path.join(SRC, '..', 'results', 'Alabama_13-08-2025_15:22:08',
+                      '00', '00.json')
+RDIR = 'Alabama_01-01-2025_09:00:00'
+QUERIES = { '00': '"{STATE}" "mobile ID"' }
+STATES = { 'Alabama': [ 'Code of Alabama', 'https://www.alea.gov' ] }
+TEXT = '"Alabama" "mobile ID"'
+
+# 25 results of TEXT that the API has no more of.
+def make_result():
+    with open(SAMPLE, 'r') as file:
+        result = json.load(file)
+    result['items'] = [ dict(result['items'][i % len(result['items'])],
+                             link=f'https://example.gov/{i}')
+                        for i in range(25) ]
+    result['queries'] = { 'request': [ dict(result['queries']['request'][0],
+                                            searchTerms=TEXT) ] }
+    result['searchInformation']['totalResults'] = '25'
+    return result
+
+# "search --depth N" against a replayed tree: pages 2..N are fetched and
+# merged into the one stored result, stopping where the results end.
+@pytest.mark.parametrize('depth, count, more', [ (1, 10, True),
+                                                 (2, 20, True),
+                                                 (5, 25, False) ])
+def test_search_depth(tmp_path, depth, count, more):
+    source, results = str(tmp_path / 'source'), str(tmp_path / 'results')
+    store.write_query(source, RDIR, '00', make_result())
+    os.makedirs(results)
+    for name, data in (('queries.json', QUERIES), ('states.json', STATES)):
+        with open(tmp_path / name, 'w') as file:
+            json.dump(data, file)
+
+    env = { k: v for k, v in os.environ.items() if k != 'USE_TMP' }
+    env.update(QUERIES_PATH=str(tmp_path / 'queries.json'),
+               STATES_PATH=str(tmp_path / 'states.json'),
+               PLAN_PATH=str(tmp_path / 'plan.json'), RESULTS_PATH=results,
+               CSE_REPLAY=source, CSE_KEY='test', CACHE_PATH='',
+               CSE_WORKERS='4', SEARCHLIST='', LOGGING='')
+    done = subprocess.run([ sys.executable, os.path.join(SRC, 'main.py'),
+                            '--depth', str(depth), 'search', 'Alabama' ],
+                          env=env, capture_output=True, text=True,
+                          timeout=120)
+    assert done.returncode == 0, done.stderr
+
+    rdir = runindex.get_runs(results, 'Alabama')[0]
+    result = store.read_query(results, rdir, '00')
+    assert [ i['link'] for i in result['items'] ] == \
+           [ f'https://example.gov/{i}' for i in range(count) ]
+    assert ('nextPage' in result['queries']) == more
+    if more:
+        assert result['queries']['nextPage'][0]['startIndex'] == count + 1
@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+import executor
+
+# A clock that only moves when something sleeps.
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+        self.lock = threading.Lock()
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.now += seconds
+
+def test_rate_limiter_spaces_out_calls(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(executor.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(executor.time, 'sleep', clock.sleep)
+    limiter = executor.RateLimiter(per_minute=60)
+
+    starts = []
+    for _ in range(3):
+        limiter.wait()
+        starts.append(clock.now)
+    assert starts == [ 100.0, 101.0, 102.0 ]
+
+    # After an idle spell the next call goes straight away.
+    clock.now = 200.0
+    limiter.wait()
+    assert clock.now == 200.0
+
+    limiter.set_rate(None)
+    limiter.wait()
+    limiter.wait()
+    assert clock.now == 200.0
+
+def test_rate_limiter_is_shared_by_threads():
+    limiter = executor.RateLimiter(per_minute=60 * 50)
+    starts = []
+    def call():
+        limiter.wait()
+        starts.append(executor.time.monotonic())
+    threads = [ threading.Thread(target=call) for _ in range(5) ]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    starts.sort()
+    gaps = [ b - a for a, b in zip(starts, starts[1:]) ]
+    assert min(gaps) >= 0.015
+
+def test_run_tasks_yields_every_task():
+    def square(n):
+        if n == 3:
+            raise ValueError(n)
+        return n * n
+    tasks = [ (n,) for n in range(6) ]
+    done = { task: (result, exception) for task, result, exception
+             in executor.run_tasks(square, tasks, workers=3) }
+    assert set(done) == set(tasks)
+    assert done[(4,)] == (16, None)
+    result, exception = done[(3,)]
+    assert result is None and isinstance(exception, ValueError)
+
+@pytest.mark.parametrize('workers', [ 0, 1 ])
+def test_run_tasks_with_one_worker(workers):
+    done = [ (task, result) for task, result, _ in
+             executor.run_tasks(lambda n: n, [ (1,), (2,), (3,) ], workers) ]
+    assert sorted(done) == [ ((1,), 1), ((2,), 2), ((3,), 3) ]
@@ -0,0 +1,51 @@
+import store
+import runindex
+import fulltext
+
+RUNS = [ 'Alabama_01-01-2025_09:00:00', 'Alaska_01-01-2025_09:00:00' ]
+
+def item(title, snippet, link):
+    return { 'title': title, 'snippet': snippet, 'link': link }
+
+def make_tree(tmp_path):
+    results_path = str(tmp_path / 'results')
+    store.write_query(results_path, RUNS[0], '00', { 'items': [
+        item('Mobile ID', 'Get a mobile ID for Alabama.', 'https://a.gov/id'),
+        item('Driver license', 'Renew a license online.', 'https://a.gov/dl'),
+    ] })
+    store.write_query(results_path, RUNS[1], '00', { 'items': [
+        item('Alaska DMV', 'Mobile ID is not offered yet.', 'https://b.gov'),
+    ] })
+    return results_path
+
+def test_update_indexes_only_new_queries(tmp_path):
+    results_path = make_tree(tmp_path)
+    assert fulltext.update(results_path) == 2
+    assert fulltext.update(results_path) == 0
+
+    # Recorded by the search that wrote it, as "search" does.
+    result = { 'items': [ item('Wallet', 'Add an ID to a wallet.',
+                               'https://a.gov/wallet') ] }
+    offset, length = store.write_query(results_path, RUNS[0], '01', result)
+    runindex.record_query(results_path, RUNS[0], '01', 1, offset, length)
+    assert fulltext.update(results_path) == 1
+
+def test_find(tmp_path):
+    results_path = make_tree(tmp_path)
+    fulltext.update(results_path)
+
+    found = fulltext.find(results_path, 'mobile id')
+    assert [ (r[0], r[1], r[2]) for r in found ] == \
+           [ (RUNS[0], '00', 1), (RUNS[1], '00', 1) ]
+    assert '[Mobile]' in found[1][5]
+
+    assert [ r[4] for r in fulltext.find(results_path, 'mobile',
+                                         rdirs=[ RUNS[1] ]) ] == \
+           [ 'https://b.gov' ]
+    assert fulltext.find(results_path, 'mobile', queries=[ '01' ]) == []
+    assert [ r[4] for r in fulltext.find(results_path, 'title:license') ] == \
+           [ 'https://a.gov/dl' ]
+
+    # Not valid FTS5 syntax: searched as plain words.
+    assert [ r[4] for r in fulltext.find(results_path, 'renew "license') ] == \
+           [ 'https://a.gov/dl' ]
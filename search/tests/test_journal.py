@@ -0,0 +1,22 @@
+from journal import Journal, PENDING, DONE, FAILED
+
+TASKS = [ ('Alabama', '00', '/results/Alabama_01-01-2025_09:00:00'),
+          ('Alabama', '01', '/results/Alabama_01-01-2025_09:00:00') ]
+
+def test_runs_in_the_same_second(tmp_path, monkeypatch):
+    monkeypatch.setattr('time.strftime', lambda _: '01-01-2025_09:00:00')
+    ids = [ Journal.create(str(tmp_path)).run_id for _ in range(3) ]
+    assert ids == [ '01-01-2025_09:00:00', '01-01-2025_09:00:00-2',
+                    '01-01-2025_09:00:00-3' ]
+
+def test_resume_keeps_settings(tmp_path):
+    journal = Journal.create(str(tmp_path), { 'depth': 3, 'max_age': 3600.0 })
+    journal.add(TASKS)
+    journal.mark('Alabama', '00', DONE)
+    journal.mark('Alabama', '01', FAILED, 'HttpError 500')
+
+    resumed = Journal.load(str(tmp_path), journal.run_id)
+    assert resumed.settings == { 'depth': 3, 'max_age': 3600.0 }
+    assert resumed.unfinished() == [ ('Alabama', '01',
+                                      'Alabama_01-01-2025_09:00:00') ]
+    assert resumed.counts() == { PENDING: 0, DONE: 1, FAILED: 1 }
@@ -0,0 +1,94 @@
+import json
+import threading
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from keys import KeyPool, QuotaExhausted, classify, DAILY, MINUTE, PERMANENT
+
+def http_error(status, message, reason, details=None, q='daily report'):
+    error = { 'code': status, 'message': message,
+              'errors': [ { 'message': message, 'domain': 'global',
+                            'reason': reason } ] }
+    if details:
+        error['details'] = details
+    return HttpError(httplib2.Response({ 'status': status }),
+                     json.dumps({ 'error': error }).encode(),
+                     uri=f'https://customsearch.googleapis.com/v1?q={q}')
+
+def test_query_text_does_not_make_daily():
+    error = http_error(429, "Quota exceeded for quota metric 'Queries' and "
+                            "limit 'Queries per minute'", 'rateLimitExceeded',
+                       q='"daily" limit per day')
+    assert classify(error) == MINUTE
+
+def test_daily_from_message():
+    error = http_error(429, "Quota exceeded for quota metric 'Queries' and "
+                            "limit 'Queries per day'", 'rateLimitExceeded')
+    assert classify(error) == DAILY
+
+def test_daily_from_error_info():
+    details = [ { '@type': 'type.googleapis.com/google.rpc.ErrorInfo',
+                  'reason': 'RATE_LIMIT_EXCEEDED',
+                  'metadata': { 'quota_limit': 'DefaultPerDayPerProject' } } ]
+    error = http_error(429, 'Quota exceeded.', 'rateLimitExceeded', details)
+    assert classify(error) == DAILY
+
+# A quota 403 as the API sends it now: "details" comes first for
+# googleapiclient, and its ErrorInfo reason is upper case.
+def test_forbidden_quota_with_errors_and_details():
+    details = [ { '@type': 'type.googleapis.com/google.rpc.ErrorInfo',
+                  'reason': 'RATE_LIMIT_EXCEEDED',
+                  'domain': 'googleapis.com',
+                  'metadata': { 'service': 'customsearch.googleapis.com',
+                                'consumer': 'projects/123',
+                                'quota_metric': 'customsearch.googleapis.com/'
+                                                'requests',
+                                'quota_limit': 'DefaultPerMinutePerProject' } } ]
+    error = http_error(403, "Quota exceeded for quota metric 'Queries' and "
+                            "limit 'Queries per minute' of service "
+                            "'customsearch.googleapis.com'.",
+                       'rateLimitExceeded', details)
+    assert classify(error) == MINUTE
+
+    details[0]['metadata']['quota_limit'] = 'DefaultPerDayPerProject'
+    error = http_error(403, "Quota exceeded for quota metric 'Queries' and "
+                            "limit 'Queries per day'", 'rateLimitExceeded',
+                       details)
+    assert classify(error) == DAILY
+
+def test_forbidden_without_quota_reason_is_permanent():
+    error = http_error(403, 'The caller does not have permission', 'forbidden',
+                       [ { '@type': 'type.googleapis.com/google.rpc.ErrorInfo',
+                           'reason': 'SERVICE_DISABLED' } ])
+    assert classify(error) == PERMANENT
+
+def test_bad_request_is_permanent():
+    assert classify(http_error(400, 'Invalid Value', 'invalid')) == PERMANENT
+
+def test_acquire_reserves_budget(tmp_path):
+    pool = KeyPool([ 'a', 'b' ], 50, str(tmp_path / 'ledger.json'))
+    acquired, refused = [], []
+    def worker():
+        for _ in range(20):
+            try:
+                acquired.append(pool.acquire())
+            except QuotaExhausted:
+                refused.append(1)
+    threads = [ threading.Thread(target=worker) for _ in range(8) ]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert len(acquired) == 100
+    assert len(refused) == 60
+    assert acquired.count('a') == acquired.count('b') == 50
+
+def test_release_and_flush(tmp_path):
+    path = tmp_path / 'ledger.json'
+    pool = KeyPool([ 'a' ], 3, str(path))
+    for _ in range(3):
+        key = pool.acquire()
+    pool.release(key)
+    pool.spend(pool.acquire())
+    assert not path.exists()
+    pool.flush()
+    assert KeyPool([ 'a' ], 3, str(path)).remaining('a') == 2
@@ -0,0 +1,39 @@
+import pytest
+
+import links
+
+@pytest.mark.parametrize('url, canonical', [
+    ('https://www.alea.gov/', 'https://alea.gov'),
+    ('http://ALEA.gov/dps/', 'https://alea.gov/dps'),
+    ('https://alea.gov:443/dps', 'https://alea.gov/dps'),
+    ('https://alea.gov:8443/dps', 'https://alea.gov:8443/dps'),
+    ('alea.gov/dps', 'https://alea.gov/dps'),
+    ('//alea.gov/dps', 'https://alea.gov/dps'),
+    ('  https://alea.gov/dps#top ', 'https://alea.gov/dps'),
+    ('https://alea.gov/dps?utm_source=x&b=2&gclid=y&a=1',
+     'https://alea.gov/dps?a=1&b=2'),
+    ('https://alea.gov/dps?q=', 'https://alea.gov/dps?q='),
+    ('https://alea.gov/Mobile-ID', 'https://alea.gov/Mobile-ID'),
+    ('mailto:help@alea.gov', 'mailto:help@alea.gov'),
+    ('ftp://alea.gov/file', 'ftp://alea.gov/file'),
+    ('https://alea.gov:port/', 'https://alea.gov:port/'),
+])
+def test_canonical_url(url, canonical):
+    assert links.canonical_url(url) == canonical
+
+def test_index_collapses_spellings():
+    records = [ { 'state': 'Alabama', 'query': '00', 'rank': 1, 'run': 'r1',
+                  'link': 'https://www.alea.gov/' },
+                { 'state': 'Alabama', 'query': '01', 'rank': 3, 'run': 'r1',
+                  'link': 'http://alea.gov?utm_medium=x' },
+                { 'state': 'Alaska', 'query': '00', 'rank': 2, 'run': 'r2',
+                  'link': 'https://alea.gov' } ]
+    index = links.build_index(records)
+    assert list(index) == [ 'https://alea.gov' ]
+    assert links.canonical_links(index, [ 'r2' ]) == \
+           { ('r2', '00', 2): 'https://alea.gov' }
+
+    stats = links.stats(index)
+    assert stats['occurrences'] == 3
+    assert stats['state_url_pairs'] == 2
+    assert stats['saved'] == 1
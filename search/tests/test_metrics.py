@@ -0,0 +1,61 @@
+import pytest
+
+import metrics
+
+def event(latency, status=200, **extra):
+    return { 'time': 0.0, 'rdir': 'r', 'state': 'Alabama', 'query': '00',
+             'latency': latency, 'status': status, **extra }
+
+@pytest.mark.parametrize('values, fraction, expected', [
+    ([], 0.5, None),
+    ([ 1 ], 0.95, 1),
+    ([ 1, 2 ], 0.5, 1),
+    ([ 1, 2, 3, 4 ], 0.5, 2),
+    ([ 1, 2, 3, 4, 5 ], 0.5, 3),
+    (list(range(1, 21)), 0.95, 19),
+    (list(range(1, 101)), 0.95, 95),
+    ([ 1, 2, 3 ], 0.0, 1),
+    ([ 1, 2, 3 ], 1.0, 3),
+])
+def test_percentile(values, fraction, expected):
+    assert metrics.percentile(values, fraction) == expected
+
+def test_summarize_latency_leaves_out_cached_pages():
+    events = [ event(latency / 10, time=latency)
+               for latency in range(20, 0, -1) ]
+    events.append(event(100.0, cached=True, time=30))
+    latency = metrics.summarize(events)['latency']
+    assert latency['p50'] == pytest.approx(1.0)
+    assert latency['p95'] == pytest.approx(1.9)
+    assert latency['max'] == pytest.approx(2.0)
+    assert latency['count'] == 20
+    assert latency['sum'] == pytest.approx(21.0)
+
+def test_summarize_counts():
+    events = [ event(0.5, time=10, key='a', items=10),
+               event(0.2, status=429, backoff=2.0, time=11),
+               event(0.4, attempt=1, time=14, key='a', items=10),
+               event(0.0, cached=True, time=15, items=10, query='01') ]
+    summary = metrics.summarize(events)
+    assert (summary['requests'], summary['cached'], summary['pages']) == \
+           (3, 1, 3)
+    assert summary['retries'] == 1
+    assert summary['statuses'] == { '200': 2, '429': 1 }
+    assert summary['quota'] == { 'a': 2 }
+    assert summary['backoff'] == 2.0
+    assert summary['elapsed'] == 5
+    assert summary['slowest'][0]['query'] == '00'
+    assert summary['slowest'][0]['seconds'] == pytest.approx(3.1)
+    assert metrics.summarize([])['latency']['p50'] is None
+
+def test_sink_writes_a_buffer_at_a_time(tmp_path):
+    path = str(tmp_path / 'metrics' / 'metrics.jsonl')
+    sink = metrics.MetricsSink(path, run='r1', buffer_size=2)
+    sink.emit(latency=0.1)
+    assert list(metrics.read_events(path)) == []
+    sink.emit(latency=0.2)
+    sink.emit(latency=0.3)
+    assert [ e['latency'] for e in metrics.read_events(path) ] == [ 0.1, 0.2 ]
+    sink.flush()
+    assert len(list(metrics.read_events(path, run='r1'))) == 3
+    assert list(metrics.read_events(path, run='r2')) == []
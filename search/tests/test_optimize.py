@@ -0,0 +1,128 @@
+import os, sys
+import json
+import subprocess
+
+import store
+import runindex
+import optimize
+from convert import Task
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+SAMPLE = os.path.join(SRC, '..', 'results', 'Alabama_13-08-2025_15:22:08',
+                      '00', '00.json')
+RDIR = 'Alabama_01-01-2025_09:00:00'
+QUERIES = { '00': '"{STATE}" "mobile ID"',
+            '01': '"{STATE}" "mobile ID" -"apple"',
+            '02': '"{STATE}" "mobile ID" -"wallet"' }
+STATES = { 'Alabama': [ 'Code of Alabama', 'https://www.alea.gov' ] }
+
+# A result shaped like the stored sample (request, nextPage, search
+# information), holding `count` items of which every fourth is about Apple.
+def make_result(text, count):
+    with open(SAMPLE, 'r') as file:
+        sample = json.load(file)
+    items = []
+    for i in range(count):
+        item = dict(sample['items'][i % len(sample['items'])])
+        item['link'] = f'https://example.gov/{i}'
+        item['title'] = (f'Apple Wallet ID {i}' if i % 4 == 0
+                         else f'Mobile ID {i}')
+        item['snippet'] = 'Mobile ID for Alabama drivers.'
+        items.append(item)
+    request = dict(sample['queries']['request'][0], searchTerms=text)
+    return dict(sample, items=items,
+                queries={ 'request': [ request ],
+                          'nextPage': [ dict(request, startIndex=count + 1) ] })
+
+def test_derive_needs_a_deeper_parent():
+    excluded = { '"apple"' }
+    first_page = make_result('"Alabama" "mobile ID"', 10)
+    assert optimize.derive(first_page, excluded, 1) is None
+
+    two_pages = make_result('"Alabama" "mobile ID"', 20)
+    derived = optimize.derive(two_pages, excluded, 1, 'child', '00')
+    assert len(derived['items']) == 10
+    assert not any('Apple' in item['title'] for item in derived['items'])
+    assert 'nextPage' in derived['queries']
+    assert derived['derived'] == { 'query': '00', 'excluded': [ '"apple"' ] }
+
+def test_schedule_deepens_parents_of_exclusions():
+    planned = [ Task('Alabama', q, t.format(STATE='Alabama'), '')
+                for q, t in QUERIES.items() ]
+    tasks = [ (t.state, t.query, 'run') for t in planned ]
+    relations = [ r for r in optimize.relate(planned)
+                  if r.kind == 'exclusion' ]
+    assert len(relations) == 2
+    scores = { optimize.pair(r): (1.0, 3) for r in relations }
+
+    searched, derived, _ = optimize.schedule(tasks, relations, scores,
+                                             check=0)
+    assert searched == tasks[:1]
+    assert derived == { tasks[1]: ('00', frozenset({ '"apple"' })),
+                        tasks[2]: ('00', frozenset({ '"wallet"' })) }
+    assert optimize.deepened(derived) == { tasks[0] }
+
+    # One child does not pay for the parent's extra page.
+    searched, derived, _ = optimize.schedule(tasks, relations[:1], scores,
+                                             check=0)
+    assert searched == tasks and not derived
+
+    _, derived, _ = optimize.schedule(tasks, relations, scores, check=0,
+                                      depth=optimize.MAX_DEPTH)
+    assert not derived
+
+def test_trim():
+    result = make_result('"Alabama" "mobile ID"', 20)
+    trimmed = optimize.trim(result, 1)
+    assert [ i['link'] for i in trimmed['items'] ] == \
+           [ i['link'] for i in result['items'][:10] ]
+    assert trimmed['queries']['nextPage'][0]['startIndex'] == 11
+    assert len(result['items']) == 20
+    assert optimize.trim(result, 2) is result
+
+# "search --optimize" against a replayed tree where an earlier run searched
+# every query and agreed: the children come from their parent, searched a
+# page deeper and then stored at the asked depth, and the savings count the
+# extra page.
+def test_search_derives_from_replayed_tree(tmp_path):
+    texts = { q: t.format(STATE='Alabama') for q, t in QUERIES.items() }
+    parent = make_result(texts['00'], 40)
+    children = dict()
+    for query, term in (('01', '"apple"'), ('02', '"wallet"')):
+        children[query] = make_result(texts[query], 0)
+        children[query]['items'] = optimize.kept(parent, { term })
+    source, results = str(tmp_path / 'source'), str(tmp_path / 'results')
+    for path in (source, results):
+        store.write_query(path, RDIR, '00', parent)
+        for query, child in children.items():
+            store.write_query(path, RDIR, query, child)
+    for name, data in (('queries.json', QUERIES), ('states.json', STATES)):
+        with open(tmp_path / name, 'w') as file:
+            json.dump(data, file)
+
+    env = { k: v for k, v in os.environ.items() if k != 'USE_TMP' }
+    env.update(QUERIES_PATH=str(tmp_path / 'queries.json'),
+               STATES_PATH=str(tmp_path / 'states.json'),
+               PLAN_PATH=str(tmp_path / 'plan.json'), RESULTS_PATH=results,
+               CSE_REPLAY=source, CSE_KEY='test', CACHE_PATH='',
+               OPTIMIZE_CHECK='0', SEARCHLIST='', LOGGING='')
+    done = subprocess.run([ sys.executable, os.path.join(SRC, 'main.py'),
+                            '--optimize', 'search', 'Alabama' ], env=env,
+                          capture_output=True, text=True, timeout=120)
+    assert done.returncode == 0, done.stderr
+    assert 'Alabama (01) from (00)' in done.stdout
+    assert 'Alabama (02) from (00)' in done.stdout
+    assert ('Derived 2 searches from broader ones, saving about 1 queries '
+            '(2 pages derived, less 1 more pages of their parents).'
+            in done.stdout)
+
+    rdir = [ r for r in runindex.get_runs(results, 'Alabama') if r != RDIR ][0]
+    searched = store.read_query(results, rdir, '00')
+    assert [ i['link'] for i in searched['items'] ] == \
+           [ i['link'] for i in parent['items'][:10] ]
+    assert runindex.get_queries(results, rdir) == [ '00', '01', '02' ]
+    for query, child in children.items():
+        derived = store.read_query(results, rdir, query)
+        assert derived['derived']['query'] == '00'
+        assert [ i['link'] for i in derived['items'] ] == \
+               [ i['link'] for i in child['items'][:10] ]
@@ -0,0 +1,88 @@
+import os
+import json
+
+import pytest
+from googleapiclient.errors import HttpError
+
+import store
+import client
+import replay
+
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                      'results', 'Alabama_13-08-2025_15:22:08', '00', '00.json')
+RDIRS = [ 'Alabama_01-01-2025_09:00:00', 'Alabama_01-02-2025_09:00:00' ]
+
+def sample(count):
+    with open(SAMPLE, 'r') as file:
+        result = json.load(file)
+    result['items'] = [ dict(result['items'][i % len(result['items'])],
+                             link=f'https://example.gov/{i}')
+                        for i in range(count) ]
+    return result
+
+def terms(result):
+    return result['queries']['request'][0]['searchTerms']
+
+@pytest.fixture
+def tree(tmp_path):
+    results_path = str(tmp_path / 'results')
+    store.write_query(results_path, RDIRS[0], '00', sample(5))
+    store.write_query(results_path, RDIRS[1], '00', sample(25))
+    return results_path
+
+def service(replay_):
+    return client.make_service('test', http=client.CountingHttp(
+        replay.ReplayHttp(replay_)))
+
+def test_make_page():
+    result = sample(25)
+    first = replay.make_page(result, 1, 10)
+    assert [ i['link'] for i in first['items'] ] == \
+           [ f'https://example.gov/{i}' for i in range(10) ]
+    assert first['queries']['nextPage'][0]['startIndex'] == 11
+
+    last = replay.make_page(result, 21, 10)
+    assert len(last['items']) == 5
+    assert 'nextPage' not in last['queries']
+    assert len(result['items']) == 25
+
+# Pages come from the latest run of the query's text, through the same
+# client the API is searched with.
+def test_serves_the_latest_run(tree):
+    replay_ = replay.Replay(tree)
+    cse = service(replay_).cse()
+    text = terms(sample(0))
+
+    page = cse.list(q=text, cx='cx', start=11).execute()
+    assert [ i['link'] for i in page['items'] ] == \
+           [ f'https://example.gov/{i}' for i in range(10, 20) ]
+    assert client.received() > 0
+
+    missed = cse.list(q='"Nowhere" "mobile ID"', cx='cx').execute()
+    assert 'items' not in missed
+    assert missed['searchInformation']['totalResults'] == '0'
+    assert replay_.counts == { 'requests': 2, 'hits': 1, 'misses': 1 }
+
+def test_derived_results_are_not_served(tree):
+    derived = dict(sample(5), derived={ 'query': '00', 'excluded': [] })
+    derived['queries']['request'][0]['searchTerms'] = 'derived'
+    store.write_query(tree, RDIRS[1], '01', derived)
+    assert 'derived' not in replay.Replay(tree).load()
+
+def test_quota_and_errors(tree):
+    cse = service(replay.Replay(tree, quota=1)).cse()
+    cse.list(q='x', cx='cx').execute()
+    with pytest.raises(HttpError) as raised:
+        cse.list(q='x', cx='cx').execute()
+    assert raised.value.resp.status == 429
+    assert b'rateLimitExceeded' in raised.value.content
+
+    replay_ = replay.Replay(tree, error_rate=1.0, seed=1)
+    with pytest.raises(HttpError) as raised:
+        service(replay_).cse().list(q='x', cx='cx').execute()
+    assert raised.value.resp.status in (500, 503)
+    assert replay_.counts['errors'] == 1
+
+def test_parse_latency():
+    assert replay.parse_latency('0') == (0.0, 0.0)
+    assert replay.parse_latency('0.1-0.3') == (0.1, 0.3)
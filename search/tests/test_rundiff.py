@@ -0,0 +1,60 @@
+import store
+import runindex
+import rundiff
+
+RUNS = [ 'Alabama_01-01-2025_09:00:00', 'Alabama_01-02-2025_09:00:00',
+         'Alabama_01-03-2025_09:00:00' ]
+
+def result(links):
+    return { 'items': [ { 'link': link } for link in links ] }
+
+# The first run searched 00 and 01, the second only 00 and the third 00
+# and 01 again.
+def make_tree(tmp_path):
+    results_path = str(tmp_path / 'results')
+    stored = { RUNS[0]: { '00': [ 'https://a.gov', 'https://b.gov' ],
+                          '01': [ 'https://c.gov' ] },
+               RUNS[1]: { '00': [ 'https://www.a.gov/', 'https://b.gov' ] },
+               RUNS[2]: { '00': [ 'https://b.gov', 'https://d.gov',
+                                  'https://a.gov' ],
+                          '01': [ 'https://c.gov' ] } }
+    for rdir, queries in stored.items():
+        for query, links in queries.items():
+            store.write_query(results_path, rdir, query, result(links))
+    return results_path
+
+def test_diff_links():
+    added, removed, moved = rundiff.diff_links(
+        [ 'a', 'b', 'c', 'a' ], [ 'b', 'd', 'a' ])
+    assert added == [ (2, 'd') ]
+    assert removed == [ (3, 'c') ]
+    assert moved == [ (1, 3, 'a'), (2, 1, 'b') ]
+
+def test_latest_pairs(tmp_path):
+    results_path = make_tree(tmp_path)
+    assert rundiff.latest_pairs(results_path, 'Alabama') == \
+           { (RUNS[1], RUNS[2]): [ '00' ], (RUNS[0], RUNS[2]): [ '01' ] }
+    assert rundiff.latest_pairs(results_path, 'Alabama', [ '01' ]) == \
+           { (RUNS[0], RUNS[2]): [ '01' ] }
+    assert rundiff.latest_pairs(results_path, 'Alaska') == {}
+
+def test_diff_runs(tmp_path):
+    results_path = make_tree(tmp_path)
+    # Spellings of the same page are equal once canonicalized.
+    assert rundiff.diff_runs(results_path, RUNS[0], RUNS[1]) == \
+           ({}, [ '01' ])
+
+    changes, unmatched = rundiff.diff_runs(results_path, RUNS[1], RUNS[2])
+    assert changes == { '00': ([ (2, 'https://d.gov') ], [],
+                               [ (1, 3, 'https://a.gov'),
+                                 (2, 1, 'https://b.gov') ]) }
+    assert unmatched == [ '01' ]
+
+    # The lists are kept in the run index after the first read.
+    assert set(runindex.get_links(results_path, RUNS[2])) == { '00', '01' }
+
+def test_previous_links(tmp_path):
+    results_path = make_tree(tmp_path)
+    assert rundiff.previous_links(results_path) == \
+           { 'Alabama': { '00': { 'https://a.gov', 'https://b.gov' },
+                          '01': { 'https://c.gov' } } }
@@ -0,0 +1,46 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+import store
+import runindex
+
+RDIR = 'Alabama_01-01-2025_09:00:00'
+
+def result(links):
+    return { 'queries': { 'request': [ { 'searchTerms': 'mobile ID' } ] },
+             'items': [ { 'link': link } for link in links ] }
+
+# A later process's first connection.
+def resync(results_path):
+    with sqlite3.connect(runindex.index_path(results_path)) as db:
+        runindex.sync(db, results_path)
+
+@pytest.mark.parametrize('layout', [ 'dirs', 'jsonl' ])
+def test_sync_sees_queries_added_to_a_run(tmp_path, monkeypatch, layout):
+    monkeypatch.setattr(store, 'RUN_STORAGE', layout)
+    results_path = str(tmp_path / 'results')
+    os.makedirs(results_path)
+    store.write_query(results_path, RDIR, '00', result([ 'https://a.gov' ]))
+    assert runindex.get_queries(results_path, RDIR) == [ '00' ]
+
+    # Written by another process: this one's connection never recorded it.
+    store.write_query(results_path, RDIR, '01', result([ 'https://b.gov' ]))
+    resync(results_path)
+    assert runindex.get_queries(results_path, RDIR) == [ '00', '01' ]
+    assert [ i['link'] for i in store.read_query(results_path, RDIR,
+                                                 '01')['items'] ] == \
+           [ 'https://b.gov' ]
+
+def test_sync_drops_removed_runs(tmp_path):
+    results_path = str(tmp_path / 'results')
+    other = 'Alaska_01-01-2025_09:00:00'
+    for rdir in (RDIR, other):
+        store.write_query(results_path, rdir, '00', result([]))
+    assert runindex.get_runs(results_path) == [ RDIR, other ]
+
+    shutil.rmtree(tmp_path / 'results' / other)
+    resync(results_path)
+    assert runindex.get_runs(results_path) == [ RDIR ]
@@ -0,0 +1,73 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import store
+import snapshots
+
+RDIR = 'Alabama_13-08-2025_15:22:08'
+PAGES = { '/page': ('text/html; charset=utf-8', b'<p>Mobile ID pilot</p>'),
+          '/doc.pdf': ('application/pdf', b'%PDF-1.4 Mobile ID pilot') }
+
+# Serves PAGES; /flaky answers 503 until the server is told it is up.
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/flaky':
+            status = 200 if self.server.up else 503
+            content_type, body = 'text/html', b'<p>Mobile ID app</p>'
+        elif self.path in PAGES:
+            status = 200
+            content_type, body = PAGES[self.path]
+        else:
+            status, content_type, body = 404, 'text/html', b'Not found'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.up = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def tree(tmp_path, server, monkeypatch):
+    monkeypatch.setattr(snapshots, 'SNAPSHOT_HOST_RATE', 0)
+    _, base = server
+    results_path = str(tmp_path / 'results')
+    items = [ { 'link': f'{base}{p}' } for p in ('/page', '/flaky', '/doc.pdf') ]
+    store.write_query(results_path, RDIR, '00', { 'items': items })
+    return results_path, str(tmp_path / 'snapshots')
+
+def test_failed_pages_are_retried(server, tree):
+    server, base = server
+    results_path, path = tree
+    counts = snapshots.fetch_runs(path, results_path, [ RDIR ])
+    assert counts == { 'pages': 3, 'fetched': 2, 'failed': 1 }
+    entry = snapshots.read_manifest(path, RDIR)[('00', f'{base}/flaky')]
+    assert entry['status'] == 503 and 'blob' not in entry
+
+    server.up = True
+    counts = snapshots.fetch_runs(path, results_path, [ RDIR ])
+    assert counts == { 'pages': 1, 'fetched': 1, 'failed': 0 }
+    entry = snapshots.read_manifest(path, RDIR)[('00', f'{base}/flaky')]
+    assert entry['status'] == 200 and entry['blob']
+
+def test_grep_skips_pages_that_are_not_text(server, tree):
+    _, base = server
+    results_path, path = tree
+    snapshots.fetch_runs(path, results_path, [ RDIR ])
+    skipped = set()
+    found = list(snapshots.grep(path, [ RDIR ], 'mobile id', skipped=skipped))
+    assert [ link for _, _, _, link, _ in found ] == [ f'{base}/page' ]
+    assert skipped == { f'{base}/doc.pdf' }
@@ -0,0 +1,50 @@
+import os
+import json
+
+import store
+import runindex
+
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                      'results', 'Alabama_13-08-2025_15:22:08', '00', '00.json')
+RDIR = 'Alabama_01-01-2025_09:00:00'
+
+def sample():
+    with open(SAMPLE, 'r') as file:
+        return json.load(file)
+
+def test_compact_expand_round_trip():
+    result = sample()
+    header = store.make_header(result)
+    record = store.compact(header, '00', result)
+    assert 'context' not in record
+    assert all('kind' not in item for item in record['items'])
+    assert store.expand(header, record) == result
+
+# Stored as directories, converted to a run file, read back unchanged.
+def test_convert_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'RUN_STORAGE', 'dirs')
+    results_path = str(tmp_path / 'results')
+    first = sample()
+    second = dict(sample(), items=first['items'][:3])
+    store.write_query(results_path, RDIR, '00', first)
+    store.write_query(results_path, RDIR, '01', second)
+    assert store.layout(results_path, RDIR) == 'dirs'
+
+    assert store.convert(results_path) == 1
+    assert store.layout(results_path, RDIR) == 'jsonl'
+    assert not os.path.exists(os.path.join(results_path, RDIR))
+    assert runindex.get_queries(results_path, RDIR) == [ '00', '01' ]
+    assert store.read_query(results_path, RDIR, '00') == first
+    assert store.read_query(results_path, RDIR, '01') == second
+
+    # Already converted: nothing left to do.
+    assert store.convert(results_path) == 0
+
+def test_convert_keeps_directories(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'RUN_STORAGE', 'dirs')
+    results_path = str(tmp_path / 'results')
+    store.write_query(results_path, RDIR, '00', sample())
+
+    assert store.convert(results_path, keep=True) == 1
+    assert os.path.isdir(os.path.join(results_path, RDIR + '.bak'))
+    assert store.read_query(results_path, RDIR, '00') == sample()
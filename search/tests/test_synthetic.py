@@ -0,0 +1,58 @@
+import os, sys
+import csv
+
+import store
+import runindex
+import rundiff
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'bench'))
+import synthetic
+
+# Three states, two runs of four queries with 12 results each.
+def generate(path, storage='dirs'):
+    return synthetic.generate(str(path), 3, 4, 2, 12, storage, seed=1)
+
+def test_tree_is_read_like_a_real_one(tmp_path):
+    assert generate(tmp_path) == 3 * 4 * 2
+    results_path = str(tmp_path / 'results')
+    runs = runindex.get_runs(results_path)
+    assert len(runs) == 6
+    assert sorted({ runindex.parse_rdir(r)[0] for r in runs }) == \
+           sorted(synthetic.state_names(3))
+
+    state = synthetic.state_names(3)[0]
+    old, new = runindex.get_runs(results_path, state)
+    assert runindex.get_queries(results_path, new) == [ '00', '01', '02',
+                                                        '03' ]
+    result = store.read_query(results_path, new, '00')
+    assert len(result['items']) == 12
+    assert state in result['queries']['request'][0]['searchTerms']
+
+    # Most links of a query carry over to its next run.
+    changes, _ = rundiff.diff_runs(results_path, old, new)
+    for added, removed, _ in changes.values():
+        assert len(added) == len(removed) < 12
+
+def test_storage_layouts_hold_the_same_results(tmp_path):
+    generate(tmp_path / 'dirs')
+    generate(tmp_path / 'jsonl', 'jsonl')
+    dirs, jsonl = str(tmp_path / 'dirs' / 'results'), \
+                  str(tmp_path / 'jsonl' / 'results')
+    runs = runindex.get_runs(dirs)
+    assert runindex.get_runs(jsonl) == runs
+    assert store.layout(jsonl, runs[0]) == 'jsonl'
+    for rdir in runs:
+        for query in runindex.get_queries(dirs, rdir):
+            assert store.read_query(jsonl, rdir, query) == \
+                   store.read_query(dirs, rdir, query)
+
+def test_sheets(tmp_path):
+    generate(tmp_path)
+    with open(tmp_path / 'csv_results_parsed.csv', 'r') as file:
+        rows = list(csv.reader(file))
+    assert rows[0][2::2] == synthetic.state_names(3)
+    assert [ r[0] for r in rows if r[0] ] == [ 'Q00', 'Q01', 'Q02', 'Q03' ]
+    with open(tmp_path / 'airtable_results.csv', 'r') as file:
+        assert [ r[0] for r in csv.reader(file) ][1:] == \
+               synthetic.state_names(3)
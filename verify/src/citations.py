@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+import re
+from collections import namedtuple
+
+import util  # noqa: F401 -- puts search/src on sys.path
+from links import canonical_url
+
+Citation = namedtuple('Citation', ('state', 'field', 'url', 'note'))
+
+# Full URLs, and bare domains under the suffixes the sheet cites (a bare
+# "e.g." or "Sec. 5" must not look like a domain).
+URL_RE = re.compile(r"""
+    https?://[^\s<>"'“”]+
+  | (?<![\w@./-])(?:[a-z0-9-]+\.)+(?:gov|com|org|net|edu|us|info|law|app)
+    (?:/[^\s<>"'“”]*)?(?![\w.-]*@)
+""", re.I | re.X)
+TRAILING = '.,;:!?)]}\'"”’'
+
+def urls(line):
+    found = []
+    for match in URL_RE.finditer(line):
+        url = match[0].rstrip(TRAILING)
+        if url.count('(') > url.count(')') and match[0][len(url):][:1] == ')':
+            url += ')'
+        found.append(url)
+    return found
+
+# (url, note) for each URL of a cell.  A URL's note is the rest of its line
+# and the lines after it up to the next line with a URL; lines before the
+# first URL belong to the first one.  URLs on one line share a note.
+def split_cell(text):
+    cited = []
+    lead = []
+    notes = None
+    for line in text.splitlines():
+        found = urls(line)
+        rest = ' '.join(URL_RE.sub(' ', line).split()) if found else line.strip()
+        if not rest.strip(TRAILING + '(-–— '): rest = ''
+        if not found:
+            if rest:
+                (notes if notes is not None else lead).append(rest)
+            continue
+        notes = lead + ([ rest ] if rest else [])
+        lead = []
+        cited.append((found, notes))
+
+    return [ (url, '\n'.join(notes) or None)
+             for found, notes in cited for url in found ]
+
+# Every URL cited in the given fields of every state, in one pass over the
+# states.  `states` is { state: { field: cell } } as combine.get_airtable
+# returns it.
+def extract(states, fields):
+    citations = []
+    for state, cells in states.items():
+        for field in fields:
+            text = cells.get(field)
+            if not text: continue
+            for url, note in split_cell(text):
+                citations.append(Citation(state, field, canonical_url(url),
+                                          note))
+    return citations
@@ -1,88 +1,82 @@
 #!/usr/bin/env python
-import os, time
+import time
 import json, csv
-import re
+from collections import namedtuple
 
-from util import get_most_recent_rdirs
+from reader import read_results
+import util  # noqa: F401 -- puts search/src on sys.path
+from links import canonical_url
+from citations import split_cell, extract
+from liveness import load_cache, annotate
 from constants import *
 
-import pprint
-
-def split_string(response) -> list():
-    split = response.splitlines()
-    parsed = {}
-    link_re = re.compile(r".*(http.*)")
-
-    link = None
-    val = ''
-    for i in range(len(split)):
-        match = link_re.match(split[i])
-        if match:
-            if link:
-                parsed[link] = val if val != '' else None
-                val = ''
-            link = match[1]
-        else:
-            val = "\n".join(filter(None, [val, split[i]]))
-    if val:
-        parsed[link] = val if val != '' else None
-
-    print(parsed)
+# { link: note } for the links cited in a cell; see citations.split_cell.
+def split_string(response) -> dict():
+    return { link: note for link, note in split_cell(response) }
 
 def get_queries_from_search() -> dict():
     states = dict()
-    rdirs = get_most_recent_rdirs(SEARCH_RESULTS_PATH)
-    for rdir in rdirs:
-        state = rdir[:rdir.find('_')]
-        rdir = os.path.join(SEARCH_RESULTS_PATH, rdir)
-
-        queries = dict()
-        for query_dir in os.listdir(rdir):
-            query_json = os.path.join(rdir, query_dir, f'{query_dir}.json')
-            if not os.path.exists(query_json): continue
+    for record in read_results(SEARCH_RESULTS_PATH, dataset=SEARCH_DATASET):
+        queries = states.setdefault(record.state, dict())
+        queries.setdefault(int(record.query), []).append(record.link)
+    return states
 
-            with open(query_json, 'r') as file:
-                query_results = json.load(file)
-            if 'items' not in query_results: continue
+# Each question block starts with a "Qnn" marker in the first column; the
+# second column numbers the link rows (1, 2, ...), then has an "O" row for a
+# link the reviewer added and an "N" row for notes.  Every state has a name
+# column followed by its "TRUE" checkbox column.  Blocks may have any number
+# of rows and the sheet any number of states.
+def read_sheet(path):
+    with open(path, 'r') as file:
+        grid = list(csv.reader(file))
+    width = max(map(len, grid), default=0)
+    columns = list(zip(*(row + [''] * (width - len(row)) for row in grid)))
+    header = columns and [ column[0] for column in columns ]
+
+    states = { header[i]: i for i in range(2, width - 1)
+               if header[i] not in ('', 'TRUE') and header[i + 1] == 'TRUE' }
+    starts = [ (r, int(m[1:])) for r, m in enumerate(columns[0])
+               if m.startswith('Q') and m[1:].isdigit() ] if columns else []
+    blocks = [ (question, start, end) for (start, question), (end, _)
+               in zip(starts, starts[1:] + [ (len(grid), None) ]) ]
+    return columns, states, blocks
+
+# The sheet is read once and sliced by column: per state, each block is a
+# slice of its link and checkbox columns, and only checked rows are visited.
+# With `dedupe`, a page kept twice for the same question (e.g. as a result
+# and again as the reviewer's own link) is only kept once.
+def get_parsed(queries, dedupe=False) -> dict():
+    columns, state_columns, blocks = read_sheet(SEARCH_RESULTS_PARSED)
+    markers = columns[1] if columns else ()
 
+    states = dict()
+    for state in sorted(state_columns):
+        values = columns[state_columns[state]]
+        checked = columns[state_columns[state] + 1]
+        states[state] = dict()
+        for question, start, end in blocks:
             links = []
-            for website in query_results['items']:
-                links.append(website['link'])
-                
-            queries[int(query_dir)] = links
-        states[state] = queries
-    return states
-
-def get_parsed(queries) -> dict():
-    with open(SEARCH_RESULTS_PARSED, 'r') as file:
-        reader = csv.reader(file)
-        header = next(reader)
-        header = list(set(header[2:]))
-        header.remove('TRUE')
-        header.sort()
-
-        states = { state : 
-                  { i : {'links' : [], 'notes' : None } for i in range(16) }
-                  for state in header }
-        states_index_map = { header.index(s) : s for s in header }
-
-        for question in range(16):
-            for link in range(11):
-                link_row = next(reader)[2:]
-                for i in range(0, len(link_row), 2):
-                    if link_row[i+1] == 'TRUE':
-                        state = states_index_map[i//2]
-                        if link != 10:
-                            states[state][question]['links'].append(queries[state][question][link])
-                        else:
-                            states[state][question]['links'].append(link_row[i])
-
-            notes = next(reader)[2:]
-            for i in range(0, len(notes), 2):
-                if notes[i] != '':
-                    states[states_index_map[i//2]][question]['notes'] = notes[i]
-
-            if question != 15: next(reader)
+            seen = set()
+            notes = None
+            for marker, value, flag in zip(markers[start:end],
+                                           values[start:end],
+                                           checked[start:end]):
+                if marker == 'N':
+                    notes = value or notes
+                    continue
+                if flag != 'TRUE': continue
+                if marker == 'O':
+                    link = value
+                elif marker.isdigit():
+                    link = queries[state][question][int(marker) - 1]
+                else:
+                    continue
+                if dedupe:
+                    url = canonical_url(link)
+                    if url in seen: continue
+                    seen.add(url)
+                links.append(link)
+            states[state][question] = { 'links': links, 'notes': notes }
 
     return states
 
@@ -108,8 +102,15 @@ def get_airtable() -> dict():
 
     return states
 
+# With LIVENESS_CACHE set, each question also gets { link: liveness } for
+# the links the checker has seen (see liveness.py).
 def dump_search_results():
-    results = get_parsed(get_queries_from_search())
+    results = get_parsed(get_queries_from_search(), bool(COLLAPSE_DUPLICATES))
+    if LIVENESS_CACHE:
+        entries = load_cache(LIVENESS_CACHE)
+        for questions in results.values():
+            for question in questions.values():
+                question['liveness'] = annotate(question['links'], entries)
     with open(SEARCH_RESULTS_JSON, 'w') as file:
         json.dump(results, file, indent=1)
 
@@ -118,7 +119,45 @@ def dump_airtable_results():
     with open(AIRTABLE_RESULTS_JSON, 'w') as file:
         json.dump(results, file, indent=1)
 
-def map_to_questions():
+# One step per Airtable subcategory: where its value, source and "other"
+# cells are, and which questions (search queries) give evidence for it.
+Step = namedtuple('Step', ('category', 'subcategory', 'value', 'source',
+                           'other', 'questions'))
+
+def compile_plan(airtable_map, queries_map) -> list():
+    plan = []
+    for category, subcategories in airtable_map.items():
+        for subcategory, columns in subcategories.items():
+            columns = columns or {}
+            questions = queries_map.get(category, {}).get(subcategory) or []
+            plan.append(Step(category, subcategory, subcategory,
+                             columns.get('Source'), columns.get('Other'),
+                             tuple(str(q) for q in questions)))
+    return plan
+
+def apply_step(step, state_dict, search_dict) -> dict():
+    record = dict()
+    if state_dict is not None:
+        value = state_dict.get(step.value, '')
+        if value != '':
+            record['value'] = True if value == 'checked' else value
+        if step.source and state_dict.get(step.source, '') != '':
+            record['AirtableSource'] = state_dict[step.source]
+        if step.other and state_dict.get(step.other, '') != '':
+            record['AirtableOther'] = state_dict[step.other]
+    if step.questions:
+        record['questions'] = list(step.questions)
+        record['search'] = { q: search_dict[q] for q in step.questions
+                             if q in search_dict }
+    return record
+
+# Applies the compiled plan to every state in the Airtable export or the
+# search results (duplicates in Airtable included) in one pass.  Returns
+# { state: { category: { subcategory: record } } } and fills `timings` with
+# the seconds each stage took.
+def map_to_questions(timings=None) -> dict():
+    timings = timings if timings is not None else dict()
+    start = time.perf_counter()
     with open(AIRTABLE_TO_QUESTIONS, 'r') as file:
         airtable_map = json.load(file)
     with open(QUERIES_TO_QUESTIONS, 'r') as file:
@@ -127,60 +166,57 @@ def map_to_questions():
         search_results_json = json.load(file)
     with open(AIRTABLE_RESULTS_JSON, 'r') as file:
         airtable_results_json = json.load(file)
+    timings['load'] = time.perf_counter() - start
 
-    states = dict()
+    start = time.perf_counter()
+    plan = compile_plan(airtable_map, queries_map)
+    timings['compile'] = time.perf_counter() - start
 
-    # accounts for missing states in either list & duplicates in Airtable
-    states_list = search_results_json.keys() | airtable_results_json.keys()
-
-    for state in states_list:
-        states[state] = dict()
+    start = time.perf_counter()
+    states = dict()
+    for state in sorted(search_results_json.keys() | airtable_results_json.keys()):
         state_dict = airtable_results_json.get(state)
-        if state_dict is None: continue
-        for category in airtable_map:
-            states[state][category] = dict()
-            for subcategory in airtable_map[category]:
-                states[state][category][subcategory] = dict()
-                state_result_dict = states[state][category][subcategory] 
-                
-                if state_dict[subcategory] != '':
-                    if state_dict[subcategory] == 'checked':
-                        state_result_dict["value"] = True
-                    else:
-                        state_result_dict["value"] = state_dict[subcategory]
-
-                if airtable_map[category][subcategory] is None: continue
-
-                if ("Source" in airtable_map[category][subcategory] and 
-                    state_dict[airtable_map[category][subcategory]["Source"]] != ""):
-                    state_result_dict["AirtableSource"] = state_dict[airtable_map[category][subcategory]["Source"]]
-                    print(category, subcategory)
-                    split_string(state_result_dict["AirtableSource"])
-
-                if ("Other" in airtable_map[category][subcategory]
-                    and state_dict[airtable_map[category][subcategory]["Other"]] != ""):
-                    state_result_dict["AirtableOther"] = state_dict[airtable_map[category][subcategory]["Other"]]
-#                    if state_result_dict["AirtableOther"] == "":
-#                        del state_result_dict["Airtable_source"] 
-
-
-#                for val in airtable_map[category][subcategory]:
-#                    #                    if state_dict[airtable_map[category][subcategory][val]]
-#
-#                    state_result_dict[val] = state_dict[airtable_map[category][subcategory][val]]
-
-#        for val in states[state]:
-#            print(f'{val} - {states[state][val]}')
-#        print(states[state])
-#        pprint.pp(states[state], width=180)
-
+        search_dict = search_results_json.get(state, {})
+        states[state] = mapped = dict()
+        for step in plan:
+            mapped.setdefault(step.category, dict())[step.subcategory] = \
+                apply_step(step, state_dict, search_dict)
+    timings['apply'] = time.perf_counter() - start
+    return states
 
-#    print(queries_map)
+# { states, timings }.  The states, all but a few bytes of the file, are
+# written first, so the timings written after them include the write.
+def dump_mapped_results():
+    timings = dict()
+    results = map_to_questions(timings)
+    start = time.perf_counter()
+    with open(RESULTS, 'w') as file:
+        file.write('{"states": ')
+        json.dump(results, file, indent=1)
+        timings['write'] = time.perf_counter() - start
+        file.write(', "timings": ')
+        json.dump(timings, file, indent=1)
+        file.write('}\n')
+    return timings
 
 
+# Every source and "other" column the question map names, for all states.
+def extract_citations() -> list():
+    with open(AIRTABLE_TO_QUESTIONS, 'r') as file:
+        plan = compile_plan(json.load(file), {})
+    fields = list(dict.fromkeys(f for step in plan
+                                for f in (step.source, step.other) if f))
+    return extract(get_airtable(), fields)
 
-#    return airtable_map
+# JSON lines of { state, field, url, note } with canonical URLs.
+def dump_citations():
+    citations = extract_citations()
+    with open(CITATIONS, 'w') as file:
+        for citation in citations:
+            file.write(json.dumps(citation._asdict()) + '\n')
+    return citations
 
 
 # dump_airtable_results()
-# map_to_questions()
+# dump_mapped_results()
+# dump_citations()
@@ -3,6 +3,8 @@ import os
 
 SEARCH_RESULTS_PATH = os.getenv('SEARCH_RESULTS_PATH')
 SEARCH_RESULTS_PARSED = os.getenv('SEARCH_RESULTS_PARSED')
+SEARCH_DATASET = os.getenv('SEARCH_DATASET')
+COLLAPSE_DUPLICATES = os.getenv('COLLAPSE_DUPLICATES')
 
 AIRTABLE_RESULTS = os.getenv('AIRTABLE_RESULTS')
 AIRTABLE_TO_JSON = os.getenv('AIRTABLE_TO_JSON')
@@ -13,5 +15,8 @@ QUERIES_TO_QUESTIONS = os.getenv('QUERIES_TO_QUESTIONS')
 SEARCH_RESULTS_JSON = os.getenv("SEARCH_RESULTS_JSON")
 AIRTABLE_RESULTS_JSON = os.getenv("AIRTABLE_RESULTS_JSON")
 RESULTS = os.getenv('RESULTS')
+CITATIONS = os.getenv('CITATIONS')
+VERIFICATION = os.getenv('VERIFICATION')
+LIVENESS_CACHE = os.getenv('LIVENESS_CACHE')
 
 
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+import os, sys
+import csv
+import argparse
+from collections import namedtuple
+from itertools import groupby
+
+from reader import read_results, make_executor
+import util  # noqa: F401 -- puts search/src on sys.path
+from links import canonical_url, load_index, canonical_links
+from rundiff import previous_links
+from runindex import get_most_recent, get_queries
+from dataset import iter_dataset
+from liveness import load_cache, verdict, label, ALIVE
+
+SEARCH_RESULTS_PATH = os.getenv('SEARCH_RESULTS_PATH')
+SEARCH_DATASET = os.getenv('SEARCH_DATASET')
+CSV_RESULTS = os.getenv('CSV_RESULTS')
+COLLAPSE_DUPLICATES = os.getenv('COLLAPSE_DUPLICATES')
+LIVENESS_CACHE = os.getenv('LIVENESS_CACHE')
+# The link index "main.py links" writes, beside the results directory.
+LINK_INDEX = (os.getenv('LINK_INDEX') or SEARCH_RESULTS_PATH and
+              os.path.join(os.path.dirname(os.path.normpath(SEARCH_RESULTS_PATH)),
+                           'links.json'))
+HYPERLINK_FORMAT = '=HYPERLINK("{0}", "{1}")'
+DUPLICATE_FORMAT = 'see Q{0} #{1}'
+
+# 'query' writes a block of rows per query with a column per state (the
+# layout reviewers fill in); 'state' writes a block per state with a column
+# per query.
+LAYOUTS = ('query', 'state')
+
+Link = namedtuple('Link', ('url', 'title'))
+
+# --------------------------------- SOURCE ------------------------------------
+# The runs to export (the most recent one of each state) and the queries
+# each of them searched, without reading any results.
+def plan(results_path, dataset=None):
+    if not dataset:
+        rdirs = get_most_recent(results_path)
+        return { rdir: set(get_queries(results_path, rdir)) for rdir in rdirs }
+
+    latest = dict()
+    queries = dict()
+    for row in iter_dataset(dataset):
+        if row['time'] > latest.get(row['state'], ('', None))[0]:
+            latest[row['state']] = (row['time'], row['run'])
+        queries.setdefault(row['run'], set()).add(row['query'])
+    return { run: queries[run] for _, run in sorted(latest.values(),
+                                                    key=lambda e: e[1]) }
+
+def state_of(rdir):
+    return rdir[:rdir.find('_')]
+
+# { (state, query, rank): canonical URL } for the runs to export, from the
+# link index if there is one.  Links it does not cover (e.g. runs searched
+# after it was built) are canonicalized as they are read.
+def index_links(path, runs):
+    if not path or not os.path.exists(path): return dict()
+    return { (state_of(run), query, rank): url for (run, query, rank), url
+             in canonical_links(load_index(path), runs).items() }
+# -----------------------------------------------------------------------------
+
+
+# ---------------------------------- CELLS ------------------------------------
+# Turns each state's records into cells, in query then rank order.  A page a
+# state already showed under an earlier query (or rank) becomes a plain
+# reference to that first cell when collapsing duplicates, and pages the
+# previous search of the query already showed are left blank with
+# changed_only.  Cells keep their rank's row either way.  Given a liveness
+# cache, links that did not check out alive have it in front of their title.
+# Canonical URLs come from `canonical` (see index_links) where it has them.
+class Cells:
+    def __init__(self, collapse=False, previous=None, liveness=None,
+                 canonical=None):
+        self.collapse = collapse
+        self.previous = previous or dict()
+        self.liveness = liveness or dict()
+        self.canonical = canonical or dict()
+        self.seen = dict()
+        self.duplicates = 0
+        self.unchanged = 0
+        self.flagged = 0
+
+    # Links are only canonicalized for the options that compare them.
+    def __call__(self, records):
+        if not (self.collapse or self.previous or self.liveness):
+            return [ Link(record.link, record.title) for record in records ]
+        cells = []
+        for record in records:
+            url = (self.canonical.get((record.state, record.query, record.rank))
+                   or canonical_url(record.link))
+            seen = self.seen.setdefault(record.state, dict())
+            if url in self.previous.get(record.state, {}).get(record.query, ()):
+                cells.append('')
+                self.unchanged += 1
+            elif self.collapse and url in seen:
+                cells.append(DUPLICATE_FORMAT.format(*seen[url]))
+                self.duplicates += 1
+            else:
+                seen.setdefault(url, (record.query, record.rank))
+                title = record.title
+                entry = self.liveness.get(url)
+                if entry and verdict(entry) != ALIVE:
+                    title = f'[{label(entry)}] {title}'
+                    self.flagged += 1
+                cells.append(Link(record.link, title))
+        return cells
+# -----------------------------------------------------------------------------
+
+
+# ---------------------------------- ROWS -------------------------------------
+# Each block is as deep as its longest result list and ends with a blank row.
+# Columns alternate between results and an empty column for the reviewer's
+# checkbox, and the first column names the block.
+def block_rows(label, columns):
+    depth = max(map(len, columns), default=0)
+    for i in range(depth):
+        row = [ '' ] * (2 * len(columns))
+        for j, cells in enumerate(columns):
+            if i < len(cells):
+                row[2 * j + 1] = cells[i]
+        if i == 0:
+            row[0] = label
+        yield row
+    yield []
+
+def header_row(labels):
+    row = [ '' ] * (2 * len(labels))
+    row[1::2] = labels
+    return row
+
+# One pass per query, each reading only that query from every run, so a
+# block is the most held in memory at once.  Every pass reads on the same
+# pool.
+def query_major(results_path, runs, cells, dataset=None):
+    states = sorted(state_of(rdir) for rdir in runs)
+    yield header_row(states)
+    with make_executor() as executor:
+        for query in sorted(set().union(*runs.values())):
+            records = read_results(results_path, runs, [ query ],
+                                   dataset=dataset, executor=executor)
+            by_state = { state: cells(list(group)) for state, group
+                         in groupby(records, key=lambda r: r.state) }
+            yield from block_rows(f'Q{query}', [ by_state.get(state, [])
+                                                for state in states ])
+
+# Records come run by run, so each state's block is written as soon as its
+# run has been read.
+def state_major(results_path, runs, cells, dataset=None):
+    queries = sorted(set().union(*runs.values()))
+    yield header_row([ f'Q{int(query)}' for query in queries ])
+    records = read_results(results_path, runs, dataset=dataset)
+    for state, group in groupby(records, key=lambda r: r.state):
+        by_query = { query: cells(list(results)) for query, results
+                     in groupby(group, key=lambda r: r.query) }
+        yield from block_rows(state, [ by_query.get(query, [])
+                                       for query in queries ])
+
+def rows(results_path, layout='query', collapse=False, changed_only=False,
+         dataset=None, liveness=None, link_index=None):
+    if layout not in LAYOUTS:
+        raise Exception(f'Layout must be one of: {", ".join(LAYOUTS)}.')
+    previous = previous_links(results_path) if changed_only else None
+    runs = plan(results_path, dataset)
+    cells = Cells(collapse, previous, load_cache(liveness),
+                  index_links(link_index, runs))
+    generate = query_major if layout == 'query' else state_major
+    return cells, generate(results_path, runs, cells, dataset)
+# -----------------------------------------------------------------------------
+
+
+# --------------------------------- WRITERS -----------------------------------
+def write_csv(path, rows):
+    with open(path, 'w') as file:
+        writer = csv.writer(file)
+        for row in rows:
+            writer.writerow([ HYPERLINK_FORMAT.format(c.url,
+                                                      c.title.replace('"', ''))
+                              if isinstance(c, Link) else c for c in row ])
+
+# Write-only workbooks stream rows to disk; links become native hyperlinks.
+def write_xlsx(path, rows):
+    try:
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+    except ImportError:
+        raise Exception('Writing .xlsx needs openpyxl (pip install openpyxl).')
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Results')
+    font = Font(color='0563C1', underline='single')
+    for row in rows:
+        cells = []
+        for c in row:
+            if isinstance(c, Link):
+                cell = WriteOnlyCell(sheet, value=c.title or c.url)
+                cell.hyperlink = c.url
+                cell.font = font
+                c = cell
+            cells.append(c)
+        sheet.append(cells)
+    workbook.save(path)
+
+WRITERS = { '.csv': write_csv, '.xlsx': write_xlsx }
+# -----------------------------------------------------------------------------
+
+
+# ----------------------------------- CLI -------------------------------------
+def main(args):
+    parser = argparse.ArgumentParser(
+        description='Export the most recent results of each state for review.')
+    parser.add_argument('-o', '--output', default=CSV_RESULTS,
+                        help='.csv or .xlsx file to write (default CSV_RESULTS).')
+    parser.add_argument('--layout', choices=LAYOUTS, default='query',
+                        help=('a block per query with a column per state '
+                              '(default), or a block per state with a column '
+                              'per query.'))
+    parser.add_argument('--collapse-duplicates', action='store_true',
+                        default=bool(COLLAPSE_DUPLICATES),
+                        help=('write a page a state already showed as a '
+                              'reference to its first cell.'))
+    parser.add_argument('--changed-only', action='store_true',
+                        help=('leave out links the previous search of the same '
+                              'query already returned.'))
+    parser.add_argument('--dataset', default=SEARCH_DATASET,
+                        help=('read results from a dataset written by '
+                              '"main.py process" (default SEARCH_DATASET).'))
+    parser.add_argument('--liveness', default=LIVENESS_CACHE,
+                        help=('mark links a liveness cache did not find alive '
+                              '(default LIVENESS_CACHE).'))
+    parser.add_argument('--links', default=LINK_INDEX,
+                        help=('link index written by "main.py links" to take '
+                              'canonical URLs from (default LINK_INDEX, or '
+                              'links.json beside the results).'))
+    parsed = parser.parse_args(args)
+
+    if not parsed.output:
+        parser.error('no output file; set CSV_RESULTS or pass --output.')
+    extension = os.path.splitext(parsed.output)[1].lower()
+    if extension not in WRITERS:
+        parser.error(f'cannot write {extension or "files without an extension"}; '
+                     f'use {" or ".join(WRITERS)}.')
+
+    cells, generated = rows(SEARCH_RESULTS_PATH, parsed.layout,
+                            parsed.collapse_duplicates, parsed.changed_only,
+                            parsed.dataset, parsed.liveness, parsed.links)
+    WRITERS[extension](parsed.output, generated)
+
+    if parsed.collapse_duplicates:
+        print(f'{cells.duplicates} duplicate links collapsed.')
+    if parsed.changed_only:
+        print(f'{cells.unchanged} links left out as unchanged.')
+    if parsed.liveness:
+        print(f'{cells.flagged} links marked as not alive.')
+    print(f'Wrote {parsed.output}.')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
+# -----------------------------------------------------------------------------
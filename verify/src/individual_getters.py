@@ -1,30 +1,119 @@
 #!/usr/bin/env python
 import json
+import time
+from collections import namedtuple, Counter
 
 from constants import *
 
-def get_has_digital():
+BOTH, AIRTABLE, SEARCH, NEITHER = 'Both', 'Airtable', 'Search', 'Neither'
+
+# A check of one Airtable field against the links reviewers kept for the
+# queries that should turn it up.  Airtable supports the rule when the field
+# has a value not in `absent` and, if `expected` is given, one of its
+# (comma-separated) values is expected.  `queries` are filled in from the
+# question map (see with_queries()).
+Rule = namedtuple('Rule', ('name', 'field', 'expected', 'absent', 'queries'),
+                  defaults=(None, ('',), ()))
+
+RULES = (
+    Rule('Digital offering', 'Digital?', absent=('', 'No Digital Offering')),
+    Rule('In-house app',
+         'What is the commercial vendor partner for the in-house app?',
+         absent=('', 'TBD')),
+    Rule('Wallet apps',
+         'What is (are) the commercial vendor partner(s) for wallet apps?'),
+    Rule('Commercial vendor',
+         'Is the issuing agency partnering with a commercial vendor to design '
+         'and distribute the mobile ID?', expected=('checked',)),
+    Rule('Mobile API', 'Is there a mobile API?', expected=('checked',)),
+    Rule('Digital ID privacy policy', 'Privacy policies for digital IDs?'),
+    Rule('Selective disclosure', 'Selective Disclosure?',
+         expected=('checked',)),
+    Rule('ID-specific retention law', 'Retention?',
+         expected=('ID-specific legislation',)),
+    Rule('ID-specific consent law', 'Consent?',
+         expected=('ID-specific legislation',)),
+)
+
+# The rules with the queries QUERIES_TO_QUESTIONS ties to each one's field
+# (an Airtable subcategory, under whichever category holds it).
+def with_queries(rules, queries_map):
+    by_field = dict()
+    for subcategories in queries_map.values():
+        for field, queries in subcategories.items():
+            by_field.setdefault(field, []).extend(str(q) for q in queries or [])
+    return tuple(rule._replace(queries=tuple(dict.fromkeys(
+                     by_field.get(rule.field, [])))) for rule in rules)
+
+def load_rules(rules=RULES):
+    with open(QUERIES_TO_QUESTIONS, 'r') as file:
+        return with_queries(rules, json.load(file))
+
+def load():
     with open(AIRTABLE_RESULTS_JSON, 'r') as file:
         airtable_results = json.load(file)
-
     with open(SEARCH_RESULTS_JSON, 'r') as file:
         search_results = json.load(file)
+    return airtable_results, search_results
+
+def airtable_supports(rule, record):
+    value = record.get(rule.field, '') if record else ''
+    if value in rule.absent: return False
+    if rule.expected is None: return True
+    return any(v.strip() in rule.expected for v in value.split(','))
+
+def search_links(rule, results):
+    return [ link for query in rule.queries
+             for link in results.get(query, {}).get('links', []) ]
+
+def classify(airtable, links):
+    if airtable and links: return BOTH
+    if airtable: return AIRTABLE
+    if links: return SEARCH
+    return NEITHER
 
+# Evaluates every rule for every state (duplicate Airtable rows aside) in a
+# single pass over data loaded once.  Returns { rule name: { state: {...} } }
+# and fills `timings` with the seconds spent on each rule.
+def evaluate(rules, airtable_results, search_results, timings=None):
+    timings = timings if timings is not None else dict()
     states = airtable_results.keys() | search_results.keys()
-    states = { s for s in states if '_' not in s }
+    states = sorted(s for s in states if '_' not in s)
 
-    for state in sorted(states):
-        airtable_digital = airtable_results.get(state, dict()).get('Digital?', 'No Digital Offering') != 'No Digital Offering'
-        search_digital = search_results[state]['0']['links'] +  search_results[state]['7']['links']
-        
-        if airtable_digital and search_digital:
-            print(f'{state} (Both) - {airtable_results[state]['Digital?']}; {search_digital}')
-        elif airtable_digital and not search_digital:
-            print(f'{state} (Airtable) - {airtable_results[state]['Digital?']}')
-        elif search_digital:
-            print(f'{state} (Search) - {search_digital}')
+    verdicts = { rule.name: dict() for rule in rules }
+    spent = Counter()
+    for state in states:
+        record = airtable_results.get(state)
+        results = search_results.get(state, {})
+        for rule in rules:
+            start = time.perf_counter()
+            airtable = airtable_supports(rule, record)
+            links = search_links(rule, results)
+            verdicts[rule.name][state] = {
+                'class': classify(airtable, links),
+                'airtable': record.get(rule.field) if record else None,
+                'links': links }
+            spent[rule.name] += time.perf_counter() - start
+    timings.update(spent)
+    return verdicts
 
-def get_app():
+def verify(rules=None):
+    rules = rules or load_rules()
+    timings = dict()
+    verdicts = evaluate(rules, *load(), timings)
+    for rule in rules:
+        counts = Counter(v['class'] for v in verdicts[rule.name].values())
+        print(f'{rule.name}: ' +
+              ', '.join(f'{c} {counts[c]}' for c in (BOTH, AIRTABLE, SEARCH,
+                                                   NEITHER)) +
+              f' ({timings[rule.name] * 1000:.2f} ms)')
 
+    if VERIFICATION:
+        with open(VERIFICATION, 'w') as file:
+            json.dump({ 'rules': [ rule._asdict() for rule in rules ],
+                        'verdicts': verdicts, 'timings': timings },
+                      file, indent=1)
+    return verdicts
 
-get_has_digital()
+if __name__ == '__main__':
+    verify()
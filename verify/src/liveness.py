@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+import os, sys
+import json
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError, URLError
+
+from reader import read_results
+import util  # noqa: F401 -- puts search/src on sys.path
+from links import canonical_url
+from runindex import get_runs
+from cache import parse_age
+
+SEARCH_RESULTS_PATH = os.getenv('SEARCH_RESULTS_PATH')
+LIVENESS_CACHE = os.getenv('LIVENESS_CACHE')
+LIVENESS_WORKERS = int(os.getenv('LIVENESS_WORKERS') or 32)
+LIVENESS_PER_HOST = int(os.getenv('LIVENESS_PER_HOST') or 2)
+LIVENESS_HOST_DELAY = float(os.getenv('LIVENESS_HOST_DELAY') or 0.5)
+LIVENESS_TIMEOUT = float(os.getenv('LIVENESS_TIMEOUT') or 15)
+LIVENESS_TTL = parse_age(os.getenv('LIVENESS_TTL') or '7d')
+USER_AGENT = 'Mozilla/5.0 (compatible; id-database-verification link check)'
+
+ALIVE, DEAD, UNKNOWN = 'alive', 'dead', 'unknown'
+# Servers that refuse HEAD answer one of these; they are asked again by GET.
+NO_HEAD = (400, 403, 405, 501)
+
+# ---------------------------------- CACHE ------------------------------------
+# { canonical url: { url, status, final, etag, last_modified, error, checked } }
+def load_cache(path):
+    if not path or not os.path.exists(path): return dict()
+    with open(path, 'r') as file:
+        return json.load(file)
+
+def save_cache(path, entries):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(entries, file, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+# Missing pages are dead; anything else that failed (bot walls, timeouts,
+# server errors) may well be fine in a browser.
+def verdict(entry):
+    if entry is None: return None
+    status = entry.get('status')
+    if status and 200 <= status < 400: return ALIVE
+    if status in (404, 410) or entry.get('error') == 'no such host': return DEAD
+    return UNKNOWN
+
+def label(entry):
+    if entry is None: return None
+    if entry.get('status'):
+        text = f'{verdict(entry)} ({entry["status"]})'
+    else:
+        text = f'{verdict(entry)} ({entry.get("error")})'
+    if entry.get('final') and entry['final'] != entry.get('url'):
+        text += f' -> {entry["final"]}'
+    return text
+
+# { link: label } for the links a cache has checked.
+def annotate(links, entries):
+    return { link: label(entries.get(canonical_url(link))) for link in links
+             if canonical_url(link) in entries }
+# -----------------------------------------------------------------------------
+
+
+# ---------------------------------- CHECK ------------------------------------
+# A validator from an earlier check makes the request conditional; a 304
+# keeps what that check found.
+def fetch(url, entry, method):
+    headers = { 'User-Agent': USER_AGENT }
+    if entry and entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry and entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    request = Request(url, headers=headers, method=method)
+    try:
+        with urlopen(request, timeout=LIVENESS_TIMEOUT) as response:
+            return { 'status': response.status, 'final': response.geturl(),
+                     'etag': response.headers.get('ETag'),
+                     'last_modified': response.headers.get('Last-Modified') }
+    except HTTPError as e:
+        return { 'status': e.code, 'final': e.geturl(),
+                 'etag': e.headers.get('ETag'),
+                 'last_modified': e.headers.get('Last-Modified') }
+    except URLError as e:
+        reason = getattr(e.reason, 'strerror', None) or str(e.reason)
+        if 'Name or service not known' in reason or 'nodename nor servname' in reason:
+            reason = 'no such host'
+        return { 'status': None, 'error': reason }
+    except (OSError, ValueError) as e:
+        return { 'status': None, 'error': str(e) or type(e).__name__ }
+
+def check(url, entry):
+    result = fetch(url, entry, 'HEAD')
+    if result['status'] in NO_HEAD:
+        result = fetch(url, entry, 'GET')
+    if result['status'] == 304 and entry:
+        result = dict(entry)
+    result['url'] = url
+    result['checked'] = time.time()
+    return result
+
+# At most `per_host` requests to one host at a time, started at least
+# `delay` seconds apart, under a global cap of `workers`.  Checks block, so
+# they run on a pool of `workers` threads of their own (the loop's default
+# pool has at most 32).
+class Host:
+    def __init__(self, per_host):
+        self.semaphore = asyncio.Semaphore(per_host)
+        self.next_start = 0
+
+    async def turn(self, delay):
+        loop = asyncio.get_running_loop()
+        while loop.time() < self.next_start:
+            await asyncio.sleep(self.next_start - loop.time())
+        self.next_start = loop.time() + delay
+
+async def check_all(urls, entries, workers, per_host, delay):
+    loop = asyncio.get_running_loop()
+    limit = asyncio.Semaphore(workers)
+    hosts = dict()
+
+    async def one(key, url):
+        host = hosts.setdefault(urlsplit(url).hostname, Host(per_host))
+        async with host.semaphore:
+            await host.turn(delay)
+            async with limit:
+                entries[key] = await loop.run_in_executor(executor, check, url,
+                                                          entries.get(key))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        await asyncio.gather(*(one(key, url) for key, url in urls.items()))
+
+# Checks the links (by canonical URL) that the cache has not seen within
+# max_age, and returns how many it checked.
+def update(links, entries, max_age=LIVENESS_TTL, workers=LIVENESS_WORKERS,
+           per_host=LIVENESS_PER_HOST, delay=LIVENESS_HOST_DELAY):
+    now = time.time()
+    urls = dict()
+    for link in links:
+        key = canonical_url(link)
+        if key in urls: continue
+        entry = entries.get(key)
+        if entry and now - entry.get('checked', 0) < max_age: continue
+        urls[key] = link
+    if urls:
+        asyncio.run(check_all(urls, entries, workers, per_host, delay))
+    return len(urls)
+# -----------------------------------------------------------------------------
+
+
+# --------------------------------- SOURCES -----------------------------------
+def search_links(results_path):
+    return [ record.link for record in read_results(results_path,
+                                                    get_runs(results_path)) ]
+
+def airtable_links():
+    import combine
+    return [ c.url for c in combine.extract_citations() ]
+# -----------------------------------------------------------------------------
+
+
+# ----------------------------------- CLI -------------------------------------
+def main(args):
+    parser = argparse.ArgumentParser(
+        description='Check which result and Airtable links still resolve.')
+    parser.add_argument('urls', nargs='*',
+                        help=('links to check (default every link of the '
+                              'results tree and the Airtable sources).'))
+    parser.add_argument('--cache', default=LIVENESS_CACHE,
+                        help='cache file (default LIVENESS_CACHE).')
+    parser.add_argument('--max-age', type=parse_age, default=LIVENESS_TTL,
+                        help=('re-check links checked longer ago than this '
+                              '(seconds, or with a s/m/h/d suffix).'))
+    parser.add_argument('-w', '--workers', type=int, default=LIVENESS_WORKERS,
+                        help='requests in flight at once.')
+    parser.add_argument('--per-host', type=int, default=LIVENESS_PER_HOST,
+                        help='requests in flight to one host at once.')
+    parser.add_argument('--delay', type=float, default=LIVENESS_HOST_DELAY,
+                        help='seconds between requests to one host.')
+    parsed = parser.parse_args(args)
+    if not parsed.cache:
+        parser.error('no cache file; set LIVENESS_CACHE or pass --cache.')
+
+    links = parsed.urls or search_links(SEARCH_RESULTS_PATH) + airtable_links()
+    entries = load_cache(parsed.cache)
+    start = time.perf_counter()
+    try:
+        count = update(links, entries, parsed.max_age, parsed.workers,
+                       parsed.per_host, parsed.delay)
+    finally:
+        save_cache(parsed.cache, entries)
+
+    verdicts = [ verdict(entries.get(canonical_url(link))) for link in
+                 dict.fromkeys(links) ]
+    print(f'Checked {count} of {len(verdicts)} links in '
+          f'{time.perf_counter() - start:.1f} seconds: ' +
+          ', '.join(f'{verdicts.count(v)} {v}' for v in (ALIVE, DEAD, UNKNOWN)))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
+# -----------------------------------------------------------------------------
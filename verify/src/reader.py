@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+import os
+import json
+from collections import deque, namedtuple
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import util  # noqa: F401 -- puts search/src on sys.path
+from runindex import get_most_recent, get_queries
+from store import read_raw
+from dataset import iter_dataset
+
+Record = namedtuple('Record', ('state', 'query', 'rank', 'link', 'title',
+                               'snippet'))
+
+# Stored responses (or run file records) are decoded whole: the "items" key
+# can also turn up inside strings elsewhere in a response, e.g. the request
+# echo or the search context.
+def decode_items(raw):
+    return json.loads(raw).get('items', [])
+
+def load_query(results_path, rdir, query):
+    raw = read_raw(results_path, rdir, query)
+    if raw is None: return []
+    state = rdir[:rdir.find('_')]
+    return [ Record(state, query, rank, item['link'], item.get('title', ''),
+                    item.get('snippet', ''))
+             for rank, item in enumerate(decode_items(raw), 1) ]
+
+# The most recent run of each state in a dataset written by `main.py
+# process`, ordered by run name like runindex.get_most_recent.
+def latest_dataset_runs(path):
+    latest = dict()
+    for row in iter_dataset(path):
+        if row['time'] > latest.get(row['state'], ('', None))[0]:
+            latest[row['state']] = (row['time'], row['run'])
+    return sorted(run for _, run in latest.values())
+
+# Records from a dataset, streamed line by line.  Without rdirs only the
+# most recent run of each state is kept, which takes one more pass.
+def read_dataset_results(path, rdirs=None, queries=None):
+    if rdirs is None:
+        rdirs = latest_dataset_runs(path)
+    rdirs = set(rdirs)
+
+    for row in iter_dataset(path):
+        if row['run'] not in rdirs: continue
+        if queries and row['query'] not in queries: continue
+        yield Record(row['state'], row['query'], row['rank'], row['link'],
+                     row['title'] or '', row['snippet'] or '')
+
+# Decoding is CPU bound, so queries are read on a pool of processes when
+# there is more than one core (threads otherwise).  With a single worker
+# they are read in the calling thread, and there is no pool.
+def make_executor(workers=None, processes=None):
+    workers = workers or os.cpu_count() or 1
+    if processes is None:
+        processes = (os.cpu_count() or 1) > 1
+    if workers == 1 and not processes:
+        return nullcontext()
+    Executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    return Executor(max_workers=workers)
+
+def read_on(executor, results_path, tasks, workers):
+    if executor is None:
+        for rdir, query in tasks:
+            yield from load_query(results_path, rdir, query)
+        return
+    pending = deque()
+    for rdir, query in tasks:
+        pending.append(executor.submit(load_query, results_path, rdir, query))
+        if len(pending) >= workers * 4:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
+
+# Yields a Record for every item of the selected runs (by default the most
+# recent run of each state), in run, query and rank order, from the dataset
+# if one is given and from the results tree otherwise.  `rdirs` may map each
+# run to the queries it searched, which spares looking them up.  Queries are
+# read on `executor` (one of make_executor()'s for the call otherwise), with
+# at most a few reads per worker in flight so memory stays flat however many
+# runs there are.
+def read_results(results_path, rdirs=None, queries=None, workers=None,
+                 processes=None, dataset=None, executor=None):
+    if dataset:
+        yield from read_dataset_results(dataset, rdirs, queries)
+        return
+
+    if rdirs is None:
+        rdirs = get_most_recent(results_path)
+    tasks = ( (rdir, query) for rdir in rdirs
+              for query in (sorted(rdirs[rdir]) if isinstance(rdirs, dict)
+                            else get_queries(results_path, rdir))
+              if not queries or query in queries )
+
+    workers = workers or os.cpu_count() or 1
+    if executor is not None:
+        yield from read_on(executor, results_path, tasks, workers)
+        return
+    with make_executor(workers, processes) as executor:
+        yield from read_on(executor, results_path, tasks, workers)
@@ -1,22 +1,8 @@
 #!/usr/bin/env python
-import os, time
-
-def get_most_recent_rdirs(results_path):
-    convert = lambda t: time.mktime(time.strptime(t, "%d-%m-%Y_%H:%M:%S"))
-    
-    states = dict()
-    print(results_path)
-    for rdir in os.listdir(results_path):
-        state = rdir[:rdir.find('_')]
-        tval = convert(rdir[rdir.find('_') + 1:])
-        if tval > states.get(state, (0, None))[0]:
-            states[state] = (tval, rdir)
-
-    results = []
-    for state in states:
-        results.append(states[state][1])
-
-    results.sort()
-    return results
-
+import os, sys
 
+# The run index, result storage and dataset format are shared with the
+# search tool.  Importing util puts its modules (search/src) on the path;
+# verify modules then import what they use from them directly.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..', 'search', 'src'))
@@ -0,0 +1,37 @@
+import pytest
+
+from citations import Citation, urls, split_cell, extract
+
+@pytest.mark.parametrize('line, found', [
+    ('See https://alea.gov/mid.', [ 'https://alea.gov/mid' ]),
+    ('(https://en.wikipedia.org/wiki/Mobile_ID_(US))',
+     [ 'https://en.wikipedia.org/wiki/Mobile_ID_(US)' ]),
+    ('dmv.alaska.gov/mid and www.alea.gov', [ 'dmv.alaska.gov/mid',
+                                              'www.alea.gov' ]),
+    ('e.g. Sec. 5, ask help@alea.gov', []),
+    ('"https://a.gov/x" “https://b.gov/y”', [ 'https://a.gov/x',
+                                              'https://b.gov/y' ]),
+])
+def test_urls(line, found):
+    assert urls(line) == found
+
+def test_split_cell():
+    cell = ('Passed in 2023:\n'
+            'https://a.gov/law - signed\n'
+            'effective 2024\n'
+            'https://b.gov/one, https://b.gov/two\n'
+            'https://c.gov')
+    assert split_cell(cell) == [
+        ('https://a.gov/law', 'Passed in 2023:\n- signed\neffective 2024'),
+        ('https://b.gov/one', None), ('https://b.gov/two', None),
+        ('https://c.gov', None) ]
+    assert split_cell('No source.') == []
+
+def test_extract():
+    states = { 'Alabama': { 'Digital? Source': 'https://www.alea.gov/mid/',
+                            'Law Source': 'alea.gov/law (2023)',
+                            'Notes': 'https://ignored.gov' },
+               'Alaska': { 'Digital? Source': '', 'Law Source': 'none' } }
+    assert extract(states, ('Digital? Source', 'Law Source')) == [
+        Citation('Alabama', 'Digital? Source', 'https://alea.gov/mid', None),
+        Citation('Alabama', 'Law Source', 'https://alea.gov/law', '(2023)') ]
@@ -0,0 +1,122 @@
+import os
+import json, csv
+
+import combine
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+# map_to_questions() as it was before the plan: the Airtable value, source
+# and "other" cells of every subcategory, for the states Airtable has.
+def baseline(airtable_map, airtable_results):
+    states = dict()
+    for state, state_dict in airtable_results.items():
+        states[state] = dict()
+        for category in airtable_map:
+            states[state][category] = dict()
+            for subcategory, columns in airtable_map[category].items():
+                record = states[state][category][subcategory] = dict()
+                if state_dict[subcategory] != '':
+                    record['value'] = (True if state_dict[subcategory] ==
+                                       'checked' else state_dict[subcategory])
+                if columns is None: continue
+                if 'Source' in columns and state_dict[columns['Source']] != '':
+                    record['AirtableSource'] = state_dict[columns['Source']]
+                if 'Other' in columns and state_dict[columns['Other']] != '':
+                    record['AirtableOther'] = state_dict[columns['Other']]
+    return states
+
+def setup(tmp_path, monkeypatch):
+    monkeypatch.setattr(combine, 'AIRTABLE_RESULTS',
+                        os.path.join(DATA, 'airtable_results.csv'))
+    monkeypatch.setattr(combine, 'AIRTABLE_TO_JSON',
+                        os.path.join(DATA, 'airtable_to_json_map.json'))
+    monkeypatch.setattr(combine, 'AIRTABLE_TO_QUESTIONS',
+                        os.path.join(DATA, 'airtable_to_questions_map.json'))
+    monkeypatch.setattr(combine, 'QUERIES_TO_QUESTIONS',
+                        os.path.join(DATA, 'queries_to_questions_map.json'))
+    search = { 'Alabama': { '0': { 'links': [ 'https://alea.gov/mid' ],
+                                   'notes': 'Pilot' } },
+               'Nowhere': { '2': { 'links': [], 'notes': None } } }
+    paths = dict()
+    for name, data in (('SEARCH_RESULTS_JSON', search),
+                       ('AIRTABLE_RESULTS_JSON', combine.get_airtable())):
+        paths[name] = str(tmp_path / f'{name.lower()}.json')
+        with open(paths[name], 'w') as file:
+            json.dump(data, file)
+        monkeypatch.setattr(combine, name, paths[name])
+    monkeypatch.setattr(combine, 'RESULTS', str(tmp_path / 'mapped.json'))
+    return search
+
+def test_plan_matches_baseline(tmp_path, monkeypatch):
+    search = setup(tmp_path, monkeypatch)
+    airtable = combine.get_airtable()
+    with open(combine.AIRTABLE_TO_QUESTIONS, 'r') as file:
+        expected = baseline(json.load(file), airtable)
+
+    mapped = combine.map_to_questions()
+    assert set(mapped) == set(airtable) | set(search)
+    for state, categories in expected.items():
+        for category, subcategories in categories.items():
+            for subcategory, record in subcategories.items():
+                found = dict(mapped[state][category][subcategory])
+                found.pop('questions', None)
+                found.pop('search', None)
+                assert found == record, (state, category, subcategory)
+
+    digital = mapped['Alabama']['Digital?']['Digital?']
+    assert digital['questions'] == [ '0' ]
+    assert digital['search'] == { '0': search['Alabama']['0'] }
+    assert 'value' not in mapped['Nowhere']['Digital?']['Digital?']
+
+def test_mapped_results_hold_write_timing(tmp_path, monkeypatch):
+    setup(tmp_path, monkeypatch)
+    timings = combine.dump_mapped_results()
+    with open(combine.RESULTS, 'r') as file:
+        written = json.load(file)
+    assert set(written['timings']) == { 'load', 'compile', 'apply', 'write' }
+    assert written['timings'] == timings
+    assert written['states'] == combine.map_to_questions()
+
+# Two states and blocks of different lengths: Q00 has two result rows, Q01
+# one, each followed by the reviewer's "O" and "N" rows.
+SHEET = [ [ '', '', 'Alabama', 'TRUE', 'Alaska', 'TRUE' ],
+          [ 'Q00', '1', 'A one', 'TRUE', 'B one', 'FALSE' ],
+          [ '', '2', 'A two', 'FALSE', 'B two', 'TRUE' ],
+          [ '', 'O', 'http://www.a.gov/one/', 'TRUE', '', 'FALSE' ],
+          [ '', 'N', 'Pilot only', '', '', '' ],
+          [ 'Q01', '1', 'A three', 'TRUE', 'B three', 'FALSE' ],
+          [ '', 'O', '', 'FALSE', 'https://b.gov/own', 'TRUE' ],
+          [ '', 'N', '', '', 'Law passed', '' ] ]
+QUERIES = { 'Alabama': { 0: [ 'https://a.gov/one', 'https://a.gov/two' ],
+                         1: [ 'https://a.gov/three' ] },
+            'Alaska': { 0: [ 'https://b.gov/one', 'https://b.gov/two' ],
+                        1: [ 'https://b.gov/three' ] } }
+
+def write_sheet(tmp_path, monkeypatch):
+    path = tmp_path / 'parsed.csv'
+    with open(path, 'w', newline='') as file:
+        csv.writer(file).writerows(SHEET)
+    monkeypatch.setattr(combine, 'SEARCH_RESULTS_PARSED', str(path))
+    return str(path)
+
+def test_read_sheet(tmp_path, monkeypatch):
+    columns, states, blocks = combine.read_sheet(write_sheet(tmp_path,
+                                                             monkeypatch))
+    assert states == { 'Alabama': 2, 'Alaska': 4 }
+    assert blocks == [ (0, 1, 5), (1, 5, 8) ]
+    assert columns[1][1:5] == ('1', '2', 'O', 'N')
+
+def test_get_parsed(tmp_path, monkeypatch):
+    write_sheet(tmp_path, monkeypatch)
+    assert combine.get_parsed(QUERIES) == {
+        'Alabama': { 0: { 'links': [ 'https://a.gov/one',
+                                     'http://www.a.gov/one/' ],
+                          'notes': 'Pilot only' },
+                     1: { 'links': [ 'https://a.gov/three' ], 'notes': None } },
+        'Alaska': { 0: { 'links': [ 'https://b.gov/two' ], 'notes': None },
+                    1: { 'links': [ 'https://b.gov/own' ],
+                         'notes': 'Law passed' } } }
+
+    # The reviewer's own link is the same page as the first result.
+    parsed = combine.get_parsed(QUERIES, dedupe=True)
+    assert parsed['Alabama'][0]['links'] == [ 'https://a.gov/one' ]
@@ -0,0 +1,43 @@
+import os
+import json
+
+from individual_getters import (Rule, RULES, with_queries, evaluate, BOTH,
+                                AIRTABLE, SEARCH, NEITHER)
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+def test_queries_come_from_the_question_map():
+    with open(os.path.join(DATA, 'queries_to_questions_map.json'), 'r') as file:
+        rules = { r.name: r for r in with_queries(RULES, json.load(file)) }
+    assert rules['Digital offering'].queries == ('0',)
+    assert rules['In-house app'].queries == ('5', '6', '7')
+    assert rules['Wallet apps'].queries == ('5', '6', '7')
+    assert rules['ID-specific consent law'].queries == \
+           ('12', '13', '14')
+    assert all(rule.queries for rule in rules.values())
+
+def test_evaluate():
+    rules = with_queries([ Rule('Digital', 'Digital?',
+                                absent=('', 'No Digital Offering')),
+                           Rule('Consent law', 'Consent?',
+                                expected=('ID-specific legislation',)) ],
+                         { 'Digital?': { 'Digital?': [ 0 ] },
+                           'Limits': { 'Consent?': [ 12, 13 ] } })
+    airtable = { 'Alabama': { 'Digital?': 'Mobile ID',
+                              'Consent?': 'General, ID-specific legislation' },
+                 'Alaska': { 'Digital?': 'No Digital Offering',
+                             'Consent?': 'General' },
+                 'Alaska_1': { 'Digital?': 'Mobile ID', 'Consent?': '' } }
+    search = { 'Alabama': { '0': { 'links': [ 'https://a.gov' ] } },
+               'Alaska': { '13': { 'links': [ 'https://b.gov' ] } },
+               'Arizona': { '0': { 'links': [] } } }
+    timings = dict()
+    verdicts = evaluate(rules, airtable, search, timings)
+
+    assert { s: v['class'] for s, v in verdicts['Digital'].items() } == \
+           { 'Alabama': BOTH, 'Alaska': NEITHER, 'Arizona': NEITHER }
+    assert { s: v['class'] for s, v in verdicts['Consent law'].items() } == \
+           { 'Alabama': AIRTABLE, 'Alaska': SEARCH, 'Arizona': NEITHER }
+    assert verdicts['Consent law']['Alaska']['links'] == [ 'https://b.gov' ]
+    assert verdicts['Digital']['Arizona']['airtable'] is None
+    assert set(timings) == { 'Digital', 'Consent law' }
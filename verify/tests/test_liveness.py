@@ -0,0 +1,99 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from liveness import update, verdict, ALIVE, DEAD, UNKNOWN
+from links import canonical_url
+
+ETAG = '"v1"'
+LAST_MODIFIED = 'Mon, 01 Jan 2024 00:00:00 GMT'
+
+# /ok has an ETag, /dated a Last-Modified date, /moved redirects to /ok,
+# /no-head refuses HEAD and /slow takes a while; anything else is a 404.
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, headers=()):
+        self.server.seen.append((self.command, self.path, status))
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_HEAD(self):
+        if self.path == '/ok':
+            if self.headers.get('If-None-Match') == ETAG:
+                return self.reply(304, [ ('ETag', ETAG) ])
+            return self.reply(200, [ ('ETag', ETAG) ])
+        if self.path == '/dated':
+            if self.headers.get('If-Modified-Since') == LAST_MODIFIED:
+                return self.reply(304)
+            return self.reply(200, [ ('Last-Modified', LAST_MODIFIED) ])
+        if self.path == '/moved':
+            return self.reply(301, [ ('Location', '/ok') ])
+        if self.path == '/no-head':
+            return self.reply(405)
+        if self.path == '/slow':
+            time.sleep(0.2)
+            return self.reply(200)
+        self.reply(404)
+
+    def do_GET(self):
+        if self.path == '/no-head':
+            return self.reply(200)
+        self.do_HEAD()
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.seen = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+def check(links, entries, **options):
+    options = dict(dict(max_age=0, workers=8, per_host=8, delay=0), **options)
+    update(links, entries, **options)
+    return { link: entries[canonical_url(link)] for link in links }
+
+def test_statuses(server):
+    server, base = server
+    found = check([ f'{base}/ok', f'{base}/gone', f'{base}/moved',
+                    f'{base}/no-head' ], dict())
+    assert found[f'{base}/ok']['status'] == 200
+    assert verdict(found[f'{base}/gone']) == DEAD
+    assert found[f'{base}/moved']['status'] == 200
+    assert found[f'{base}/moved']['final'] == f'{base}/ok'
+    assert verdict(found[f'{base}/no-head']) == ALIVE
+    assert ('HEAD', '/no-head', 405) in server.seen
+    assert ('GET', '/no-head', 200) in server.seen
+
+def test_conditional_requests(server):
+    server, base = server
+    entries = dict()
+    check([ f'{base}/ok', f'{base}/dated' ], entries)
+    first = dict(entries)
+    found = check([ f'{base}/ok', f'{base}/dated' ], entries)
+    assert ('HEAD', '/ok', 304) in server.seen
+    assert ('HEAD', '/dated', 304) in server.seen
+    assert found[f'{base}/ok']['status'] == 200
+    assert found[f'{base}/ok']['etag'] == ETAG
+    assert found[f'{base}/dated']['last_modified'] == LAST_MODIFIED
+    assert found[f'{base}/ok']['checked'] >= first[canonical_url(f'{base}/ok')]['checked']
+
+def test_unreachable():
+    found = check([ 'http://127.0.0.1:9/x' ], dict())
+    assert verdict(found['http://127.0.0.1:9/x']) == UNKNOWN
+
+def test_workers_past_default_pool(server):
+    server, base = server
+    links = [ f'{base}/slow?{i}' for i in range(48) ]
+    start = time.perf_counter()
+    check(links, dict(), workers=48, per_host=48)
+    assert time.perf_counter() - start < 1.5
@@ -0,0 +1,33 @@
+import os
+import json
+
+from reader import decode_items, load_query, read_results
+
+RDIR = 'Alabama_13-08-2025_15:22:08'
+
+def write_result(results_path, rdir, query, result):
+    path = os.path.join(results_path, rdir, query)
+    os.makedirs(path)
+    with open(os.path.join(path, f'{query}.json'), 'w') as file:
+        json.dump(result, file, indent=1)
+
+def result(terms, links):
+    return { 'queries': { 'request': [ { 'searchTerms': terms } ] },
+             'context': { 'title': '"items": ["https://wrong.example"]' },
+             'items': [ { 'link': l, 'title': l } for l in links ] }
+
+def test_items_key_inside_strings():
+    raw = json.dumps(result('"items": [ {"link": "x"} ]', [ 'https://a.gov' ]))
+    assert decode_items(raw) == [ { 'link': 'https://a.gov',
+                                    'title': 'https://a.gov' } ]
+    assert decode_items(b'{"kind": "customsearch#search"}') == []
+
+def test_read_results(tmp_path):
+    results_path = str(tmp_path / 'results')
+    write_result(results_path, RDIR, '00',
+                 result('"items": [', [ 'https://a.gov', 'https://b.gov' ]))
+    write_result(results_path, RDIR, '01', result('x', []))
+    records = list(read_results(results_path, processes=False))
+    assert [ (r.query, r.rank, r.link) for r in records ] == \
+        [ ('00', 1, 'https://a.gov'), ('00', 2, 'https://b.gov') ]
+    assert load_query(results_path, RDIR, '02') == []